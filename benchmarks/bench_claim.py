@@ -0,0 +1,401 @@
+"""
+opn-claim 离线性能测试
+
+功能：
+- 启动本地模拟 JSON-RPC 节点（见 mock_node.py），不访问测试网
+- 按不同并发数运行完整的 claim 流程（ClaimRunner）
+- 报告 claims/sec、端到端延迟 p50/p99、每个 claim 的 RPC 调用数和 HTTP 请求数
+- --json 输出中包含 execute_claim 各阶段的耗时分布（见 common/metrics.py）
+- --node-latency / --node-errors 启动多个共享链状态的 RPC 地址，测试多节点 RPC 池
+- --multicall 在模拟节点上部署 Multicall3（余额通过 aggregate3 批量读取）
+- --claim-revert-rate 部分地址的 claim() 会 revert（already claimed），对比开启和关闭预执行（--no-simulate）
+- --signer-workers 使用多进程签名（SIGNER_WORKERS），--send-batch 批量发送交易（SEND_BATCH_SIZE）
+- --shards 按地址哈希把钱包分成 N 片，每片在单独的进程中执行（--workers 为每个进程的并发数），结束后合并结果文件
+
+用法：
+    python benchmarks/bench_claim.py --wallets 200 --workers 1,4,16
+    python benchmarks/bench_claim.py --mode async --workers 50,200 --latency 0.02 --error-rate 0.01
+    python benchmarks/bench_claim.py --workers 16 --node-latency 0,0,0.3 --node-errors 0,0,0.3
+    python benchmarks/bench_claim.py --mode async --workers 200 --latency 0 --signer-workers 4
+    python benchmarks/bench_claim.py --mode async --workers 200 --latency eth_sendRawTransaction=0.05,*=0.005 --send-batch 100
+    python benchmarks/bench_claim.py --workers 16 --shards 4
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import multiprocessing
+import importlib.util
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.mock_node import MockRpcNode, CallReverted  # noqa: E402
+
+CLAIM_SCRIPT = os.path.join(ROOT_DIR, 'opn-testnet', 'opn-claim.py')
+
+
+def load_claim_module():
+    """按文件路径导入 opn-claim.py（文件名包含连字符，不能直接 import）"""
+    spec = importlib.util.spec_from_file_location('opn_claim', CLAIM_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def percentile(values, pct):
+    """最近秩百分位数（values 为空时返回 0）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+@contextlib.contextmanager
+def quiet(enabled=True):
+    """屏蔽被测代码的输出"""
+    if not enabled:
+        yield
+        return
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def create_wallet_file(directory, count):
+    """生成 count 个随机私钥并写入 wallet.json"""
+    from eth_account import Account  # pyright: ignore[reportMissingImports]
+
+    path = os.path.join(directory, 'wallet.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(['0x' + Account.create().key.hex().removeprefix('0x') for _ in range(count)], f)
+    return path
+
+
+def register_claim_contract(node, claim_module, revert_rate):
+    """在模拟节点上注册 claim 合约：按发送方地址哈希固定选出 revert_rate 比例的地址，claim() 返回 already claimed"""
+    from eth_abi import encode  # pyright: ignore[reportMissingImports]
+    from eth_utils import keccak  # pyright: ignore[reportMissingImports]
+
+    revert_data = bytes.fromhex('08c379a0') + encode(['string'], ['already claimed'])
+    threshold = int(revert_rate * 2 ** 32)
+
+    def claim(sender, data):
+        if int.from_bytes(keccak(hexstr=sender)[:4], 'big') < threshold:
+            raise CallReverted(revert_data, 'already claimed')
+        return b''
+
+    node.register_contract(claim_module.CONTRACT_ADDRESS, claim)
+
+
+def make_timed_runner(claim_module):
+    """创建记录每个 claim 端到端耗时的 ClaimRunner 子类"""
+
+    class TimedClaimRunner(claim_module.ClaimRunner):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.latencies = []
+
+        def process_account(self, idx, account_info, total):
+            start = time.perf_counter()
+            try:
+                return super().process_account(idx, account_info, total)
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+
+        async def async_process_account(self, aw3, idx, account_info, total):
+            start = time.perf_counter()
+            try:
+                return await super().async_process_account(aw3, idx, account_info, total)
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+
+    return TimedClaimRunner
+
+
+def summarize_runner(runner):
+    """从 ClaimRunner 中取出测试结果需要的数据（可以跨进程传递）"""
+    return {
+        'processed': runner.processed_count,
+        'success': runner.success_count,
+        'failed': runner.failed_count,
+        'elapsed': runner.elapsed_time,
+        'latencies': runner.latencies,
+        'final_concurrency': runner.limiter.limit if runner.limiter is not None else runner.max_workers,
+        'failovers': runner.rpc_pool.failovers if runner.rpc_pool is not None else 0,
+        'simulated_reverts': runner.simulated_reverts,
+        'retry_decisions': {
+            f"{c['labels']['decision']}:{c['labels']['error']}": c['value']
+            for c in runner.metrics.to_dict()['counters'] if c['name'] == 'retry_decisions_total'
+        },
+        'phases': {phase: histogram.summary() for phase, histogram in runner.phase_summary()},
+    }
+
+
+# 分片测试的参数（fork 前设置，子进程直接继承，不需要序列化模块对象）
+_shard_job = None
+
+
+def _run_shard(index):
+    """在子进程中执行一个分片，写出分片结果文件"""
+    claim_module, settings, rpc_url, work_dir, count, verbose = _shard_job
+    runner = make_timed_runner(claim_module)(settings, rpc_url=rpc_url, data_dir=work_dir, shard=(index, count))
+    with quiet(not verbose):
+        if not runner.run():
+            raise RuntimeError(f"无法连接到模拟节点: {rpc_url}")
+        runner.write_report()
+    return summarize_runner(runner)
+
+
+def run_shards(claim_module, settings, rpc_url, work_dir, count, verbose=False):
+    """
+    每个分片在单独的进程中执行（fork，模拟节点留在当前进程），全部结束后合并分片结果文件
+
+    Returns:
+        与 summarize_runner 格式相同的合并结果，elapsed 为所有分片的总耗时
+    """
+    global _shard_job
+    _shard_job = (claim_module, settings, rpc_url, work_dir, count, verbose)
+    start = time.time()
+    try:
+        with multiprocessing.get_context('fork').Pool(count) as pool:
+            summaries = pool.map(_run_shard, range(1, count + 1))
+    finally:
+        _shard_job = None
+    elapsed = time.time() - start
+
+    with quiet(not verbose):
+        result_file = claim_module.merge_shard_results(count, work_dir)
+    with open(result_file, 'r', encoding='utf-8') as f:
+        merged = json.load(f)
+    processed = sum(summary['processed'] for summary in summaries)
+    if merged['total'] != processed:
+        raise RuntimeError(f"合并结果数量不一致: {merged['total']} != {processed}")
+
+    retry_decisions = {}
+    for summary in summaries:
+        for key, value in summary['retry_decisions'].items():
+            retry_decisions[key] = retry_decisions.get(key, 0) + value
+    return {
+        'processed': processed,
+        'success': merged['success'],
+        'failed': merged['failed'],
+        'elapsed': elapsed,
+        'latencies': [latency for summary in summaries for latency in summary['latencies']],
+        'final_concurrency': sum(summary['final_concurrency'] for summary in summaries),
+        'failovers': sum(summary['failovers'] for summary in summaries),
+        'simulated_reverts': sum(summary['simulated_reverts'] for summary in summaries),
+        'retry_decisions': retry_decisions,
+        # 各阶段耗时分布在各进程中分别统计，这里只保留第 1 个分片的
+        'phases': summaries[0]['phases'],
+    }
+
+
+def run_once(claim_module, wallet_source, mode, workers, node_options, batch_size, adaptive=False, endpoints=None,
+             signer_workers=0, send_batch=0, claim_revert_rate=0.0, simulate=True, receipt_timeout=None,
+             shards=1, verbose=False):
+    """
+    使用新的模拟节点和临时目录运行一次完整的 claim 流程
+
+    endpoints: 多节点测试时每个 RPC 地址的配置 [{'extra_latency': ..., 'http_error_rate': ...}, ...]
+    signer_workers: 签名进程数（0 为在 worker 中直接签名）
+    send_batch: 每个 batch 请求最多发送的交易数（0 为逐笔发送）
+    claim_revert_rate: claim() 会 revert 的地址比例
+    simulate: 是否开启发送前预执行（SIMULATE）
+    receipt_timeout: 等待交易确认的超时时间（秒），超时后替换交易；None 为脚本默认值
+    shards: 分片数，大于 1 时每个分片在单独的进程中执行（workers 为每个进程的并发数）
+
+    Returns:
+        结果字典
+    """
+    work_dir = tempfile.mkdtemp(prefix='bench-claim-')
+    try:
+        # 复制钱包和地址索引，避免每轮重新计算地址
+        for name in os.listdir(os.path.dirname(wallet_source)):
+            if name.startswith('wallet.'):
+                shutil.copy(os.path.join(os.path.dirname(wallet_source), name), work_dir)
+
+        settings = claim_module.load_settings(work_dir)
+        settings.update({
+            'CLAIM_MODE': mode,
+            'MAX_WORKERS': workers,
+            # 自适应并发时 workers 只是初始值，异步模式的上限保持 ASYNC_CONCURRENCY 默认值
+            'ASYNC_CONCURRENCY': settings['ASYNC_CONCURRENCY'] if adaptive else workers,
+            'RPC_BATCH_SIZE': batch_size,
+            'RPC_POOL_SIZE': None,
+            'RECEIPT_POLL_INTERVAL': min(0.25, node_options['block_time'] / 2),
+            'ADAPTIVE_CONCURRENCY': adaptive,
+            'SIGNER_WORKERS': signer_workers,
+            'SEND_BATCH_SIZE': send_batch,
+            'SIMULATE': simulate,
+        })
+        if receipt_timeout is not None:
+            settings['RECEIPT_TIMEOUT'] = receipt_timeout
+
+        node = MockRpcNode(**node_options)
+        rpc_url = node.start()
+        if claim_revert_rate:
+            register_claim_contract(node, claim_module, claim_revert_rate)
+        if endpoints:
+            rpc_url = [node.add_endpoint(**options).url for options in endpoints]
+        try:
+            if shards > 1:
+                summary = run_shards(claim_module, settings, rpc_url, work_dir, shards, verbose=verbose)
+            else:
+                runner = make_timed_runner(claim_module)(settings, rpc_url=rpc_url, data_dir=work_dir)
+                with quiet(not verbose):
+                    connected = runner.run()
+                if not connected:
+                    raise RuntimeError(f"无法连接到模拟节点: {rpc_url}")
+                runner.ledger.close()
+                summary = summarize_runner(runner)
+        finally:
+            node.stop()
+
+        processed = max(1, summary['processed'])
+        elapsed = summary['elapsed']
+        return {
+            'mode': mode,
+            'workers': workers,
+            'shards': shards,
+            'wallets': summary['processed'],
+            'success': summary['success'],
+            'failed': summary['failed'],
+            'elapsed': elapsed,
+            'claims_per_second': summary['success'] / elapsed if elapsed > 0 else 0.0,
+            'p50': percentile(summary['latencies'], 50),
+            'p99': percentile(summary['latencies'], 99),
+            'rpc_calls_per_claim': node.rpc_calls / processed,
+            'http_requests_per_claim': node.http_requests / processed,
+            'rejected_requests': node.rejected_requests,
+            'final_concurrency': summary['final_concurrency'],
+            'failovers': summary['failovers'],
+            'endpoint_requests': [endpoint.requests for endpoint in node.endpoints],
+            'simulated_reverts': summary['simulated_reverts'],
+            'replaced_transactions': node.replaced_transactions,
+            'retry_decisions': summary['retry_decisions'],
+            'method_counts': dict(node.method_counts),
+            'phases': summary['phases'],
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def parse_latency(value):
+    """解析延迟参数：0.01 或 eth_sendRawTransaction=0.05,*=0.01"""
+    if '=' not in value:
+        return float(value)
+    latency = {}
+    for item in value.split(','):
+        method, _, seconds = item.partition('=')
+        latency[method.strip()] = float(seconds)
+    return latency
+
+
+def print_table(results):
+    print()
+    print(f"{'mode':<8}{'workers':>8}{'ok':>7}{'fail':>6}{'elapsed':>10}{'claims/s':>10}"
+          f"{'p50(s)':>9}{'p99(s)':>9}{'rpc/claim':>11}{'http/claim':>12}")
+    print("-" * 90)
+    for r in results:
+        print(f"{r['mode']:<8}{r['workers']:>8}{r['success']:>7}{r['failed']:>6}{r['elapsed']:>10.2f}"
+              f"{r['claims_per_second']:>10.1f}{r['p50']:>9.3f}{r['p99']:>9.3f}"
+              f"{r['rpc_calls_per_claim']:>11.2f}{r['http_requests_per_claim']:>12.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="opn-claim 离线性能测试（本地模拟节点）")
+    parser.add_argument('--wallets', type=int, default=200, help='钱包数量（默认 200）')
+    parser.add_argument('--workers', default='1,4,16', help='要测试的并发数，逗号分隔（默认 1,4,16）')
+    parser.add_argument('--mode', choices=('thread', 'async'), default='thread', help='CLAIM_MODE（默认 thread）')
+    parser.add_argument('--block-time', type=float, default=0.5, help='出块时间（秒，默认 0.5）')
+    parser.add_argument('--latency', default='0.005',
+                        help='每个调用的延迟（秒），或按方法配置：eth_sendRawTransaction=0.05,*=0.005')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='注入 RPC 错误的概率（默认 0）')
+    parser.add_argument('--revert-rate', type=float, default=0.0, help='交易执行失败的概率（默认 0）')
+    parser.add_argument('--no-block-receipts', action='store_true', help='模拟不支持 eth_getBlockReceipts 的节点')
+    parser.add_argument('--multicall', action='store_true', help='模拟节点部署 Multicall3')
+    parser.add_argument('--claim-revert-rate', type=float, default=0.0,
+                        help='claim() 会 revert 的地址比例（按地址固定，默认 0）')
+    parser.add_argument('--no-simulate', action='store_true', help='关闭发送前的 eth_call 预执行')
+    parser.add_argument('--stuck-rate', type=float, default=0.0,
+                        help='交易卡在交易池中直到被替换的概率（默认 0）')
+    parser.add_argument('--receipt-timeout', type=float, help='等待交易确认的超时时间（秒），超时后替换交易')
+    parser.add_argument('--max-concurrent', type=int, help='节点同时处理的请求上限，超过时返回 HTTP 429')
+    parser.add_argument('--adaptive', action='store_true', help='开启自适应并发（--workers 为初始并发数）')
+    parser.add_argument('--node-latency', help='多节点测试：每个 RPC 地址的额外延迟（秒），逗号分隔，例如 0,0,0.3')
+    parser.add_argument('--node-errors', help='多节点测试：每个 RPC 地址返回 HTTP 503 的概率，逗号分隔，例如 0,0,0.3')
+    parser.add_argument('--signer-workers', type=int, default=0, help='签名进程数（默认 0，在 worker 中直接签名）')
+    parser.add_argument('--send-batch', type=int, default=0, help='每个 batch 请求最多发送的交易数（默认 0，逐笔发送）')
+    parser.add_argument('--batch-size', type=int, default=200, help='RPC_BATCH_SIZE（默认 200）')
+    parser.add_argument('--shards', type=int, default=1,
+                        help='分片数（默认 1），大于 1 时每个分片在单独的进程中执行，--workers 为每个进程的并发数')
+    parser.add_argument('--seed', type=int, default=1, help='随机数种子（默认 1）')
+    parser.add_argument('--json', dest='json_file', help='同时把结果写入 JSON 文件')
+    parser.add_argument('-v', '--verbose', action='store_true', help='显示 claim 脚本的输出')
+    args = parser.parse_args(argv)
+
+    node_options = {
+        'block_time': args.block_time,
+        'latency': parse_latency(args.latency),
+        'error_rate': args.error_rate,
+        'revert_rate': args.revert_rate,
+        'block_receipts': not args.no_block_receipts,
+        'max_concurrent': args.max_concurrent,
+        'multicall': args.multicall,
+        'stuck_rate': args.stuck_rate,
+        'seed': args.seed,
+    }
+    worker_counts = [int(w) for w in args.workers.split(',') if w.strip()]
+
+    endpoints = None
+    if args.node_latency or args.node_errors:
+        latencies = [float(v) for v in (args.node_latency or '').split(',') if v.strip()]
+        errors = [float(v) for v in (args.node_errors or '').split(',') if v.strip()]
+        count = max(len(latencies), len(errors))
+        endpoints = [{
+            'extra_latency': latencies[i] if i < len(latencies) else 0.0,
+            'http_error_rate': errors[i] if i < len(errors) else 0.0,
+        } for i in range(count)]
+
+    claim_module = load_claim_module()
+    wallet_dir = tempfile.mkdtemp(prefix='bench-wallets-')
+    try:
+        print(f"🔐 生成 {args.wallets} 个测试钱包...")
+        wallet_file = create_wallet_file(wallet_dir, args.wallets)
+        # 预先生成地址索引，各轮测试不再计算地址
+        with quiet():
+            for _ in claim_module.iter_wallet_chunks(wallet_file):
+                pass
+
+        results = []
+        for workers in worker_counts:
+            print(f"🚀 {args.mode} 模式，并发 {workers}{f'，{args.shards} 个分片进程' if args.shards > 1 else ''}...")
+            result = run_once(claim_module, wallet_file, args.mode, workers, node_options,
+                              args.batch_size, adaptive=args.adaptive, endpoints=endpoints,
+                              signer_workers=args.signer_workers, send_batch=args.send_batch,
+                              claim_revert_rate=args.claim_revert_rate, simulate=not args.no_simulate,
+                              receipt_timeout=args.receipt_timeout, shards=args.shards, verbose=args.verbose)
+            results.append(result)
+            print(f"   {result['claims_per_second']:.1f} claims/s，p99 {result['p99']:.3f}s，"
+                  f"429 {result['rejected_requests']} 次，结束时并发 {result['final_concurrency']}")
+    finally:
+        shutil.rmtree(wallet_dir, ignore_errors=True)
+
+    print_table(results)
+    if args.json_file:
+        with open(args.json_file, 'w', encoding='utf-8') as f:
+            json.dump({'node': {k: v for k, v in node_options.items()}, 'results': results}, f,
+                      indent=2, ensure_ascii=False)
+        print(f"\n💾 结果已保存到: {args.json_file}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
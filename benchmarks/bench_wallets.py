@@ -0,0 +1,107 @@
+"""
+钱包生成与加载性能测试
+
+功能：
+- 按不同进程数运行 generate_wallets，报告每秒生成的钱包数
+- 测试钱包文件的加载速度：首次加载（计算地址）、使用地址索引、二进制格式
+
+用法：
+    python benchmarks/bench_wallets.py --count 20000 --workers 1,2,4
+    python benchmarks/bench_wallets.py --count 5000 --skip-load
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.bench_claim import quiet  # noqa: E402
+from common.wallet_store import iter_wallet_records, convert_to_binary  # noqa: E402
+from utils.generate_wallets import generate_wallets  # noqa: E402
+
+
+def bench_generate(count, workers, work_dir):
+    """运行一次 generate_wallets，返回结果字典"""
+    output_file = os.path.join(work_dir, f'wallet-{workers}.json')
+    with quiet():
+        result = generate_wallets(count, output_file, workers=workers, verbose=False)
+    return {
+        'name': f'generate (workers={workers})',
+        'count': result['count'],
+        'elapsed': result['elapsed'],
+        'rate': result['keys_per_second'],
+    }
+
+
+def bench_load(name, wallet_file, **kwargs):
+    """完整遍历一次钱包文件（包括地址），返回结果字典"""
+    start = time.perf_counter()
+    count = 0
+    with quiet():
+        for record in iter_wallet_records(wallet_file, **kwargs):
+            record.raw_address
+            count += 1
+    elapsed = time.perf_counter() - start
+    return {
+        'name': name,
+        'count': count,
+        'elapsed': elapsed,
+        'rate': count / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def print_table(results):
+    print()
+    print(f"{'benchmark':<28}{'count':>10}{'elapsed(s)':>12}{'per second':>14}")
+    print("-" * 64)
+    for r in results:
+        print(f"{r['name']:<28}{r['count']:>10}{r['elapsed']:>12.2f}{r['rate']:>14.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="钱包生成与加载性能测试")
+    parser.add_argument('-n', '--count', type=int, default=5000, help='钱包数量（默认 5000）')
+    parser.add_argument('--workers', default=f'1,{os.cpu_count() or 1}',
+                        help='要测试的进程数，逗号分隔（默认 1 和 CPU 核数）')
+    parser.add_argument('--skip-load', action='store_true', help='只测试生成，不测试加载')
+    parser.add_argument('--json', dest='json_file', help='同时把结果写入 JSON 文件')
+    args = parser.parse_args(argv)
+
+    worker_counts = sorted({max(1, int(w)) for w in args.workers.split(',') if w.strip()})
+    work_dir = tempfile.mkdtemp(prefix='bench-wallets-')
+    results = []
+    try:
+        for workers in worker_counts:
+            print(f"🔐 生成 {args.count} 个钱包，进程数 {workers}...")
+            results.append(bench_generate(args.count, workers, work_dir))
+
+        if not args.skip_load:
+            wallet_file = os.path.join(work_dir, f'wallet-{worker_counts[0]}.json')
+            print("📂 测试钱包加载...")
+            results.append(bench_load('load json (cold)', wallet_file))
+            results.append(bench_load('load json (index)', wallet_file))
+
+            binary_file = os.path.join(work_dir, 'wallet.bin')
+            with quiet():
+                convert_to_binary(wallet_file, binary_file)
+            results.append(bench_load('load binary', binary_file))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_table(results)
+    if args.json_file:
+        with open(args.json_file, 'w', encoding='utf-8') as f:
+            json.dump({'count': args.count, 'results': results}, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 结果已保存到: {args.json_file}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
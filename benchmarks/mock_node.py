@@ -0,0 +1,555 @@
+"""
+本地模拟 JSON-RPC 节点（aiohttp）
+
+功能：
+- 在后台线程中运行，不依赖测试网，用于离线性能测试
+- 每个方法可配置延迟和错误率，可配置出块时间
+- 可限制同时处理的请求数，超过时返回 HTTP 429（模拟公共 RPC 限流）
+- 可添加共享同一条链的多个 RPC 地址（add_endpoint），每个地址单独配置额外延迟、故障率或宕机，用于测试多节点 RPC 池
+- 支持 JSON-RPC batch 请求
+- 按原始交易恢复发送方和 nonce，维护 pending nonce、交易池和回执
+- 支持同一 nonce 的替换交易（费用至少提高 10%），可按概率让交易卡在交易池中直到被替换
+- 支持 eth_getBlockReceipts（可关闭，用于测试回退到逐笔查询）
+- 可模拟部署在标准地址的 Multicall3（aggregate3 / getEthBalance），可注册模拟合约处理 eth_call
+- 统计每个方法的调用次数和 HTTP 请求数
+"""
+
+import os
+import sys
+import json
+import random
+import asyncio
+import threading
+from collections import Counter
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from common.multicall import MULTICALL3_ADDRESS, AGGREGATE3_SELECTOR, GET_ETH_BALANCE_SELECTOR  # noqa: E402
+
+DEFAULT_CHAIN_ID = 984
+DEFAULT_BALANCE = 10 ** 18
+DEFAULT_GAS_ESTIMATE = 50000
+DEFAULT_BASE_FEE = 10 ** 9
+DEFAULT_PRIORITY_FEE = 10 ** 8
+
+METHOD_NOT_FOUND = -32601
+INJECTED_ERROR = -32000
+
+
+def _hex(value):
+    return hex(value)
+
+
+REVERTED = 3
+
+
+class RpcFault(Exception):
+    """返回给客户端的 JSON-RPC 错误"""
+
+    def __init__(self, code, message, data=None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.data = data
+
+
+class CallReverted(Exception):
+    """模拟合约调用 revert，data 为 revert 数据（例如 Error(string) 编码）"""
+
+    def __init__(self, data=b'', reason=None):
+        super().__init__(reason or 'execution reverted')
+        self.data = bytes(data)
+        self.reason = reason
+
+
+def decode_raw_transaction(raw_tx):
+    """
+    解析签名后的原始交易
+
+    Returns:
+        {'from', 'nonce', 'to', 'gas', 'fee', 'data', 'type', 'raw'}，fee 为 gasPrice 或 maxFeePerGas
+    """
+    import rlp  # pyright: ignore[reportMissingImports]
+    from eth_account import Account  # pyright: ignore[reportMissingImports]
+
+    raw = bytes.fromhex(raw_tx[2:] if raw_tx.startswith('0x') else raw_tx)
+    if raw[0] <= 0x7f:
+        tx_type = raw[0]
+        fields = rlp.decode(raw[1:])
+        # EIP-2930: [chainId, nonce, gasPrice, gas, to, ...]；EIP-1559: [chainId, nonce, tip, maxFee, gas, to, ...]
+        gas_index = 3 if tx_type == 1 else 4
+        nonce, gas, to, data = fields[1], fields[gas_index], fields[gas_index + 1], fields[gas_index + 3]
+        fee = fields[gas_index - 1]
+    else:
+        tx_type = 0
+        fields = rlp.decode(raw)
+        nonce, fee, gas, to, data = fields[0], fields[1], fields[2], fields[3], fields[5]
+
+    return {
+        'from': Account.recover_transaction(raw),
+        'nonce': int.from_bytes(nonce, 'big'),
+        'gas': int.from_bytes(gas, 'big'),
+        'fee': int.from_bytes(fee, 'big'),
+        'to': '0x' + to.hex() if to else None,
+        'data': bytes(data),
+        'type': tx_type,
+        'raw': raw,
+    }
+
+
+class MockEndpoint:
+    """共享同一个 MockRpcNode 状态的额外 RPC 地址（属性可在运行中修改，例如 down=True 模拟宕机）"""
+
+    def __init__(self, node, extra_latency=0.0, http_error_rate=0.0, down=False):
+        """
+        extra_latency: 在节点延迟基础上额外增加的延迟（秒）
+        http_error_rate: 返回 HTTP 503 的概率
+        down: 为 True 时所有请求返回 HTTP 503
+        """
+        self.node = node
+        self.extra_latency = extra_latency
+        self.http_error_rate = http_error_rate
+        self.down = down
+        self.requests = 0
+        self.failed_requests = 0
+        self.url = None
+        self._runner = None
+
+    async def handle(self, http_request):
+        from aiohttp import web  # pyright: ignore[reportMissingImports]
+
+        self.requests += 1
+        if self.down or self.node.random.random() < self.http_error_rate:
+            self.failed_requests += 1
+            return web.Response(status=503, text='Service Unavailable')
+        if self.extra_latency:
+            await asyncio.sleep(self.extra_latency)
+        return await self.node._handle(http_request)
+
+
+class MockRpcNode:
+    """
+    模拟 JSON-RPC 节点
+
+    用法：
+        node = MockRpcNode(block_time=0.5, latency={'eth_sendRawTransaction': 0.02})
+        url = node.start()
+        ...
+        node.stop()
+    """
+
+    def __init__(self, chain_id=DEFAULT_CHAIN_ID, block_time=1.0, latency=0.0, error_rate=0.0,
+                 batch_supported=True, block_receipts=True, balance=DEFAULT_BALANCE,
+                 gas_estimate=DEFAULT_GAS_ESTIMATE, gas_used=None, revert_rate=0.0, max_concurrent=None,
+                 multicall=False, multicall_limit=None, stuck_rate=0.0, seed=None):
+        """
+        chain_id: 链 ID
+        block_time: 出块间隔（秒）
+        latency: 每个调用的处理延迟（秒），数字表示所有方法相同，字典表示按方法配置（'*' 为默认值）
+        error_rate: 注入错误的概率，格式同 latency
+        batch_supported: 是否支持 batch 请求（不支持时返回单个错误对象）
+        block_receipts: 是否支持 eth_getBlockReceipts
+        balance: 所有地址的余额（wei）
+        gas_estimate: eth_estimateGas 返回值
+        gas_used: 回执中的 gasUsed，默认为 gas_estimate
+        revert_rate: 交易执行失败（status=0，消耗全部 gas，模拟 gas 用尽）的概率
+        max_concurrent: 同时处理的 HTTP 请求上限，超过时返回 HTTP 429（模拟公共 RPC 的限流）
+        multicall: 是否在 MULTICALL3_ADDRESS 部署模拟的 Multicall3
+        multicall_limit: 单个 aggregate3 调用最多执行的子调用数，超过时返回 out of gas（测试自动拆分）
+        stuck_rate: 新交易卡在交易池中（不被打包，直到被同一 nonce 的交易替换）的概率
+        seed: 随机数种子（错误注入和执行失败可复现）
+        """
+        self.chain_id = chain_id
+        self.block_time = block_time
+        self.latency = latency
+        self.error_rate = error_rate
+        self.batch_supported = batch_supported
+        self.block_receipts = block_receipts
+        self.balance = balance
+        self.gas_estimate = gas_estimate
+        self.gas_used = gas_used if gas_used is not None else gas_estimate
+        self.revert_rate = revert_rate
+        self.max_concurrent = max_concurrent
+        self.multicall = multicall
+        self.multicall_limit = multicall_limit
+        self.stuck_rate = stuck_rate
+        self.random = random.Random(seed)
+        self.contracts = {}
+
+        self.head = 1
+        self.confirmed_nonces = {}
+        self.pending_nonces = {}
+        self.mempool = []
+        self.receipts = {}
+        self.block_hashes = {}
+
+        self.method_counts = Counter()
+        self.http_requests = 0
+        self.rejected_requests = 0
+        self.sent_transactions = 0
+        self.replaced_transactions = 0
+        self._in_flight = 0
+
+        self.url = None
+        self.endpoints = []
+        self._host = None
+        self._loop = None
+        self._thread = None
+        self._runner = None
+        self._miner = None
+        self._started = threading.Event()
+        self._handlers = {
+            'web3_clientVersion': lambda params: 'MockRpcNode/1.0',
+            'net_version': lambda params: str(self.chain_id),
+            'eth_chainId': lambda params: _hex(self.chain_id),
+            'eth_blockNumber': lambda params: _hex(self.head),
+            'eth_getBalance': lambda params: _hex(self.balance),
+            'eth_getTransactionCount': self._get_transaction_count,
+            'eth_gasPrice': lambda params: _hex(DEFAULT_BASE_FEE + DEFAULT_PRIORITY_FEE),
+            'eth_maxPriorityFeePerGas': lambda params: _hex(DEFAULT_PRIORITY_FEE),
+            'eth_feeHistory': self._fee_history,
+            'eth_getBlockByNumber': self._get_block_by_number,
+            'eth_estimateGas': lambda params: _hex(self.gas_estimate),
+            'eth_call': self._eth_call,
+            'eth_getCode': self._get_code,
+            'eth_sendRawTransaction': self._send_raw_transaction,
+            'eth_getTransactionReceipt': lambda params: self.receipts.get(params[0].lower()),
+            'eth_getBlockReceipts': self._get_block_receipts,
+        }
+
+    # ---------- 配置 ----------
+
+    def _setting(self, value, method):
+        if isinstance(value, dict):
+            return value.get(method, value.get('*', 0))
+        return value or 0
+
+    def register(self, method, handler):
+        """注册或替换方法处理函数 handler(params) -> result（抛出 RpcFault 返回错误）"""
+        self._handlers[method] = handler
+
+    def register_contract(self, address, handler):
+        """
+        注册模拟合约：eth_call 调用 address 时执行 handler(sender, data) -> 返回数据（bytes）
+
+        handler 抛出 CallReverted 表示调用 revert；发往 address 的交易同样按 handler 决定回执状态
+        """
+        self.contracts[address.lower()] = handler
+
+    # ---------- 状态 ----------
+
+    def _get_transaction_count(self, params):
+        address = params[0].lower()
+        tag = params[1] if len(params) > 1 else 'latest'
+        if tag == 'pending':
+            return _hex(self.pending_nonces.get(address, self.confirmed_nonces.get(address, 0)))
+        return _hex(self.confirmed_nonces.get(address, 0))
+
+    def _fee_history(self, params):
+        count = int(params[0], 16) if isinstance(params[0], str) else int(params[0])
+        percentiles = params[2] if len(params) > 2 else []
+        oldest = max(0, self.head - count + 1)
+        return {
+            'oldestBlock': _hex(oldest),
+            'baseFeePerGas': [_hex(DEFAULT_BASE_FEE)] * (count + 1),
+            'gasUsedRatio': [0.5] * count,
+            'reward': [[_hex(DEFAULT_PRIORITY_FEE)] * len(percentiles) for _ in range(count)],
+        }
+
+    def _block_number(self, tag):
+        if tag in ('latest', 'pending', 'safe', 'finalized'):
+            return self.head
+        if tag == 'earliest':
+            return 0
+        return int(tag, 16)
+
+    def _block_hash(self, number):
+        return self.block_hashes.setdefault(number, '0x' + number.to_bytes(32, 'big').hex())
+
+    def _get_block_by_number(self, params):
+        number = self._block_number(params[0])
+        if number > self.head:
+            return None
+        return {
+            'number': _hex(number),
+            'hash': self._block_hash(number),
+            'parentHash': self._block_hash(max(0, number - 1)),
+            'timestamp': _hex(1700000000 + number),
+            'baseFeePerGas': _hex(DEFAULT_BASE_FEE),
+            'gasLimit': _hex(30000000),
+            'gasUsed': _hex(0),
+            'transactions': [],
+        }
+
+    def _get_code(self, params):
+        address = params[0].lower()
+        if address in self.contracts or (self.multicall and address == MULTICALL3_ADDRESS.lower()):
+            return '0x6080604052'
+        return '0x'
+
+    def _execute_call(self, sender, to, data):
+        """执行一个调用，返回 (success, 返回数据或 revert 数据)"""
+        if self.multicall and to == MULTICALL3_ADDRESS.lower() and data[:4] == GET_ETH_BALANCE_SELECTOR:
+            return True, self.balance.to_bytes(32, 'big')
+        handler = self.contracts.get(to)
+        if handler is None:
+            return True, b''
+        try:
+            return True, bytes(handler(sender, data))
+        except CallReverted as e:
+            return False, e.data
+
+    def _aggregate3(self, sender, data):
+        from eth_abi import encode, decode  # pyright: ignore[reportMissingImports]
+
+        calls = decode(['(address,bool,bytes)[]'], data)[0]
+        if self.multicall_limit is not None and len(calls) > self.multicall_limit:
+            raise RpcFault(INJECTED_ERROR, 'out of gas')
+        results = []
+        for target, allow_failure, call_data in calls:
+            success, result = self._execute_call(MULTICALL3_ADDRESS.lower(), target.lower(), call_data)
+            if not success and not allow_failure:
+                raise RpcFault(REVERTED, 'execution reverted: Multicall3: call failed')
+            results.append((success, result))
+        return encode(['(bool,bytes)[]'], [results])
+
+    def _eth_call(self, params):
+        call = params[0]
+        sender = (call.get('from') or '0x' + '00' * 20).lower()
+        to = (call.get('to') or '').lower()
+        raw = call.get('data') or call.get('input') or '0x'
+        data = bytes.fromhex(raw[2:])
+
+        if self.multicall and to == MULTICALL3_ADDRESS.lower() and data[:4] == AGGREGATE3_SELECTOR:
+            return '0x' + self._aggregate3(sender, data[4:]).hex()
+        success, result = self._execute_call(sender, to, data)
+        if not success:
+            raise RpcFault(REVERTED, 'execution reverted', data='0x' + result.hex())
+        return '0x' + result.hex()
+
+    def _get_block_receipts(self, params):
+        if not self.block_receipts:
+            raise RpcFault(METHOD_NOT_FOUND, 'the method eth_getBlockReceipts does not exist/is not available')
+        number = _hex(self._block_number(params[0]))
+        return [receipt for receipt in self.receipts.values() if receipt['blockNumber'] == number]
+
+    def _send_raw_transaction(self, params):
+        from eth_utils import keccak  # pyright: ignore[reportMissingImports]
+
+        tx = decode_raw_transaction(params[0])
+        sender = tx['from'].lower()
+        confirmed = self.confirmed_nonces.get(sender, 0)
+        pending = self.pending_nonces.get(sender, confirmed)
+        if tx['nonce'] < confirmed:
+            raise RpcFault(INJECTED_ERROR, 'nonce too low')
+        if tx['nonce'] > pending:
+            raise RpcFault(INJECTED_ERROR, f"nonce too high: expected {pending}, got {tx['nonce']}")
+
+        tx_hash = '0x' + keccak(tx['raw']).hex()
+        tx['hash'] = tx_hash
+        if tx['nonce'] == pending:
+            self.pending_nonces[sender] = pending + 1
+            tx['stuck'] = self.random.random() < self.stuck_rate
+            self.mempool.append(tx)
+            self.sent_transactions += 1
+            return tx_hash
+
+        # 替换交易池中同一 nonce 的交易：费用至少提高 10%（与 geth 的 txpool.pricebump 默认值相同）
+        for index, queued in enumerate(self.mempool):
+            if queued['from'].lower() == sender and queued['nonce'] == tx['nonce']:
+                if queued['hash'] == tx_hash:
+                    raise RpcFault(INJECTED_ERROR, 'already known')
+                if tx['fee'] * 10 < queued['fee'] * 11:
+                    raise RpcFault(INJECTED_ERROR, 'replacement transaction underpriced')
+                tx['stuck'] = False
+                self.mempool[index] = tx
+                self.sent_transactions += 1
+                self.replaced_transactions += 1
+                break
+        return tx_hash
+
+    def _mine(self):
+        self.head += 1
+        block_number = _hex(self.head)
+        block_hash = self._block_hash(self.head)
+        cumulative = 0
+        # 卡住的交易留在交易池中，同一发送方之后的交易也不能被打包
+        remaining = []
+        blocked = set()
+        included = []
+        for tx in self.mempool:
+            sender = tx['from'].lower()
+            if tx.get('stuck') or sender in blocked:
+                blocked.add(sender)
+                remaining.append(tx)
+            else:
+                included.append(tx)
+        for index, tx in enumerate(included):
+            sender = tx['from'].lower()
+            self.confirmed_nonces[sender] = max(self.confirmed_nonces.get(sender, 0), tx['nonce'] + 1)
+            # revert_rate 模拟 gas 用尽（消耗全部 gas）；合约 revert 只消耗实际执行的 gas
+            out_of_gas = self.random.random() < self.revert_rate
+            status = 0 if out_of_gas else 1
+            if status and tx['to'] is not None:
+                status = 1 if self._execute_call(sender, tx['to'].lower(), tx['data'])[0] else 0
+            gas_used = tx['gas'] if out_of_gas else min(self.gas_used, tx['gas'])
+            cumulative += gas_used
+            self.receipts[tx['hash']] = {
+                'transactionHash': tx['hash'],
+                'transactionIndex': _hex(index),
+                'blockNumber': block_number,
+                'blockHash': block_hash,
+                'from': tx['from'],
+                'to': tx['to'],
+                'status': _hex(status),
+                'gasUsed': _hex(gas_used),
+                'cumulativeGasUsed': _hex(cumulative),
+                'effectiveGasPrice': _hex(DEFAULT_BASE_FEE + DEFAULT_PRIORITY_FEE),
+                'contractAddress': None,
+                'logs': [],
+                'logsBloom': '0x' + '00' * 256,
+                'type': _hex(tx['type']),
+            }
+        self.mempool = remaining
+
+    async def _produce_blocks(self):
+        while True:
+            await asyncio.sleep(self.block_time)
+            self._mine()
+
+    # ---------- 请求处理 ----------
+
+    async def _call(self, request):
+        method = request.get('method')
+        response = {'jsonrpc': '2.0', 'id': request.get('id')}
+        self.method_counts[method] += 1
+
+        handler = self._handlers.get(method)
+        try:
+            if handler is None:
+                raise RpcFault(METHOD_NOT_FOUND, f'the method {method} does not exist/is not available')
+            if self.random.random() < self._setting(self.error_rate, method):
+                raise RpcFault(INJECTED_ERROR, f'mock: injected error for {method}')
+            response['result'] = handler(request.get('params') or [])
+        except RpcFault as e:
+            response['error'] = {'code': e.code, 'message': e.message}
+            if e.data is not None:
+                response['error']['data'] = e.data
+        except Exception as e:
+            response['error'] = {'code': -32602, 'message': f'invalid params: {e}'}
+        return response
+
+    async def _handle(self, http_request):
+        from aiohttp import web  # pyright: ignore[reportMissingImports]
+
+        self.http_requests += 1
+        if self.max_concurrent is not None and self._in_flight >= self.max_concurrent:
+            self.rejected_requests += 1
+            return web.Response(status=429, text='Too Many Requests')
+
+        self._in_flight += 1
+        try:
+            return await self._process(http_request)
+        finally:
+            self._in_flight -= 1
+
+    async def _process(self, http_request):
+        from aiohttp import web  # pyright: ignore[reportMissingImports]
+
+        try:
+            payload = json.loads(await http_request.read())
+        except ValueError:
+            return web.json_response({'jsonrpc': '2.0', 'id': None,
+                                      'error': {'code': -32700, 'message': 'parse error'}})
+
+        calls = payload if isinstance(payload, list) else [payload]
+        # 同一个 batch 中的调用并行处理，延迟取最大值
+        delay = max((self._setting(self.latency, call.get('method')) for call in calls), default=0)
+        if delay:
+            await asyncio.sleep(delay)
+
+        if isinstance(payload, list):
+            if not self.batch_supported:
+                return web.json_response({'jsonrpc': '2.0', 'id': None,
+                                          'error': {'code': -32600, 'message': 'batch requests are not supported'}})
+            return web.json_response([await self._call(call) for call in calls])
+        return web.json_response(await self._call(payload))
+
+    # ---------- 启动 / 停止 ----------
+
+    async def _listen(self, handler, host, port):
+        """启动一个 HTTP 服务，返回 (AppRunner, url)"""
+        from aiohttp import web  # pyright: ignore[reportMissingImports]
+
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post('/', handler)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        return runner, f'http://{host}:{bound_port}'
+
+    async def _start(self, host, port):
+        self._host = host
+        self._runner, self.url = await self._listen(self._handle, host, port)
+        self._miner = asyncio.ensure_future(self._produce_blocks())
+
+    def _serve(self, host, port):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._start(host, port))
+        self._started.set()
+        self._loop.run_forever()
+
+    def start(self, host='127.0.0.1', port=0):
+        """在后台线程启动节点，返回 RPC 地址"""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._serve, args=(host, port), daemon=True)
+        self._thread.start()
+        self._started.wait()
+        return self.url
+
+    def add_endpoint(self, extra_latency=0.0, http_error_rate=0.0, down=False):
+        """
+        添加一个共享链状态的 RPC 地址（需要先调用 start()）
+
+        Returns:
+            MockEndpoint，endpoint.url 为 RPC 地址
+        """
+        endpoint = MockEndpoint(self, extra_latency=extra_latency, http_error_rate=http_error_rate, down=down)
+
+        async def listen():
+            endpoint._runner, endpoint.url = await self._listen(endpoint.handle, self._host, 0)
+
+        asyncio.run_coroutine_threadsafe(listen(), self._loop).result(timeout=10)
+        self.endpoints.append(endpoint)
+        return endpoint
+
+    def stop(self):
+        if self._loop is None:
+            return
+
+        async def shutdown():
+            self._miner.cancel()
+            for endpoint in self.endpoints:
+                await endpoint._runner.cleanup()
+            await self._runner.cleanup()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+        self._loop.close()
+        self._loop = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    @property
+    def rpc_calls(self):
+        return sum(self.method_counts.values())
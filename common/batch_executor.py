@@ -0,0 +1,227 @@
+"""
+批量任务执行器
+
+功能：
+- 对大量钱包逐个执行同一个任务函数（线程池或 asyncio），opn-faucet.py 和 opn-claim.py 共用
+- 边加载边提交：已提交未完成的任务数有上限（可以随自适应并发调整），不会一次创建数百万个 Future
+- 计数器按线程分开（WorkerStats），任务中计数不需要加锁，读取时合并
+- 收到 SIGINT（Ctrl+C）时停止提交新任务、丢弃排队中的任务，等待进行中的任务完成后正常返回，
+  调用方照常输出统计并写出已完成的结果；再次按 Ctrl+C 时抛出 KeyboardInterrupt
+"""
+
+import signal
+import asyncio
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# 任务因中断没有执行
+_SKIPPED = object()
+
+
+class WorkerStats:
+    """单个线程的计数器（只由所属线程写入）"""
+
+    def __init__(self, name):
+        self.name = name
+        self.counts = {}
+
+    def inc(self, key, value=1):
+        self.counts[key] = self.counts.get(key, 0) + value
+
+    def snapshot(self):
+        # 其他线程读取时所属线程可能正在添加新的键，复制失败时重试
+        while True:
+            try:
+                return dict(self.counts)
+            except RuntimeError:
+                continue
+
+
+class BatchExecutor:
+    """
+    批量任务执行器
+
+    用法：
+        executor = BatchExecutor(workers=8, on_done=report_progress)
+        with executor.handle_interrupt():
+            executor.run(process_wallet, iter_wallet_chunks(wallet_file))        # 线程池
+            await executor.async_run(async_process_wallet, chunks)                # asyncio
+
+        任务中计数：executor.stats.inc('success')
+        读取合计：executor.total('success')
+    """
+
+    def __init__(self, workers=4, max_pending=None, on_done=None, name='batch'):
+        """
+        workers: 线程数（async_run 中为同时执行的任务数）
+        max_pending: 已提交未完成的任务数上限，默认 workers * 4；可以传入函数，每次提交前重新读取（自适应并发）
+        on_done: 任务完成后在提交任务的线程中调用 on_done(item, result, error)，error 为任务抛出的异常或 None
+        name: 线程名前缀
+        """
+        self.workers = workers
+        self._max_pending = max_pending
+        self.on_done = on_done
+        self.name = name
+        self.cancelled = False
+        self._local = threading.local()
+        self._all_stats = []
+        self._stats_lock = threading.Lock()  # 只在线程第一次计数时使用
+
+    @property
+    def max_pending(self):
+        value = self._max_pending() if callable(self._max_pending) else self._max_pending
+        return max(1, value or self.workers * 4)
+
+    @property
+    def stats(self):
+        """当前线程的计数器"""
+        stats = getattr(self._local, 'stats', None)
+        if stats is None:
+            stats = self._local.stats = WorkerStats(threading.current_thread().name)
+            with self._stats_lock:
+                self._all_stats.append(stats)
+        return stats
+
+    def totals(self):
+        """合并所有线程的计数器"""
+        with self._stats_lock:
+            all_stats = list(self._all_stats)
+        totals = Counter()
+        for stats in all_stats:
+            totals.update(stats.snapshot())
+        return totals
+
+    def total(self, key):
+        return self.totals().get(key, 0)
+
+    def cancel(self):
+        """停止提交新任务，排队中的任务不再执行"""
+        self.cancelled = True
+
+    @contextmanager
+    def handle_interrupt(self):
+        """在此期间第一次 Ctrl+C 只调用 cancel()，第二次抛出 KeyboardInterrupt（只能在主线程中使用）"""
+        if threading.current_thread() is not threading.main_thread():
+            yield self
+            return
+
+        def handler(signum, frame):
+            if self.cancelled:
+                raise KeyboardInterrupt
+            self.cancel()
+
+        previous = signal.signal(signal.SIGINT, handler)
+        try:
+            yield self
+        finally:
+            signal.signal(signal.SIGINT, previous)
+
+    def _finish(self, pending, done):
+        """处理已完成的任务（Future 或 asyncio.Task）"""
+        stats = self.stats
+        for future in done:
+            item = pending.pop(future)
+            if future.cancelled():
+                stats.inc('cancelled')
+                continue
+            error = future.exception()
+            result = None if error is not None else future.result()
+            if result is _SKIPPED:
+                stats.inc('cancelled')
+                continue
+            stats.inc('errors' if error is not None else 'completed')
+            if self.on_done is not None:
+                self.on_done(item, result, error)
+
+    def _guarded(self, task, item):
+        if self.cancelled:
+            return _SKIPPED
+        return task(item)
+
+    def run(self, task, chunks):
+        """
+        在线程池中对每个元素执行 task(item)
+
+        Args:
+            task: 任务函数
+            chunks: 按块产出元素的可迭代对象（例如 iter_wallet_chunks），每块为一个列表
+
+        Returns:
+            合并后的计数器
+        """
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+        pending = {}
+        interrupted = False
+        try:
+            for items in chunks:
+                for item in items:
+                    while len(pending) >= self.max_pending and not self.cancelled:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        self._finish(pending, done)
+                    if self.cancelled:
+                        break
+                    pending[executor.submit(self._guarded, task, item)] = item
+                if self.cancelled:
+                    break
+
+            # 等待剩余任务完成（中断时排队中的任务直接取消）
+            if self.cancelled:
+                for future in pending:
+                    future.cancel()
+            done, _ = wait(pending)
+            self._finish(pending, done)
+        except BaseException:
+            interrupted = True
+            self.cancel()
+            raise
+        finally:
+            executor.shutdown(wait=not interrupted, cancel_futures=True)
+        return self.totals()
+
+    async def _async_guarded(self, task, item, semaphore):
+        async with semaphore:
+            if self.cancelled:
+                return _SKIPPED
+            return await task(item)
+
+    async def async_run(self, task, chunks):
+        """
+        在当前事件循环中对每个元素执行 await task(item)，同时执行的任务数不超过 workers
+
+        chunks 的迭代（钱包加载、余额查询等阻塞操作）放到线程中执行，边加载边创建任务
+        """
+        semaphore = asyncio.Semaphore(self.workers)
+        iterator = iter(chunks)
+        pending = {}
+        try:
+            while not self.cancelled:
+                items = await asyncio.to_thread(next, iterator, None)
+                if items is None:
+                    break
+                for item in items:
+                    while len(pending) >= self.max_pending and not self.cancelled:
+                        done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        self._finish(pending, done)
+                    if self.cancelled:
+                        break
+                    pending[asyncio.create_task(self._async_guarded(task, item, semaphore))] = item
+
+            # 等待剩余任务完成（中断时还没开始的任务不再执行）
+            if pending:
+                done, _ = await asyncio.wait(pending)
+                self._finish(pending, done)
+        except BaseException:
+            self.cancel()
+            for future in pending:
+                future.cancel()
+            raise
+        return self.totals()
+
+    def summary(self):
+        totals = self.totals()
+        text = f"已完成 {totals.get('completed', 0)} 个任务，异常 {totals.get('errors', 0)} 个"
+        if self.cancelled:
+            text += f"，因中断未执行 {totals.get('cancelled', 0)} 个"
+        return text
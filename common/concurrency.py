@@ -0,0 +1,147 @@
+"""
+自适应并发控制（AIMD）
+
+功能：
+- 根据观测到的 RPC 延迟和错误率自动调整同时进行的任务数，不需要手动调节 MAX_WORKERS
+- 慢启动：尚未出现拥塞时每个统计周期并发数翻倍
+- 加性增：没有拥塞时每个统计周期增加 increase
+- 乘性减：错误率超过阈值（429、5xx、超时、连接错误）或延迟明显高于基线时乘以 decrease
+- 并发数始终在 [min_limit, max_limit] 范围内
+- 线程安全，作为 Metrics 的 RPC 监听器接收样本（metrics.add_rpc_listener(limiter.on_rpc)）
+"""
+
+import time
+import threading
+
+
+class AdaptiveConcurrency:
+    def __init__(self, initial=4, min_limit=1, max_limit=64, increase=1, decrease=0.7, error_threshold=0.05,
+                 latency_tolerance=2.0, interval=1.0, min_samples=10, on_change=None):
+        """
+        initial: 初始并发数
+        min_limit / max_limit: 并发数上下限
+        increase: 每个统计周期的加性增量
+        decrease: 出现拥塞时的乘性减系数（0-1）
+        error_threshold: 错误率阈值，超过时认为出现拥塞
+        latency_tolerance: 平均延迟超过基线的倍数时认为出现拥塞
+        interval: 统计周期（秒），周期结束且样本数不少于 min_samples 时调整一次
+        min_samples: 每个统计周期至少需要的样本数
+        on_change: 并发数变化时调用 on_change(old_limit, new_limit, reason)
+        """
+        if min_limit < 1 or max_limit < min_limit:
+            raise ValueError(f"并发数范围无效: [{min_limit}, {max_limit}]")
+        if not 0 < decrease < 1:
+            raise ValueError(f"decrease 需要在 0 到 1 之间: {decrease}")
+
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.error_threshold = error_threshold
+        self.latency_tolerance = latency_tolerance
+        self.interval = interval
+        self.min_samples = min_samples
+        self.on_change = on_change
+
+        self._limit = float(min(max(initial, min_limit), max_limit))
+        self._slow_start = True
+        self._baseline = None  # 无拥塞时的平均延迟（取各周期最小值，并缓慢上调以适应网络变化）
+        self._lock = threading.Lock()
+        self._reset_window(time.monotonic())
+
+        # 统计信息
+        self.increases = 0
+        self.decreases = 0
+        self.peak = self.limit
+        self.samples = 0
+        self.errors = 0
+
+    @property
+    def limit(self):
+        """当前允许同时进行的任务数"""
+        return int(self._limit)
+
+    def _reset_window(self, now):
+        self._window_start = now
+        self._window_count = 0
+        self._window_errors = 0
+        self._window_latency = 0.0
+        self._window_latency_count = 0
+
+    def record(self, latency=None, error=False):
+        """
+        记录一个样本
+
+        latency: 请求耗时（秒），为 None 时只统计错误
+        error: 是否为过载类错误（429、5xx、超时、连接错误）
+        """
+        now = time.monotonic()
+        change = None
+        with self._lock:
+            self.samples += 1
+            self._window_count += 1
+            if error:
+                self.errors += 1
+                self._window_errors += 1
+            elif latency is not None:
+                self._window_latency += latency
+                self._window_latency_count += 1
+
+            if now - self._window_start >= self.interval and self._window_count >= self.min_samples:
+                change = self._adjust()
+                self._reset_window(now)
+
+        if change is not None and self.on_change is not None:
+            self.on_change(*change)
+
+    def on_rpc(self, methods, elapsed, error):
+        """
+        Metrics RPC 监听器
+
+        batch 请求（多个方法）的耗时与单个调用不可比，只统计其错误
+        """
+        latency = elapsed if len(methods) == 1 else None
+        self.record(latency, error=error is not None)
+
+    def _adjust(self):
+        """根据当前统计周期调整并发数（调用方持有锁），返回 (旧值, 新值, 原因) 或 None"""
+        old = self.limit
+        error_rate = self._window_errors / self._window_count
+        mean_latency = (self._window_latency / self._window_latency_count
+                        if self._window_latency_count else None)
+
+        congested = None
+        if error_rate > self.error_threshold:
+            congested = f"错误率 {error_rate:.0%}"
+        elif mean_latency is not None and self._baseline is not None \
+                and mean_latency > self._baseline * self.latency_tolerance:
+            congested = f"延迟 {mean_latency:.3f}s（基线 {self._baseline:.3f}s）"
+
+        if mean_latency is not None and not congested:
+            # 基线取无拥塞周期的最小平均延迟，每个周期上调 1%，避免长期停留在偶然的低值
+            self._baseline = mean_latency if self._baseline is None else min(self._baseline * 1.01, mean_latency)
+
+        if congested:
+            self._slow_start = False
+            self._limit = max(self.min_limit, self._limit * self.decrease)
+            reason = congested
+        elif self._slow_start:
+            self._limit = min(self.max_limit, self._limit * 2)
+            reason = "慢启动"
+        else:
+            self._limit = min(self.max_limit, self._limit + self.increase)
+            reason = "无拥塞"
+
+        new = self.limit
+        if new == old:
+            return None
+        if new > old:
+            self.increases += 1
+            self.peak = max(self.peak, new)
+        else:
+            self.decreases += 1
+        return old, new, reason
+
+    def summary(self):
+        return (f"自适应并发: 当前 {self.limit}（范围 {self.min_limit}-{self.max_limit}，峰值 {self.peak}），"
+                f"增加 {self.increases} 次，减少 {self.decreases} 次，样本 {self.samples} 个，过载错误 {self.errors} 个")
@@ -1,7 +1,15 @@
 import os
 import json
-import yaml
-from dotenv import load_dotenv
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+def parse_bool(value, default=False):
+    """解析 .env 中的布尔值"""
+    if value is None:
+        return default
+    return str(value).strip().lower() in TRUE_VALUES
+
 
 class ConfigLoader:
     def __init__(self, config_dir):
@@ -10,27 +18,42 @@ class ConfigLoader:
         """
         self.config_dir = config_dir
         self.config = {}
-        # 优先读取环境变量
-        load_dotenv(os.path.join(config_dir, '.env'))
+        # 类型转换后的结果缓存，配置变化时清空
+        self._typed_cache = {}
+        # 优先读取环境变量（python-dotenv 只在需要时才导入）
+        self._env_loaded = False
+
+    def _load_dotenv(self):
+        if self._env_loaded:
+            return
+        self._env_loaded = True
+        path = os.path.join(self.config_dir, '.env')
+        if os.path.exists(path):
+            from dotenv import load_dotenv  # pyright: ignore[reportMissingImports]
+            load_dotenv(path)
 
     def load_json(self, filename="wallet.json"):
         path = os.path.join(self.config_dir, filename)
         if os.path.exists(path):
             with open(path, 'r', encoding='utf-8') as f:
                 self.config.update(json.load(f))
+            self._typed_cache.clear()
         return self
 
     def load_yaml(self, filename="config.yaml"):
         path = os.path.join(self.config_dir, filename)
         if os.path.exists(path):
+            import yaml  # pyright: ignore[reportMissingModuleSource]
             with open(path, 'r', encoding='utf-8') as f:
                 self.config.update(yaml.safe_load(f))
+            self._typed_cache.clear()
         return self
 
     def load_env(self, keys=None):
         """
         keys: 要读取的环境变量列表, 默认读取所有已配置的 keys
         """
+        self._load_dotenv()
         if keys:
             for k in keys:
                 value = os.getenv(k)
@@ -42,7 +65,51 @@ class ConfigLoader:
                 value = os.getenv(k)
                 if value is not None:
                     self.config[k] = value
+        self._typed_cache.clear()
+        return self
+
+    def set(self, key, value):
+        """直接设置配置项（覆盖文件和环境变量中的值）"""
+        self.config[key] = value
+        self._typed_cache.clear()
         return self
 
     def get(self, key, default=None):
-        return self.config.get(key, default)
\ No newline at end of file
+        return self.config.get(key, default)
+
+    def _get_typed(self, key, default, kind, convert):
+        cache_key = (key, kind, default)
+        try:
+            return self._typed_cache[cache_key]
+        except KeyError:
+            pass
+
+        value = self.config.get(key)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            result = default
+        else:
+            try:
+                result = convert(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"配置项 {key} 的值无效（需要 {kind}）: {value!r}")
+        self._typed_cache[cache_key] = result
+        return result
+
+    def get_int(self, key, default=None):
+        """读取整数配置（结果缓存，未配置时返回 default）"""
+        return self._get_typed(key, default, 'int', lambda value: int(str(value).strip()))
+
+    def get_float(self, key, default=None):
+        """读取浮点数配置（结果缓存，未配置时返回 default）"""
+        return self._get_typed(key, default, 'float', lambda value: float(str(value).strip()))
+
+    def get_bool(self, key, default=False):
+        """读取布尔配置（1 / true / yes / on 为真，结果缓存，未配置时返回 default）"""
+        return self._get_typed(key, default, 'bool', parse_bool)
+
+    def get_str(self, key, default=None, lower=False):
+        """读取字符串配置（去除首尾空白，lower=True 时转为小写）"""
+        def convert(value):
+            value = str(value).strip()
+            return value.lower() if lower else value
+        return self._get_typed(key, default, 'lower' if lower else 'str', convert)
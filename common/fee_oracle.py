@@ -0,0 +1,135 @@
+"""
+共享 gas 费用预言机
+
+功能：
+- 所有 worker 共享一个实例，每个 TTL 周期（或每个新区块）只刷新一次费用数据
+- 支持 legacy gasPrice（eth_gasPrice）和 EIP-1559 maxFeePerGas / maxPriorityFeePerGas（eth_feeHistory）
+- EIP-1559 模式按 feeHistory 奖励的指定百分位计算小费
+- 支持费用倍数，刷新期间其他 worker 等待同一次查询结果
+"""
+
+import time
+import asyncio
+import threading
+
+FEE_MODES = ('legacy', 'eip1559')
+
+
+class FeeOracle:
+    def __init__(self, mode='legacy', ttl=3.0, percentile=50, multiplier=1.0, history_blocks=5):
+        """
+        mode: legacy 或 eip1559
+        ttl: 费用数据缓存时间（秒）
+        percentile: EIP-1559 小费取 feeHistory 奖励的百分位（0-100）
+        multiplier: 费用倍数，例如 1.1 表示在查询结果基础上加价 10%
+        history_blocks: eth_feeHistory 查询的区块数量
+        """
+        if mode not in FEE_MODES:
+            raise ValueError(f"不支持的费用模式: {mode}（可选 {' / '.join(FEE_MODES)}）")
+
+        self.mode = mode
+        self.ttl = ttl
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.history_blocks = history_blocks
+
+        self._fees = None
+        self._updated_at = 0.0
+        self._block_number = None
+        self._stale = False
+        self._refresh_count = 0
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._async_refresh_lock = None
+
+    @property
+    def refresh_count(self):
+        """实际向节点查询费用的次数"""
+        return self._refresh_count
+
+    def _cached(self):
+        with self._lock:
+            if self._fees is None or self._stale:
+                return None
+            if time.monotonic() - self._updated_at >= self.ttl:
+                return None
+            return self._fees
+
+    def _store(self, fees):
+        with self._lock:
+            self._fees = fees
+            self._updated_at = time.monotonic()
+            self._stale = False
+            self._refresh_count += 1
+        return fees
+
+    def invalidate(self):
+        """使缓存失效，下一次获取时重新查询"""
+        with self._lock:
+            self._stale = True
+
+    def notify_block(self, block_number):
+        """收到新区块时调用，区块高度变化后下一次获取会重新查询"""
+        with self._lock:
+            if self._block_number is not None and block_number > self._block_number:
+                self._stale = True
+            self._block_number = block_number
+
+    def _compute(self, gas_price=None, fee_history=None):
+        """根据查询结果计算交易费用字段"""
+        if self.mode == 'legacy':
+            return {'gasPrice': int(gas_price * self.multiplier)}
+
+        base_fee = fee_history['baseFeePerGas'][-1]  # 最后一项是下一个区块的 base fee
+        rewards = sorted(reward[0] for reward in (fee_history.get('reward') or []) if reward)
+        priority_fee = rewards[len(rewards) // 2] if rewards else 0
+
+        priority_fee = int(priority_fee * self.multiplier)
+        return {
+            'type': 2,
+            'maxPriorityFeePerGas': priority_fee,
+            'maxFeePerGas': int(base_fee * 2 * self.multiplier) + priority_fee,
+        }
+
+    def get_fees(self, w3):
+        """
+        获取交易费用字段（线程安全）
+
+        Returns:
+            legacy 模式: {'gasPrice': ...}
+            eip1559 模式: {'type': 2, 'maxFeePerGas': ..., 'maxPriorityFeePerGas': ...}
+        """
+        fees = self._cached()
+        if fees is not None:
+            return fees
+
+        with self._refresh_lock:
+            # 等锁期间其他线程可能已经刷新过
+            fees = self._cached()
+            if fees is not None:
+                return fees
+
+            if self.mode == 'legacy':
+                return self._store(self._compute(gas_price=w3.eth.gas_price))
+            fee_history = w3.eth.fee_history(self.history_blocks, 'latest', [self.percentile])
+            return self._store(self._compute(fee_history=fee_history))
+
+    async def aget_fees(self, aw3):
+        """获取交易费用字段（AsyncWeb3 版本）"""
+        fees = self._cached()
+        if fees is not None:
+            return fees
+
+        if self._async_refresh_lock is None:
+            self._async_refresh_lock = asyncio.Lock()
+
+        async with self._async_refresh_lock:
+            fees = self._cached()
+            if fees is not None:
+                return fees
+
+            if self.mode == 'legacy':
+                return self._store(self._compute(gas_price=await aw3.eth.gas_price))
+            fee_history = await aw3.eth.fee_history(self.history_blocks, 'latest', [self.percentile])
+            return self._store(self._compute(fee_history=fee_history))
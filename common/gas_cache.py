@@ -0,0 +1,97 @@
+"""
+gas 估算缓存
+
+功能：
+- 对发往同一合约、相同 calldata / value / chainId 的交易复用 gas 估算结果
+- 每个 key 只采样少量 eth_estimateGas 结果，之后直接取采样最大值
+- 交易出现 out of gas 时使缓存失效，重新采样
+"""
+
+import threading
+
+# 节点返回这些错误时说明 gas limit 不足
+OUT_OF_GAS_PATTERNS = (
+    "out of gas",
+    "intrinsic gas too low",
+    "gas required exceeds allowance",
+)
+
+
+def is_out_of_gas_error(error):
+    """判断错误是否由 gas limit 不足引起"""
+    message = str(error).lower()
+    return any(pattern in message for pattern in OUT_OF_GAS_PATTERNS)
+
+
+class GasEstimateCache:
+    def __init__(self, samples=3, buffer=1.2, fallback=200000):
+        """
+        samples: 每个 key 采样的估算次数
+        buffer: gas limit 缓冲倍数（在估算结果基础上增加 20%）
+        fallback: 估算失败时使用的默认 gas limit
+        """
+        self.samples = max(1, samples)
+        self.buffer = buffer
+        self.fallback = fallback
+        self.hits = 0
+        self.misses = 0
+
+        self._samples = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(transaction):
+        """缓存 key: (to, data, value, chainId)"""
+        return (
+            transaction['to'].lower(),
+            transaction.get('data', '0x').lower(),
+            int(transaction.get('value', 0)),
+            transaction.get('chainId'),
+        )
+
+    def _limit(self, key):
+        return int(max(self._samples[key]) * self.buffer)
+
+    def lookup(self, key):
+        """
+        查询缓存的 gas limit
+
+        Returns:
+            缓存的 gas limit；返回 None 时调用方需要自行估算，
+            然后调用 add_sample（成功）或 discard（失败）
+        """
+        with self._lock:
+            collected = len(self._samples.get(key, ()))
+            pending = self._pending.get(key, 0)
+
+            # 采样数量足够，或剩余采样名额已被其他线程占用
+            if collected >= self.samples or (collected and collected + pending >= self.samples):
+                self.hits += 1
+                return self._limit(key)
+
+            self.misses += 1
+            self._pending[key] = pending + 1
+            return None
+
+    def add_sample(self, key, estimated_gas):
+        """
+        记录一次估算结果
+
+        Returns:
+            加上缓冲后的 gas limit
+        """
+        with self._lock:
+            self._pending[key] = max(0, self._pending.get(key, 0) - 1)
+            self._samples.setdefault(key, []).append(estimated_gas)
+            return int(estimated_gas * self.buffer)
+
+    def discard(self, key):
+        """估算失败时释放采样名额"""
+        with self._lock:
+            self._pending[key] = max(0, self._pending.get(key, 0) - 1)
+
+    def invalidate(self, key):
+        """清除 key 的全部采样（交易 out of gas 时调用）"""
+        with self._lock:
+            self._samples.pop(key, None)
@@ -0,0 +1,197 @@
+"""
+HD 钱包（BIP-39 / BIP-32）批量派生
+
+功能：
+- 用一个助记词 + 派生路径范围（如 m/44'/60'/0'/0/0..99）代替大量独立私钥
+- 父节点只派生一次并缓存（私钥、链码、压缩公钥），每个子私钥只需一次 HMAC-SHA512
+- 大批量派生时分块在进程池中并行计算
+"""
+
+import hmac
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_BASE_PATH = "m/44'/60'/0'/0"
+DEFAULT_CHUNK_SIZE = 1000
+HARDENED = 0x80000000
+SECP256K1_N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+
+
+def generate_mnemonic(num_words=12):
+    """生成新的 BIP-39 英文助记词"""
+    from eth_account.hdaccount import generate_mnemonic as _generate_mnemonic  # pyright: ignore[reportMissingImports]
+    try:
+        from eth_account.types import Language  # pyright: ignore[reportMissingImports]
+        lang = Language.ENGLISH
+    except ImportError:
+        lang = 'english'
+    return _generate_mnemonic(num_words, lang)
+
+
+def mnemonic_to_seed(mnemonic, passphrase=""):
+    """校验助记词并转换为 BIP-39 种子"""
+    from eth_account.hdaccount import seed_from_mnemonic  # pyright: ignore[reportMissingImports]
+    return seed_from_mnemonic(mnemonic, passphrase)
+
+
+def parse_path(path):
+    """
+    解析派生路径
+
+    Returns:
+        索引列表，硬化索引已加上 0x80000000
+    """
+    parts = path.strip().split('/')
+    if parts[0] != 'm':
+        raise ValueError(f"派生路径必须以 m 开头: {path}")
+
+    indices = []
+    for part in parts[1:]:
+        if not part:
+            continue
+        hardened = part.endswith("'") or part.lower().endswith('h')
+        index = int(part.rstrip("'hH"))
+        if index < 0 or index >= HARDENED:
+            raise ValueError(f"派生路径索引超出范围: {part}")
+        indices.append(index + HARDENED if hardened else index)
+    return indices
+
+
+def parse_path_range(path_range):
+    """
+    解析派生路径范围，如 m/44'/60'/0'/0/0..99（两端都包含）
+
+    Returns:
+        (base_path, start, count)
+    """
+    base_path, _, last = path_range.strip().rpartition('/')
+    if '..' not in last:
+        raise ValueError(f"派生路径范围格式应为 m/.../起始..结束: {path_range}")
+    first, _, end = last.partition('..')
+    start, end = int(first), int(end)
+    if end < start:
+        raise ValueError(f"派生路径范围结束索引小于起始索引: {path_range}")
+    return base_path, start, end - start + 1
+
+
+def compressed_public_key(private_key):
+    """私钥对应的压缩公钥（33 字节）"""
+    from eth_keys import keys  # pyright: ignore[reportMissingImports]
+    return keys.PrivateKey(private_key).public_key.to_compressed_bytes()
+
+
+def private_key_to_address(private_key):
+    """私钥对应的 checksum 地址"""
+    from eth_keys import keys  # pyright: ignore[reportMissingImports]
+    return keys.PrivateKey(private_key).public_key.to_checksum_address()
+
+
+class HDNode:
+    """BIP-32 扩展私钥节点（缓存压缩公钥，连续派生子节点时不重复计算）"""
+
+    __slots__ = ('key', 'chain_code', '_public_key')
+
+    def __init__(self, key, chain_code, public_key=None):
+        self.key = key
+        self.chain_code = chain_code
+        self._public_key = public_key
+
+    @classmethod
+    def from_seed(cls, seed):
+        digest = hmac.new(b"Bitcoin seed", seed, hashlib.sha512).digest()
+        return cls(digest[:32], digest[32:])
+
+    @property
+    def public_key(self):
+        if self._public_key is None:
+            self._public_key = compressed_public_key(self.key)
+        return self._public_key
+
+    def child(self, index):
+        """派生子节点（CKDpriv）"""
+        if index & HARDENED:
+            data = b'\x00' + self.key + index.to_bytes(4, 'big')
+        else:
+            data = self.public_key + index.to_bytes(4, 'big')
+
+        digest = hmac.new(self.chain_code, data, hashlib.sha512).digest()
+        tweak = int.from_bytes(digest[:32], 'big')
+        child_key = (tweak + int.from_bytes(self.key, 'big')) % SECP256K1_N
+        if tweak >= SECP256K1_N or child_key == 0:
+            raise ValueError(f"索引 {index} 派生出无效私钥，请跳过该索引")
+        return HDNode(child_key.to_bytes(32, 'big'), digest[32:])
+
+    def derive_path(self, path):
+        node = self
+        for index in parse_path(path):
+            node = node.child(index)
+        return node
+
+
+def _derive_chunk(parent_key, chain_code, public_key, start, count, with_address=True):
+    """
+    从缓存的父节点派生一批子钱包（在子进程中执行）
+
+    with_address=False 时只派生私钥（不做椭圆曲线运算），地址为 None
+
+    Returns:
+        [(address, private_key), ...]
+    """
+    parent = HDNode(parent_key, chain_code, public_key)
+    chunk = []
+    for index in range(start, start + count):
+        key = parent.child(index).key
+        address = private_key_to_address(key) if with_address else None
+        chunk.append((address, '0x' + key.hex()))
+    return chunk
+
+
+def iter_derived_chunks(mnemonic, base_path=DEFAULT_BASE_PATH, start=0, count=1, passphrase="",
+                        workers=1, chunk_size=DEFAULT_CHUNK_SIZE, with_address=True):
+    """
+    按索引顺序逐块产出派生的钱包 [(address, private_key), ...]
+
+    父节点（base_path）只派生一次，workers > 1 时各分块在进程池中并行派生
+    """
+    parent = HDNode.from_seed(mnemonic_to_seed(mnemonic, passphrase)).derive_path(base_path)
+    parent_args = (parent.key, parent.chain_code, parent.public_key)
+    ranges = [(offset, min(chunk_size, start + count - offset)) for offset in range(start, start + count, chunk_size)]
+
+    if workers <= 1:
+        for offset, size in ranges:
+            yield _derive_chunk(*parent_args, offset, size, with_address)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for offset, size in ranges:
+            pending.append(executor.submit(_derive_chunk, *parent_args, offset, size, with_address))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def parse_hd_spec(spec):
+    """
+    解析 wallet.json 中的 HD 钱包描述
+
+    支持两种写法：
+        {"mnemonic": "...", "path": "m/44'/60'/0'/0/0..99"}
+        {"mnemonic": "...", "path": "m/44'/60'/0'/0", "start": 0, "count": 100}
+
+    Returns:
+        (mnemonic, passphrase, base_path, start, count)
+    """
+    mnemonic = spec['mnemonic']
+    passphrase = spec.get('passphrase', '')
+    path = spec.get('path', DEFAULT_BASE_PATH)
+
+    if '..' in path:
+        base_path, start, count = parse_path_range(path)
+    else:
+        base_path = path
+        start = int(spec.get('start', 0))
+        count = int(spec['count'])
+    return mnemonic, passphrase, base_path, start, count
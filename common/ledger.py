@@ -0,0 +1,101 @@
+"""
+SQLite 执行记录账本
+
+功能：
+- 每个地址的处理结果在产生时立即写入 SQLite（WAL 模式），中途崩溃或 Ctrl-C 不会丢失已完成的结果
+- 按 (address, run_id) 建立索引，支持断点续跑（--resume 跳过之前已成功的地址）
+- 从账本生成最终的 JSON 结果报告
+"""
+
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    resumed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS outcomes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    address TEXT NOT NULL,
+    status TEXT NOT NULL,
+    entry TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_outcomes_address_run ON outcomes (address, run_id);
+"""
+
+
+class RunLedger:
+    def __init__(self, db_path, resume=False):
+        """
+        db_path: SQLite 数据库文件路径
+        resume: 是否为断点续跑（报告会包含之前运行中各地址的最新结果）
+        """
+        self.db_path = db_path
+        self.resume = resume
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+        self._lock = threading.Lock()
+        # isolation_level=None：每条记录单独提交，写入后立即落盘
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.execute(
+            "INSERT INTO runs (run_id, started_at, resumed) VALUES (?, ?, ?)",
+            (self.run_id, time.strftime("%Y-%m-%d %H:%M:%S"), int(resume))
+        )
+
+    def record(self, entry):
+        """写入单个地址的处理结果（线程安全）"""
+        payload = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO outcomes (run_id, address, status, entry, created_at) VALUES (?, ?, ?, ?, ?)",
+                (self.run_id, entry['address'].lower(), entry['status'], payload, time.time())
+            )
+
+    def completed_addresses(self, statuses=('success',)):
+        """
+        查询已处理完成的地址（所有历史运行）
+
+        Returns:
+            小写地址集合
+        """
+        placeholders = ', '.join('?' for _ in statuses)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT DISTINCT address FROM outcomes WHERE status IN ({placeholders})",
+                tuple(statuses)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def report_entries(self):
+        """
+        生成报告使用的结果列表
+
+        - 普通运行：本次运行的全部结果
+        - 断点续跑：每个地址在所有运行中的最新结果
+        """
+        with self._lock:
+            if self.resume:
+                rows = self._conn.execute(
+                    "SELECT entry FROM outcomes WHERE id IN "
+                    "(SELECT MAX(id) FROM outcomes GROUP BY address) ORDER BY id"
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT entry FROM outcomes WHERE run_id = ? ORDER BY id",
+                    (self.run_id,)
+                ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
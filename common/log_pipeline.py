@@ -0,0 +1,223 @@
+"""
+非阻塞日志
+
+功能：
+- worker 只把日志记录放进队列（QueueHandler），由单独的线程（QueueListener）写终端和文件，
+  高并发下 worker 不会因为终端输出慢（SSH、管道重定向）而互相等待
+- 支持日志级别：每个钱包的处理步骤为 DEBUG，结果为 INFO，失败为 WARNING / ERROR
+- 单行进度：终端中原地刷新（刷新频率由调用方控制，例如每秒 4 次），其他日志打印在进度行上方；
+  输出不是终端时每隔 plain_interval 秒追加一行，为 0 时不输出
+- 可选 JSONL 输出：每条日志一行 JSON（时间、级别、消息以及 extra 中的结构化字段，例如 address、tx_hash），
+  异常日志带完整的 traceback
+- common 模块中的日志（RPC 节点剔除、钱包加载等，logging.getLogger(__name__)）同样经过队列输出，不会打断进度行
+"""
+
+import sys
+import json
+import time
+import queue
+import shutil
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+}
+
+# LogRecord 自带的属性，其余属性（logger.info(..., extra={...}) 传入）作为结构化字段写入 JSONL
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'progress', 'exc_traceback'}
+
+
+def parse_level(level):
+    """'info' / 'INFO' / logging.INFO → logging.INFO"""
+    if isinstance(level, int):
+        return level
+    try:
+        return LEVELS[str(level).strip().lower()]
+    except KeyError:
+        raise ValueError(f"未知的日志级别: {level}（可选 {', '.join(LEVELS)}）")
+
+
+class JsonlFormatter(logging.Formatter):
+    """每条日志格式化为一行 JSON"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'time': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.created)),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage().strip(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif getattr(record, 'exc_traceback', None):
+            # 经过队列的记录：msg 末尾已经拼上了 traceback，JSONL 中只在 exc 字段保留一份
+            entry['exc'] = record.exc_traceback
+            if entry['msg'].endswith(record.exc_traceback):
+                entry['msg'] = entry['msg'][:-len(record.exc_traceback)].strip()
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TracebackQueueHandler(QueueHandler):
+    """
+    QueueHandler.prepare 会把 traceback 拼进 msg 并清空 exc_info（异常对象不能跨线程保留），
+    这里先把格式化后的 traceback 存到 exc_traceback 属性，JSONL 中的 exc 字段才有内容
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_traceback = logging.Formatter().formatException(record.exc_info)
+        return super().prepare(record)
+
+
+class ConsoleHandler(logging.StreamHandler):
+    """
+    终端输出：普通日志逐行打印，带 progress 属性的记录作为进度行
+
+    只在 QueueListener 线程中调用，不需要和 worker 竞争
+    """
+
+    def __init__(self, stream=None, plain_interval=10.0):
+        super().__init__(stream if stream is not None else sys.stdout)
+        self.plain_interval = plain_interval
+        self.interactive = hasattr(self.stream, 'isatty') and self.stream.isatty()
+        self.line = ''
+        self._last_plain = 0.0
+
+    def _write_line(self):
+        width = shutil.get_terminal_size((100, 20)).columns - 1
+        self.stream.write('\r' + self.line[:width] + '\x1b[K')
+
+    def emit(self, record):
+        try:
+            if getattr(record, 'progress', False):
+                self.line = record.getMessage()
+                if self.interactive:
+                    self._write_line()
+                elif self.plain_interval > 0 and record.created - self._last_plain >= self.plain_interval:
+                    self._last_plain = record.created
+                    self.stream.write(self.line + '\n')
+                self.flush()
+                return
+
+            message = self.format(record)
+            if self.interactive and self.line:
+                self.stream.write('\r\x1b[K' + message + '\n')
+                self._write_line()
+            else:
+                self.stream.write(message + '\n')
+            self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def finish(self):
+        """结束进度行（保留最后一次进度）"""
+        if self.interactive and self.line:
+            self.stream.write('\n')
+            self.flush()
+        self.line = ''
+
+
+class LogPipeline:
+    """
+    队列日志
+
+    用法：
+        pipeline = LogPipeline('opn_claim', level='info', jsonl_file='claim_log.jsonl').start()
+        log = logging.getLogger('opn_claim')
+        log.info("✅ 成功", extra={'address': address})
+        pipeline.progress("📈 100/1000 ...")  # 更新进度行
+        pipeline.stop()                         # 写完队列中的日志后返回
+    """
+
+    def __init__(self, name, level='info', jsonl_file=None, stream=None, plain_interval=10.0,
+                 extra_loggers=('common',)):
+        """
+        name: logger 名称
+        level: 日志级别（debug / info / warning / error）
+        jsonl_file: JSONL 输出路径（可选，追加写入），级别与 level 相同
+        stream: 终端输出流，默认 sys.stdout（启动时读取）
+        plain_interval: 输出不是终端时进度行的打印间隔（秒），0 为不打印
+        extra_loggers: 同样接入队列的其他 logger（默认 common，包含 common 下各模块的 logger）
+        """
+        self.name = name
+        self.level = parse_level(level)
+        self.jsonl_file = jsonl_file
+        self.stream = stream
+        self.plain_interval = plain_interval
+        self.logger = logging.getLogger(name)
+        self.extra_loggers = [logging.getLogger(extra) for extra in extra_loggers]
+        self.console = None
+        self._queue = None
+        self._queue_handler = None
+        self._listener = None
+        self._file_handler = None
+        self._extra_levels = []
+
+    def start(self):
+        if self._listener is not None:
+            return self
+        level = self.level
+        self.console = ConsoleHandler(self.stream, plain_interval=self.plain_interval)
+        self.console.setFormatter(logging.Formatter('%(message)s'))
+        self.console.addFilter(lambda record: getattr(record, 'progress', False) or record.levelno >= level)
+        handlers = [self.console]
+        if self.jsonl_file:
+            self._file_handler = logging.FileHandler(self.jsonl_file, encoding='utf-8')
+            self._file_handler.setFormatter(JsonlFormatter())
+            self._file_handler.addFilter(lambda record: not getattr(record, 'progress', False)
+                                         and record.levelno >= level)
+            handlers.append(self._file_handler)
+
+        self._queue = queue.SimpleQueue()
+        self._queue_handler = TracebackQueueHandler(self._queue)
+        self._listener = QueueListener(self._queue, *handlers)
+        self._listener.start()
+        self.logger.addHandler(self._queue_handler)
+        self.logger.setLevel(level)
+        self.logger.propagate = False
+        self._extra_levels = [logger.level for logger in self.extra_loggers]
+        for logger in self.extra_loggers:
+            logger.addHandler(self._queue_handler)
+            logger.setLevel(level)
+            logger.propagate = False
+        return self
+
+    def progress(self, line):
+        """更新进度行（不受日志级别限制，不写入 JSONL）"""
+        if self._queue is not None:
+            self._queue.put_nowait(logging.makeLogRecord({
+                'name': self.name, 'msg': line, 'levelno': logging.INFO, 'levelname': 'INFO', 'progress': True,
+            }))
+
+    def stop(self):
+        """写完队列中的日志后停止（之后可以直接 print）"""
+        if self._listener is None:
+            return
+        self._listener.stop()
+        self.console.finish()
+        self.logger.removeHandler(self._queue_handler)
+        self.logger.propagate = True
+        for logger, extra_level in zip(self.extra_loggers, self._extra_levels):
+            logger.removeHandler(self._queue_handler)
+            logger.setLevel(extra_level)
+            logger.propagate = True
+        if self._file_handler is not None:
+            self._file_handler.close()
+            self._file_handler = None
+        self._listener = None
+        self._queue = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
@@ -0,0 +1,352 @@
+"""
+运行指标统计
+
+功能：
+- 低开销的直方图（固定分桶）、计数器和当前值（gauge），支持标签，线程安全
+- 分阶段计时（with metrics.timer('claim_phase_seconds', phase='send'): ...）
+- 按 JSON-RPC 方法统计调用次数、请求耗时和传输层错误（由 web3_provider 的 session / aiohttp trace 调用），
+  并通知 RPC 监听器（例如自适应并发控制）
+- 按错误类型统计重试和失败次数
+- 导出为 Prometheus textfile（node_exporter textfile collector）或 JSON 摘要
+- 可选的实时统计行（后台线程定期打印）
+"""
+
+import os
+import re
+import json
+import time
+import bisect
+import threading
+
+# 默认分桶（秒），覆盖从本地调用到等待出块的范围
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# 从请求体中提取 JSON-RPC 方法名（比完整解析 JSON 快，batch 请求同样适用）
+_METHOD_PATTERN = re.compile(rb'"method"\s*:\s*"([^"]+)"')
+
+# 错误类型：按顺序匹配错误信息（小写）
+ERROR_CLASSES = (
+    ('nonce', ('nonce too low', 'nonce too high', 'invalid nonce', 'already known')),
+    ('underpriced', ('underpriced', 'fee too low', 'max fee per gas less than')),
+    ('out_of_gas', ('out of gas', 'intrinsic gas too low', 'gas required exceeds')),
+    ('insufficient_funds', ('insufficient funds', '余额不足')),
+    ('reverted', ('execution reverted', 'revert', '执行失败')),
+    ('stuck', ('秒内未确认', 'not in the chain after')),
+    ('timeout', ('timeout', 'timed out')),
+    ('connection', ('connection', 'connect', 'remote end closed', 'broken pipe')),
+    # 只匹配 HTTP 状态码的写法：单独的 429 可能出现在交易哈希、地址或 revert 数据中
+    ('rate_limited', ('http 429', 'status 429', 'status code 429', '429 client error', "429, message=",
+                      'too many requests', 'rate limit')),
+)
+
+
+def classify_error(error):
+    """把异常或错误信息归类为 ERROR_CLASSES 中的类型，无法识别时返回 other"""
+    if error is None:
+        return 'none'
+    message = str(error).lower()
+    for name, patterns in ERROR_CLASSES:
+        if any(pattern in message for pattern in patterns):
+            return name
+    return 'other'
+
+
+def extract_rpc_methods(body):
+    """从 JSON-RPC 请求体（bytes 或 str）中提取方法名列表，batch 请求返回多个"""
+    if not body:
+        return []
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return [method.decode('utf-8', 'replace') for method in _METHOD_PATTERN.findall(body)]
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(label_key, extra=None):
+    items = list(label_key)
+    if extra:
+        items.append(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+
+class Histogram:
+    """固定分桶直方图（不保存原始数据，内存占用固定）"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """按分桶线性插值估算分位数（0-1），没有数据时返回 0"""
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        lower = 0.0
+        for i, bucket_count in enumerate(self.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.max
+            if bucket_count and cumulative + bucket_count >= target:
+                value = lower + (upper - lower) * (target - cumulative) / bucket_count
+                return min(max(value, self.min), self.max)
+            cumulative += bucket_count
+            lower = upper
+        return self.max
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.mean, 6),
+            'min': round(self.min or 0.0, 6),
+            'max': round(self.max or 0.0, 6),
+            'p50': round(self.quantile(0.5), 6),
+            'p90': round(self.quantile(0.9), 6),
+            'p99': round(self.quantile(0.99), 6),
+        }
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'labels', 'start')
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Metrics:
+    """
+    指标注册表
+
+    计数器和直方图在第一次使用时创建，名称和标签相同的调用共用一个序列
+    """
+
+    def __init__(self, prefix='', buckets=DEFAULT_BUCKETS):
+        """
+        prefix: 导出时添加的指标名前缀，例如 opn_claim
+        buckets: 直方图分桶（秒）
+        """
+        self.prefix = prefix
+        self.buckets = buckets
+        self.started_at = time.time()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._rpc_listeners = []
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """计数器加 value"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """向直方图写入一个观测值"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def set_gauge(self, name, value, **labels):
+        """设置当前值（例如当前并发数）"""
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def timer(self, name, **labels):
+        """计时上下文管理器，退出时把耗时（秒）写入直方图（同步和 async 代码中都可以使用）"""
+        return _Timer(self, name, labels)
+
+    def add_rpc_listener(self, listener):
+        """添加 RPC 请求监听器，每个请求结束后调用 listener(methods, elapsed, error)"""
+        self._rpc_listeners.append(listener)
+
+    def record_rpc(self, body, elapsed=None, error=None):
+        """
+        统计一次 HTTP JSON-RPC 请求
+
+        body: 请求体，按其中的方法名统计调用次数（batch 请求按每个调用计数）
+        elapsed: 请求耗时（秒）；单个调用按方法名记录，batch 请求记为 batch
+        error: 传输层错误（异常、HTTP 429 / 5xx），按错误类型计入 rpc_errors_total
+        """
+        methods = extract_rpc_methods(body)
+        for method in methods:
+            self.inc('rpc_calls_total', method=method)
+        if elapsed is not None and methods:
+            self.observe('rpc_request_seconds', elapsed, method=methods[0] if len(methods) == 1 else 'batch')
+        if error is not None:
+            self.record_error('rpc_errors_total', error)
+        for listener in self._rpc_listeners:
+            try:
+                listener(methods, elapsed, error)
+            except Exception:
+                pass
+
+    def record_error(self, name, error):
+        """按错误类型计数（例如 retries_total{error="nonce"}）"""
+        self.inc(name, error=classify_error(error))
+
+    def counter_value(self, name, **labels):
+        return self._counters.get((name, _label_key(labels)), 0)
+
+    def counter_total(self, name):
+        """名称相同的所有序列之和"""
+        with self._lock:
+            return sum(value for (counter_name, _), value in self._counters.items() if counter_name == name)
+
+    def histogram(self, name, **labels):
+        """返回直方图（不存在时返回 None）"""
+        return self._histograms.get((name, _label_key(labels)))
+
+    def by_label(self, name, label):
+        """
+        按某个标签汇总同名序列
+
+        Returns:
+            {标签值: 计数值或 Histogram}
+        """
+        result = {}
+        with self._lock:
+            for store in (self._counters, self._histograms):
+                for (series_name, label_key), value in store.items():
+                    if series_name == name:
+                        result[dict(label_key).get(label, '')] = value
+        return result
+
+    def to_dict(self):
+        """JSON 摘要：计数器取值，直方图给出 count / mean / p50 / p90 / p99 等"""
+        with self._lock:
+            counters = [
+                {'name': name, 'labels': dict(label_key), 'value': value}
+                for (name, label_key), value in sorted(self._counters.items())
+            ]
+            gauges = [
+                {'name': name, 'labels': dict(label_key), 'value': value}
+                for (name, label_key), value in sorted(self._gauges.items())
+            ]
+            histograms = [
+                {'name': name, 'labels': dict(label_key), **histogram.summary()}
+                for (name, label_key), histogram in sorted(self._histograms.items())
+            ]
+        return {
+            'started_at': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started_at)),
+            'uptime': round(time.time() - self.started_at, 3),
+            'counters': counters,
+            'gauges': gauges,
+            'histograms': histograms,
+        }
+
+    def to_prometheus(self):
+        """Prometheus 文本格式"""
+        prefix = f"{self.prefix}_" if self.prefix else ''
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted(self._histograms.items())
+
+            declared = set()
+            for kind, series in (('counter', counters), ('gauge', gauges)):
+                for (name, label_key), value in series:
+                    full_name = prefix + name
+                    if full_name not in declared:
+                        declared.add(full_name)
+                        lines.append(f"# TYPE {full_name} {kind}")
+                    lines.append(f"{full_name}{_format_labels(label_key)} {value}")
+
+            for (name, label_key), histogram in histograms:
+                full_name = prefix + name
+                if full_name not in declared:
+                    declared.add(full_name)
+                    lines.append(f"# TYPE {full_name} histogram")
+                cumulative = 0
+                for bucket, bucket_count in zip(histogram.buckets, histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f"{full_name}_bucket{_format_labels(label_key, ('le', repr(float(bucket))))} "
+                                 f"{cumulative}")
+                lines.append(f"{full_name}_bucket{_format_labels(label_key, ('le', '+Inf'))} {histogram.count}")
+                lines.append(f"{full_name}_sum{_format_labels(label_key)} {histogram.sum}")
+                lines.append(f"{full_name}_count{_format_labels(label_key)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """写入 Prometheus textfile（先写临时文件再替换，采集时不会读到写了一半的文件）"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+        return path
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        return path
+
+
+class LiveStats:
+    """实时统计行：后台线程每隔 interval 秒调用 format_line() 并打印结果"""
+
+    def __init__(self, format_line, interval=5.0, printer=print):
+        """
+        format_line: 返回统计行字符串的函数
+        interval: 打印间隔（秒）
+        printer: 打印函数（多线程时传入线程安全的打印函数）
+        """
+        self.format_line = format_line
+        self.interval = interval
+        self.printer = printer
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None or self.interval <= 0:
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='live-stats', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.printer(self.format_line())
+            except Exception:
+                pass
@@ -0,0 +1,145 @@
+"""
+微批处理
+
+功能：
+- 调用方逐个提交任务，后台线程把短时间内（max_delay）到达的任务合并为一批（最多 max_batch 个）统一处理
+- 提交队列有上限（max_queue），下游处理不过来时提交方阻塞，形成背压
+- 同时处理中的批次数有上限（max_in_flight）
+- 每个任务返回独立的 Future，批处理结果按位置分发给各自的调用方（单项失败不影响同批其他任务）
+- 同步和 asyncio 代码中都可以使用
+"""
+
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+
+_STOP = object()
+
+
+class MicroBatcher:
+    def __init__(self, dispatch, max_batch=32, max_delay=0.005, max_queue=1024, max_in_flight=4, name='micro-batch'):
+        """
+        dispatch: 批处理函数 dispatch(items) -> Future，结果为与 items 等长的列表，
+                  列表中的异常对象表示对应任务失败
+        max_batch: 每批最多包含的任务数
+        max_delay: 收到第一个任务后最多等待多久凑批（秒）
+        max_queue: 排队任务数上限，超过时 submit() 阻塞
+        max_in_flight: 同时处理中的批次数上限
+        name: 后台线程名称
+        """
+        if max_batch < 1 or max_in_flight < 1:
+            raise ValueError(f"max_batch 和 max_in_flight 至少为 1: {max_batch}, {max_in_flight}")
+        self.dispatch = dispatch
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_in_flight = max_in_flight
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._slots = threading.Semaphore(max_in_flight)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+        # 统计信息
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def submit(self, item):
+        """提交一个任务（队列已满时阻塞），返回 concurrent.futures.Future"""
+        if self._closed:
+            raise RuntimeError("MicroBatcher 已关闭")
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    async def async_submit(self, item):
+        """提交一个任务并等待结果（asyncio 版本，队列已满时在线程中等待，不阻塞事件循环）"""
+        if self._closed:
+            raise RuntimeError("MicroBatcher 已关闭")
+        future = Future()
+        try:
+            self._queue.put_nowait((item, future))
+        except queue.Full:
+            await asyncio.to_thread(self._queue.put, (item, future))
+        return await asyncio.wrap_future(future)
+
+    @property
+    def mean_batch_size(self):
+        return self.items / self.batches if self.batches else 0.0
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                return
+            batch = [entry]
+            stop = False
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stop = True
+                    break
+                batch.append(entry)
+            self._dispatch(batch)
+            if stop:
+                return
+
+    def _dispatch(self, batch):
+        """提交一批任务（处理中的批次数达到上限时等待）"""
+        self._slots.acquire()
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        try:
+            result = self.dispatch([item for item, _ in batch])
+        except Exception as e:
+            self._slots.release()
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        result.add_done_callback(lambda done: self._resolve(batch, done))
+
+    def _resolve(self, batch, done):
+        """把批处理结果按位置分发给各任务的 Future"""
+        self._slots.release()
+        try:
+            results = done.result()
+            if len(results) != len(batch):
+                raise RuntimeError(f"批处理结果数量不匹配: {len(results)} != {len(batch)}")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), value in zip(batch, results):
+            if isinstance(value, BaseException):
+                future.set_exception(value)
+            else:
+                future.set_result(value)
+
+    def close(self, wait=True):
+        """停止接收任务，处理完已提交的任务；wait 为 True 时等待所有批次完成"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        if wait:
+            self._thread.join()
+            for _ in range(self.max_in_flight):
+                self._slots.acquire()
+            for _ in range(self.max_in_flight):
+                self._slots.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,264 @@
+"""
+Multicall3 批量链上读取
+
+功能：
+- 通过 Multicall3 的 aggregate3 把大量只读调用合并为少量 eth_call（每个子调用 allowFailure=true，单个失败不影响其他）
+- 余额查询使用 Multicall3 自带的 getEthBalance(address)，数千个地址只需要几个 eth_call
+- 按 gas 和响应大小自动切分：每块的预估 gas 不超过 max_gas、预估响应不超过 max_response_bytes；
+  某一块因 gas 不足或响应过大失败时对半拆分重试，并记住可以成功的块大小
+- 多个 eth_call 再打包成一个 JSON-RPC batch 请求发送
+- 链上没有部署 Multicall3（eth_getCode 为空）时，自动退回逐个调用的 JSON-RPC batch 请求
+- 结果格式与 rpc_batch 相同：与输入顺序一致的 (result, error) 列表
+"""
+
+import threading
+from collections import namedtuple
+
+from common.rpc_batch import RpcError, batch_call, get_balances, DEFAULT_BATCH_SIZE, DEFAULT_TIMEOUT
+
+# Multicall3 在大多数 EVM 链上的部署地址（相同的部署交易，地址一致）
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+
+# 函数选择器
+AGGREGATE3_SELECTOR = bytes.fromhex('82ad56cb')  # aggregate3((address,bool,bytes)[])
+GET_ETH_BALANCE_SELECTOR = bytes.fromhex('4d2301cc')  # getEthBalance(address)
+
+# 单个 eth_call 的 gas 上限（geth 默认 RPCGasCap 为 50M，公共节点通常更低）
+DEFAULT_MAX_GAS = 25_000_000
+# 单个 eth_call 响应（ABI 编码后）的大小上限（字节）
+DEFAULT_MAX_RESPONSE_BYTES = 512 * 1024
+# 每块最多包含的子调用数
+DEFAULT_MAX_CALLS = 1000
+# 每个 JSON-RPC batch 请求包含的 eth_call 数（每个 eth_call 已经包含大量子调用）
+DEFAULT_CHUNKS_PER_REQUEST = 10
+
+# 子调用的预估 gas：getEthBalance 为冷账户 BALANCE（2600）加循环和编码开销
+BALANCE_CALL_GAS = 6_000
+DEFAULT_CALL_GAS = 60_000
+# 子调用返回数据的预估大小（字节）
+DEFAULT_RETURN_SIZE = 64
+
+# 调用 Multicall3 合约本身失败时，按这些错误判断为 gas 不足或响应过大（可以拆小重试）
+_SPLIT_ERRORS = ('out of gas', 'gas required exceeds', 'gas limit', 'too large', 'exceeds', 'limit exceeded',
+                 'timeout', 'timed out', 'response size')
+
+# 一个只读调用：target 合约地址，data 调用数据（bytes 或 0x 开头的十六进制），
+# gas / return_size 为预估的 gas 和返回数据大小，用于切分
+Call = namedtuple('Call', ['target', 'data', 'gas', 'return_size'],
+                  defaults=(DEFAULT_CALL_GAS, DEFAULT_RETURN_SIZE))
+
+
+def _to_bytes(data):
+    if isinstance(data, str):
+        return bytes.fromhex(data[2:] if data.startswith(('0x', '0X')) else data)
+    return bytes(data)
+
+
+def _result_size(return_size):
+    """aggregate3 结果中一个 (bool, bytes) 元素的 ABI 编码大小"""
+    return 32 * 4 + (return_size + 31) // 32 * 32
+
+
+def _revert_error(data):
+    """子调用失败：与节点返回的 revert 错误格式相同（code 3，data 为 revert 数据）"""
+    return RpcError({'code': 3, 'message': 'execution reverted', 'data': '0x' + data.hex()})
+
+
+def encode_aggregate3(calls):
+    """编码 aggregate3 调用数据（所有子调用 allowFailure=true）"""
+    from eth_abi import encode  # pyright: ignore[reportMissingImports]
+
+    return AGGREGATE3_SELECTOR + encode(
+        ['(address,bool,bytes)[]'],
+        [[(call.target, True, _to_bytes(call.data)) for call in calls]]
+    )
+
+
+def decode_aggregate3(data):
+    """解码 aggregate3 返回值，返回 [(success, return_data)]"""
+    from eth_abi import decode  # pyright: ignore[reportMissingImports]
+
+    return decode(['(bool,bytes)[]'], _to_bytes(data))[0]
+
+
+class MulticallReader:
+    """
+    Multicall3 批量读取器
+
+    用法：
+        reader = MulticallReader(rpc_url, session=session)
+        balances = reader.get_balances(addresses)       # [(balance_wei, error)]
+        results = reader.aggregate([Call(token, data)])  # [(return_data, error)]
+    """
+
+    def __init__(self, rpc_url, session=None, address=MULTICALL3_ADDRESS, max_gas=DEFAULT_MAX_GAS,
+                 max_response_bytes=DEFAULT_MAX_RESPONSE_BYTES, max_calls=DEFAULT_MAX_CALLS,
+                 chunks_per_request=DEFAULT_CHUNKS_PER_REQUEST, batch_size=DEFAULT_BATCH_SIZE,
+                 timeout=DEFAULT_TIMEOUT, block='latest'):
+        """
+        rpc_url: RPC 地址或 RpcPool
+        session: 可复用的 requests.Session（保持连接）
+        address: Multicall3 合约地址，为 None 时不使用 Multicall3
+        max_gas: 每个 eth_call 的 gas 上限
+        max_response_bytes: 每个 eth_call 的预估响应大小上限（字节）
+        max_calls: 每个 eth_call 最多包含的子调用数（拆分重试后会自动调低）
+        chunks_per_request: 每个 JSON-RPC batch 请求包含的 eth_call 数
+        batch_size: 退回逐个调用时，每个 batch 请求包含的调用数
+        timeout: 单个 HTTP 请求超时时间（秒）
+        block: 查询的区块
+        """
+        self.rpc_url = rpc_url
+        self.session = session
+        self.address = address
+        self.max_gas = max_gas
+        self.max_response_bytes = max_response_bytes
+        self.max_calls = max_calls
+        self.chunks_per_request = chunks_per_request
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.block = block
+        self._available = None
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.calls = 0
+        self.eth_calls = 0
+        self.splits = 0
+        self.fallback_calls = 0
+
+    def is_available(self):
+        """检查链上是否部署了 Multicall3（结果缓存；查询失败时本次按未部署处理，下次重新检查）"""
+        if self.address is None:
+            return False
+        if self._available is None:
+            (code, error), = batch_call(self.rpc_url, [('eth_getCode', [self.address, 'latest'])],
+                                        session=self.session, timeout=self.timeout)
+            if error is not None:
+                return False
+            self._available = bool(code) and code not in ('0x', '0x0')
+        return self._available
+
+    def plan_chunks(self, calls):
+        """
+        按 gas、响应大小和 max_calls 切分子调用
+
+        Returns:
+            [[(原始序号, Call), ...], ...]
+        """
+        chunks = []
+        current = []
+        gas = 0
+        size = 0
+        for index, call in enumerate(calls):
+            call_gas = call.gas
+            call_size = _result_size(call.return_size)
+            if current and (len(current) >= self.max_calls or gas + call_gas > self.max_gas
+                            or size + call_size > self.max_response_bytes):
+                chunks.append(current)
+                current, gas, size = [], 0, 0
+            current.append((index, call))
+            gas += call_gas
+            size += call_size
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def aggregate(self, calls):
+        """
+        批量执行只读调用
+
+        Args:
+            calls: Call 或 (target, data) 列表
+
+        Returns:
+            与 calls 顺序一致的列表，每项为 (return_data, error)，子调用 revert 时 error 的 data 为 revert 数据
+        """
+        calls = [call if isinstance(call, Call) else Call(*call) for call in calls]
+        if not calls:
+            return []
+        with self._lock:
+            self.calls += len(calls)
+        if not self.is_available():
+            return self._fallback_aggregate(calls)
+
+        outcomes = [None] * len(calls)
+        queue = self.plan_chunks(calls)
+        while queue:
+            group, queue = queue[:self.chunks_per_request], queue[self.chunks_per_request:]
+            call_requests = [
+                ('eth_call', [{'to': self.address, 'data': '0x' + encode_aggregate3([call for _, call in chunk]).hex(),
+                               'gas': hex(self.max_gas)}, self.block])
+                for chunk in group
+            ]
+            with self._lock:
+                self.eth_calls += len(call_requests)
+            results = batch_call(self.rpc_url, call_requests, batch_size=len(call_requests), session=self.session,
+                                 timeout=self.timeout)
+
+            for chunk, (result, error) in zip(group, results):
+                if error is None:
+                    try:
+                        decoded = decode_aggregate3(result)
+                        if len(decoded) != len(chunk):
+                            raise ValueError(f"结果数量不匹配: {len(decoded)} != {len(chunk)}")
+                    except Exception as e:
+                        error = RpcError(f"aggregate3 返回值解码失败: {e}")
+                    else:
+                        for (index, _), (success, data) in zip(chunk, decoded):
+                            outcomes[index] = (data, None) if success else (None, _revert_error(data))
+                        continue
+
+                # 整块失败：gas 不足或响应过大时对半拆分重试，并调低之后的块大小
+                if len(chunk) > 1 and any(pattern in str(error).lower() for pattern in _SPLIT_ERRORS):
+                    half = len(chunk) // 2
+                    with self._lock:
+                        self.splits += 1
+                        self.max_calls = max(1, min(self.max_calls, half))
+                    queue.extend([chunk[:half], chunk[half:]])
+                    continue
+                for index, _ in chunk:
+                    outcomes[index] = (None, error)
+        return outcomes
+
+    def _fallback_aggregate(self, calls):
+        """没有 Multicall3 时，每个调用单独 eth_call（仍然打包成 JSON-RPC batch 请求）"""
+        with self._lock:
+            self.fallback_calls += len(calls)
+        call_requests = [('eth_call', [{'to': call.target, 'data': '0x' + _to_bytes(call.data).hex()}, self.block])
+                         for call in calls]
+        return [
+            (_to_bytes(result) if error is None else None, error)
+            for result, error in batch_call(self.rpc_url, call_requests, batch_size=self.batch_size,
+                                            session=self.session, timeout=self.timeout)
+        ]
+
+    def get_balances(self, addresses):
+        """
+        批量查询地址余额
+
+        Returns:
+            与 addresses 顺序一致的列表，每项为 (balance_wei, error)
+        """
+        addresses = list(addresses)
+        if not addresses:
+            return []
+        if not self.is_available():
+            with self._lock:
+                self.fallback_calls += len(addresses)
+            return get_balances(self.rpc_url, addresses, batch_size=self.batch_size, session=self.session,
+                                block=self.block)
+
+        calls = [
+            Call(self.address, GET_ETH_BALANCE_SELECTOR + bytes(12) + _to_bytes(address), BALANCE_CALL_GAS, 32)
+            for address in addresses
+        ]
+        return [
+            (int.from_bytes(data, 'big') if error is None else None, error)
+            for data, error in self.aggregate(calls)
+        ]
+
+    def summary(self):
+        if self.address is None or self._available is False:
+            return f"Multicall3: 未使用（{self.fallback_calls} 个调用逐个发送）"
+        return (f"Multicall3: {self.calls} 个调用合并为 {self.eth_calls} 个 eth_call，"
+                f"拆分重试 {self.splits} 次，当前每块最多 {self.max_calls} 个调用")
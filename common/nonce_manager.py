@@ -0,0 +1,113 @@
+"""
+本地 nonce 管理器
+
+功能：
+- 启动时通过 batch 请求从 pending 区块标签批量同步每个地址的 nonce
+- 之后在本地分配 nonce，发送交易前不再查询 get_transaction_count
+- 仅在出现 nonce 相关错误时重新同步
+- 线程安全，同一地址可以连续发送多笔交易
+"""
+
+import threading
+from common.rpc_batch import batch_call, DEFAULT_BATCH_SIZE
+
+# 节点返回这些错误时说明本地 nonce 与链上不一致，需要重新同步
+NONCE_ERROR_PATTERNS = (
+    "nonce too low",
+    "nonce too high",
+    "invalid nonce",
+    "already known",
+    "known transaction",
+)
+# "replacement transaction underpriced" 不属于 nonce 错误：nonce 正确但费用提高不够，由重试策略提高费用后重新替换
+
+
+def is_nonce_error(error):
+    """判断错误是否与 nonce 不一致有关"""
+    message = str(error).lower()
+    return any(pattern in message for pattern in NONCE_ERROR_PATTERNS)
+
+
+def fetch_pending_nonces(rpc_url, addresses, batch_size=DEFAULT_BATCH_SIZE, session=None):
+    """
+    批量查询地址在 pending 状态下的 nonce
+
+    Returns:
+        {address: nonce}，查询失败的地址不包含在结果中
+    """
+    calls = [('eth_getTransactionCount', [address, 'pending']) for address in addresses]
+    outcomes = batch_call(rpc_url, calls, batch_size=batch_size, session=session)
+    return {
+        address: int(result, 16)
+        for address, (result, error) in zip(addresses, outcomes)
+        if error is None
+    }
+
+
+class NonceManager:
+    def __init__(self, fetch_nonce=None):
+        """
+        fetch_nonce: 查询链上 pending nonce 的函数 fetch_nonce(address) -> int，
+                     用于未同步地址和出错后的重新同步
+        """
+        self._fetch_nonce = fetch_nonce
+        self._next_nonces = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(address):
+        return address.lower()
+
+    def seed(self, address, nonce):
+        """设置地址的下一个可用 nonce"""
+        with self._lock:
+            self._next_nonces[self._key(address)] = nonce
+
+    def seed_many(self, nonces):
+        """批量设置 {address: nonce}"""
+        with self._lock:
+            for address, nonce in nonces.items():
+                self._next_nonces[self._key(address)] = nonce
+
+    def is_seeded(self, address):
+        with self._lock:
+            return self._key(address) in self._next_nonces
+
+    def allocate(self, address):
+        """分配地址的下一个 nonce（本地递增，不访问网络）"""
+        key = self._key(address)
+        with self._lock:
+            nonce = self._next_nonces.get(key)
+            if nonce is not None:
+                self._next_nonces[key] = nonce + 1
+                return nonce
+
+        if self._fetch_nonce is None:
+            raise KeyError(f"地址 {address} 的 nonce 尚未同步")
+
+        # 未同步的地址回退到链上查询，查询期间不持有锁
+        fetched = self._fetch_nonce(address)
+        with self._lock:
+            nonce = max(fetched, self._next_nonces.get(key, fetched))
+            self._next_nonces[key] = nonce + 1
+            return nonce
+
+    def release(self, address, nonce):
+        """交易未发送成功时归还 nonce（仅当它是最近分配的一个）"""
+        key = self._key(address)
+        with self._lock:
+            if self._next_nonces.get(key) == nonce + 1:
+                self._next_nonces[key] = nonce
+
+    def resync(self, address, nonce=None):
+        """
+        按链上状态重新同步地址的 nonce
+
+        nonce: 已查询到的 pending nonce；为 None 时使用 fetch_nonce 查询
+        """
+        if nonce is None:
+            if self._fetch_nonce is None:
+                raise KeyError(f"无法重新同步地址 {address} 的 nonce")
+            nonce = self._fetch_nonce(address)
+        self.seed(address, nonce)
+        return nonce
@@ -0,0 +1,279 @@
+"""
+区块驱动的交易回执监听器
+
+功能：
+- 单个后台线程每出现新区块才查询一次回执，替代每个 worker 各自轮询 wait_for_transaction_receipt
+- 新区块数量少于待确认交易数时使用 eth_getBlockReceipts 一次取回整个区块的回执，
+  否则（或节点不支持时）使用批量 eth_getTransactionReceipt
+- 每个待确认交易对应一个 Future，区块中出现该交易时统一完成
+- 支持新区块回调（例如通知 FeeOracle 刷新费用）
+- 可以同时等待同一 nonce 的多笔交易（替换交易），任意一笔被打包即返回
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError, wait, FIRST_COMPLETED
+from common.rpc_batch import batch_call, RpcError, DEFAULT_BATCH_SIZE
+
+# 回执中需要从十六进制转换为整数的字段
+RECEIPT_INT_FIELDS = (
+    'status',
+    'gasUsed',
+    'blockNumber',
+    'cumulativeGasUsed',
+    'effectiveGasPrice',
+    'transactionIndex',
+    'type',
+)
+
+# JSON-RPC "method not found" 错误码
+METHOD_NOT_FOUND = -32601
+
+
+class ReceiptTimeout(Exception):
+    """交易在超时时间内未被打包"""
+
+
+def normalize_tx_hash(tx_hash):
+    """统一交易哈希格式为小写 0x 开头的字符串"""
+    if isinstance(tx_hash, (bytes, bytearray)):
+        return '0x' + bytes(tx_hash).hex()
+    tx_hash = str(tx_hash).lower()
+    return tx_hash if tx_hash.startswith('0x') else '0x' + tx_hash
+
+
+def normalize_receipt(receipt):
+    """将 JSON-RPC 返回的回执转换为与 web3 类似的格式（数值字段为 int）"""
+    receipt = dict(receipt)
+    for field in RECEIPT_INT_FIELDS:
+        value = receipt.get(field)
+        if isinstance(value, str):
+            receipt[field] = int(value, 16)
+    return receipt
+
+
+class ReceiptWatcher:
+    def __init__(self, rpc_url, session=None, poll_interval=1.0, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        rpc_url: RPC 地址或 RpcPool
+        session: 可复用的 requests.Session
+        poll_interval: 查询最新区块高度的间隔（秒）
+        batch_size: 每个 batch 请求包含的调用数量
+        """
+        self.rpc_url = rpc_url
+        self.session = session
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+
+        self.head_polls = 0
+        self.receipt_calls = 0
+
+        self._pending = {}
+        self._unchecked = set()
+        self._listeners = []
+        self._last_block = None
+        self._block_receipts_supported = True
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def add_block_listener(self, callback):
+        """注册新区块回调 callback(block_number)"""
+        self._listeners.append(callback)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='receipt-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval * 2 + 1)
+            self._thread = None
+
+    def watch(self, tx_hash):
+        """
+        登记待确认交易
+
+        Returns:
+            concurrent.futures.Future，交易被打包后结果为回执字典
+        """
+        tx_hash = normalize_tx_hash(tx_hash)
+        with self._lock:
+            future = self._pending.get(tx_hash)
+            if future is None:
+                future = Future()
+                self._pending[tx_hash] = future
+                self._unchecked.add(tx_hash)
+            return future
+
+    def forget(self, tx_hash):
+        """不再监听该交易"""
+        tx_hash = normalize_tx_hash(tx_hash)
+        with self._lock:
+            self._pending.pop(tx_hash, None)
+            self._unchecked.discard(tx_hash)
+
+    def wait(self, tx_hash, timeout=120):
+        """阻塞等待交易回执（等待期间不产生任何 RPC 请求）"""
+        try:
+            return self.watch(tx_hash).result(timeout=timeout)
+        except FutureTimeoutError:
+            self.forget(tx_hash)
+            raise ReceiptTimeout(f"交易 {normalize_tx_hash(tx_hash)} 在 {timeout} 秒内未确认")
+
+    def wait_any(self, tx_hashes, timeout=120):
+        """
+        等待多笔交易中任意一笔的回执
+
+        替换交易时同一个 nonce 对应多个交易哈希，最终只有一笔会被打包
+        """
+        futures = [self.watch(tx_hash) for tx_hash in tx_hashes]
+        try:
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                raise ReceiptTimeout(f"交易 {', '.join(normalize_tx_hash(h) for h in tx_hashes)} 在 {timeout} 秒内未确认")
+            return next(iter(done)).result()
+        finally:
+            for tx_hash in tx_hashes:
+                self.forget(tx_hash)
+
+    async def async_wait_any(self, tx_hashes, timeout=120):
+        """在 asyncio 中等待多笔交易中任意一笔的回执"""
+        futures = [asyncio.wrap_future(self.watch(tx_hash)) for tx_hash in tx_hashes]
+        try:
+            done, _ = await asyncio.wait(futures, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                raise ReceiptTimeout(f"交易 {', '.join(normalize_tx_hash(h) for h in tx_hashes)} 在 {timeout} 秒内未确认")
+            return next(iter(done)).result()
+        finally:
+            for future in futures:
+                future.cancel()
+            for tx_hash in tx_hashes:
+                self.forget(tx_hash)
+
+    async def async_wait(self, tx_hash, timeout=120):
+        """在 asyncio 中等待交易回执"""
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(self.watch(tx_hash)), timeout)
+        except asyncio.TimeoutError:
+            self.forget(tx_hash)
+            raise ReceiptTimeout(f"交易 {normalize_tx_hash(tx_hash)} 在 {timeout} 秒内未确认")
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self._poll()
+            except Exception:
+                # 网络抖动等问题在下一个周期重试
+                pass
+            self._stop_event.wait(self.poll_interval)
+
+    def _call(self, calls):
+        self.receipt_calls += len(calls)
+        return batch_call(self.rpc_url, calls, batch_size=self.batch_size, session=self.session)
+
+    def _resolve(self, receipts):
+        """用取回的回执完成对应的 Future"""
+        resolved = []
+        with self._lock:
+            for receipt in receipts:
+                tx_hash = normalize_tx_hash(receipt.get('transactionHash', ''))
+                future = self._pending.pop(tx_hash, None)
+                if future is not None:
+                    self._unchecked.discard(tx_hash)
+                    resolved.append((future, receipt))
+
+        for future, receipt in resolved:
+            try:
+                future.set_result(normalize_receipt(receipt))
+            except InvalidStateError:
+                # 等待方已取消（例如 asyncio 超时）
+                pass
+
+    def _lookup(self, tx_hashes):
+        """批量 eth_getTransactionReceipt"""
+        if not tx_hashes:
+            return
+        outcomes = self._call([('eth_getTransactionReceipt', [tx_hash]) for tx_hash in tx_hashes])
+        self._resolve(result for result, error in outcomes if error is None and result)
+
+        # 查询失败的交易下个周期再直接查询一次
+        with self._lock:
+            self._unchecked.update(
+                tx_hash for tx_hash, (_, error) in zip(tx_hashes, outcomes)
+                if error is not None and tx_hash in self._pending
+            )
+
+    def _scan_blocks(self, first, last):
+        """
+        eth_getBlockReceipts 取回区块内全部回执
+
+        Returns:
+            False 表示节点不支持该方法
+        """
+        numbers = range(first, last + 1)
+        outcomes = self._call([('eth_getBlockReceipts', [hex(number)]) for number in numbers])
+        receipts = []
+        for number, (result, error) in zip(numbers, outcomes):
+            if error is not None:
+                message = str(error).lower()
+                if error.code == METHOD_NOT_FOUND or 'method not found' in message \
+                        or 'does not exist' in message or 'not supported' in message:
+                    return False
+                raise error
+            if result is None:
+                # 返回回执的节点还没有同步到该区块（多节点或负载均衡时可能出现），下个周期重新处理
+                raise RpcError(f"区块 {number} 的回执暂不可用")
+            receipts.extend(result)
+        self._resolve(receipts)
+        return True
+
+    def _poll(self):
+        with self._lock:
+            # 已被取消的等待（例如 asyncio 超时）不再查询
+            for tx_hash in [h for h, f in self._pending.items() if f.done()]:
+                self._pending.pop(tx_hash, None)
+                self._unchecked.discard(tx_hash)
+            unchecked = list(self._unchecked)
+            self._unchecked.clear()
+
+        self.head_polls += 1
+        (head, error), = batch_call(self.rpc_url, [('eth_blockNumber', [])], session=self.session)
+        if error is not None:
+            with self._lock:
+                self._unchecked.update(h for h in unchecked if h in self._pending)
+            raise error
+        head = int(head, 16)
+
+        if self._last_block is not None and head > self._last_block:
+            with self._lock:
+                skip = set(unchecked)
+                pending = [h for h in self._pending if h not in skip]
+            first = self._last_block + 1
+            try:
+                if pending:
+                    # 新区块较少时按区块取回执，否则直接按交易哈希查询
+                    scanned = False
+                    if self._block_receipts_supported and head - first + 1 < len(pending):
+                        scanned = self._scan_blocks(first, head)
+                        self._block_receipts_supported = scanned
+                    if not scanned:
+                        self._lookup(pending)
+            except Exception:
+                # 这些区块下个周期重新处理
+                head = self._last_block
+
+        if self._last_block is None or head > self._last_block:
+            self._last_block = head
+            for listener in self._listeners:
+                try:
+                    listener(head)
+                except Exception:
+                    pass
+
+        # 新登记的交易直接查询一次（可能在登记前就已被打包）
+        self._lookup(unchecked)
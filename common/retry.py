@@ -0,0 +1,164 @@
+"""
+重试策略
+
+功能：
+- 按错误类型（见 metrics.classify_error）决定处理方式：
+  - retry：可以重试（网络错误、限流、nonce 不一致、gas 不足等），按指数退避加随机抖动等待后重试
+  - replace：交易卡住（超时未确认）或费用过低，使用同一个 nonce、提高费用后重新发送
+  - fatal：重试也不会成功（合约 revert、余额不足），立即放弃
+- 指数退避：第 n 次重试前等待 base_delay * multiplier^(n-1)（不超过 max_delay），并在 [1 - jitter, 1] 倍之间随机，
+  避免大量 worker 同时重试
+- 替换交易的费用按 fee_bump 提高（节点要求替换交易的各费用字段至少提高 10%）
+- 通用的 call() / async_call() 可以包装任意函数
+- 可以传入自定义的错误分类函数（例如按 HTTP 接口的状态码和响应内容分类）
+"""
+
+import math
+import time
+import random
+import asyncio
+import threading
+
+from common.metrics import classify_error
+
+RETRY = 'retry'
+REPLACE = 'replace'
+FATAL = 'fatal'
+
+# 错误类型 → 处理方式（未列出的类型按 retry 处理）
+DEFAULT_DECISIONS = {
+    'nonce': RETRY,
+    'underpriced': REPLACE,
+    'out_of_gas': RETRY,
+    'insufficient_funds': FATAL,
+    'reverted': FATAL,
+    'stuck': REPLACE,
+    'timeout': RETRY,
+    'connection': RETRY,
+    'rate_limited': RETRY,
+    'other': RETRY,
+}
+
+# 替换交易时需要提高的费用字段
+FEE_FIELDS = ('gasPrice', 'maxFeePerGas', 'maxPriorityFeePerGas')
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=30.0, multiplier=2.0, jitter=0.5, fee_bump=1.125,
+                 decisions=None, metrics=None, seed=None, classifier=None):
+        """
+        max_attempts: 最多尝试次数（包括第一次）
+        base_delay: 第一次重试前的等待时间（秒）
+        max_delay: 等待时间上限（秒）
+        multiplier: 每次重试等待时间的倍数
+        jitter: 随机抖动比例（0-1），实际等待时间在 [delay * (1 - jitter), delay] 之间
+        fee_bump: 替换交易时的费用倍数（至少 1.1）
+        decisions: 覆盖默认的 {错误类型: 处理方式}
+        metrics: Metrics 实例（可选），按处理方式和错误类型统计 retry_decisions_total
+        seed: 随机数种子
+        classifier: 错误分类函数 classifier(error) → 错误类型，默认 metrics.classify_error；
+                    可以返回自定义类型（例如水龙头接口的 client_error），在 decisions 中指定处理方式
+        """
+        if max_attempts < 1:
+            raise ValueError(f"max_attempts 至少为 1: {max_attempts}")
+        if not 0 <= jitter <= 1:
+            raise ValueError(f"jitter 需要在 0 到 1 之间: {jitter}")
+        if fee_bump < 1.1:
+            raise ValueError(f"fee_bump 至少为 1.1（节点要求替换交易费用至少提高 10%）: {fee_bump}")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.fee_bump = fee_bump
+        self.decisions = {**DEFAULT_DECISIONS, **(decisions or {})}
+        self.metrics = metrics
+        self.classifier = classifier or classify_error
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def classify(self, error):
+        """
+        判断错误的处理方式
+
+        Returns:
+            (处理方式, 错误类型)
+        """
+        error_class = self.classifier(error)
+        decision = self.decisions.get(error_class, RETRY)
+        if self.metrics is not None:
+            self.metrics.inc('retry_decisions_total', decision=decision, error=error_class)
+        return decision, error_class
+
+    def should_retry(self, attempt, decision):
+        """第 attempt 次尝试失败后是否继续"""
+        return decision != FATAL and attempt < self.max_attempts
+
+    def backoff(self, attempt, decision=RETRY):
+        """
+        第 attempt 次尝试失败后、下一次尝试前的等待时间（秒）
+
+        替换交易不需要等待（交易已经等待过回执）
+        """
+        if decision == REPLACE:
+            return 0.0
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** max(0, attempt - 1))
+        with self._lock:
+            return delay * (1 - self.jitter * self._random.random())
+
+    def bump_fees(self, fees, previous=None):
+        """
+        计算替换交易的费用
+
+        fees: 当前的费用字段（FeeOracle 返回值）
+        previous: 被替换交易（或被拒绝的交易）使用的费用，为 None 时在 fees 基础上提高
+
+        Returns:
+            新的费用字典：每个字段不低于当前值，且至少为 previous 的 fee_bump 倍
+        """
+        previous = previous or fees
+        bumped = dict(fees)
+        for field in FEE_FIELDS:
+            if field in previous or field in fees:
+                minimum = math.ceil(previous.get(field, fees.get(field, 0)) * self.fee_bump)
+                bumped[field] = max(fees.get(field, 0), minimum)
+        if 'maxFeePerGas' in bumped and 'maxPriorityFeePerGas' in bumped:
+            bumped['maxFeePerGas'] = max(bumped['maxFeePerGas'], bumped['maxPriorityFeePerGas'])
+        return bumped
+
+    def call(self, func, *args, on_retry=None, **kwargs):
+        """
+        执行 func(*args, **kwargs)，失败时按策略重试
+
+        on_retry: 重试前调用 on_retry(attempt, error, decision, delay)
+        fatal 错误或用完尝试次数时抛出最后一次的异常
+        """
+        attempt = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                decision, _ = self.classify(e)
+                if not self.should_retry(attempt, decision):
+                    raise
+                delay = self.backoff(attempt, decision)
+                if on_retry is not None:
+                    on_retry(attempt, e, decision, delay)
+                time.sleep(delay)
+                attempt += 1
+
+    async def async_call(self, func, *args, on_retry=None, **kwargs):
+        """call() 的 asyncio 版本，func 为协程函数"""
+        attempt = 1
+        while True:
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                decision, _ = self.classify(e)
+                if not self.should_retry(attempt, decision):
+                    raise
+                delay = self.backoff(attempt, decision)
+                if on_retry is not None:
+                    on_retry(attempt, e, decision, delay)
+                await asyncio.sleep(delay)
+                attempt += 1
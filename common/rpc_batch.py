@@ -0,0 +1,118 @@
+"""
+JSON-RPC 批量请求工具
+
+功能：
+- 将大量 RPC 调用打包成 JSON-RPC batch 请求（一次 HTTP 往返发送数百个调用）
+- 按批次大小自动切分
+- 逐项返回结果或错误，单个调用失败不影响同批次其他调用
+- rpc_url 可以是 RPC 地址，也可以是 RpcPool（按健康度选择节点，失败时切换节点）
+"""
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_TIMEOUT = 30
+
+
+class RpcError(Exception):
+    """单个 JSON-RPC 调用返回的错误"""
+
+    def __init__(self, error):
+        if isinstance(error, dict):
+            self.code = error.get('code')
+            self.data = error.get('data')
+            message = error.get('message', str(error))
+        else:
+            self.code = None
+            self.data = None
+            message = str(error)
+        super().__init__(message)
+
+
+def chunked(items, size):
+    """按 size 切分列表"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def post_batch(rpc_url, payload, session=None, timeout=DEFAULT_TIMEOUT, broadcast=False):
+    """
+    发送一个 JSON-RPC batch 请求
+
+    rpc_url: RPC 地址或 RpcPool
+    broadcast: rpc_url 为 RpcPool 时，是否同时发往多个节点（发送交易时使用）
+
+    Returns:
+        按 id 索引的响应字典 {id: response}
+    """
+    if hasattr(rpc_url, 'post_json'):
+        data = rpc_url.post_json(payload, session=session, timeout=timeout, broadcast=broadcast)
+    else:
+        poster = session
+        if poster is None:
+            import requests  # pyright: ignore[reportMissingModuleSource]
+            poster = requests
+        response = poster.post(rpc_url, json=payload, timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+
+    # 节点不支持 batch 或整批被拒时，会返回单个错误对象而不是数组
+    if isinstance(data, dict):
+        raise RpcError(data.get('error', data))
+    return {item.get('id'): item for item in data}
+
+
+def batch_call(rpc_url, calls, batch_size=DEFAULT_BATCH_SIZE, session=None, timeout=DEFAULT_TIMEOUT):
+    """
+    批量执行 JSON-RPC 调用
+
+    Args:
+        rpc_url: RPC 地址或 RpcPool
+        calls: [(method, params), ...]
+        batch_size: 每个 HTTP 请求包含的调用数量
+        session: 可复用的 requests.Session（保持连接）
+        timeout: 单个 HTTP 请求超时时间（秒）
+
+    Returns:
+        与 calls 顺序一致的列表，每项为 (result, error)，error 为 None 或 RpcError
+    """
+    calls = list(calls)
+    outcomes = []
+    batch_size = max(1, int(batch_size))
+
+    for batch in chunked(calls, batch_size):
+        payload = [
+            {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+            for i, (method, params) in enumerate(batch)
+        ]
+
+        try:
+            responses = post_batch(rpc_url, payload, session=session, timeout=timeout)
+        except Exception as e:
+            # 整批失败：批内每个调用都记为同一个错误
+            error = e if isinstance(e, RpcError) else RpcError(str(e))
+            outcomes.extend((None, error) for _ in batch)
+            continue
+
+        for i in range(len(batch)):
+            item = responses.get(i)
+            if item is None:
+                outcomes.append((None, RpcError("响应中缺少该调用的结果")))
+            elif 'error' in item:
+                outcomes.append((None, RpcError(item['error'])))
+            else:
+                outcomes.append((item.get('result'), None))
+
+    return outcomes
+
+
+def get_balances(rpc_url, addresses, batch_size=DEFAULT_BATCH_SIZE, session=None, block='latest'):
+    """
+    批量查询地址余额（eth_getBalance）
+
+    Returns:
+        与 addresses 顺序一致的列表，每项为 (balance_wei, error)
+    """
+    calls = [('eth_getBalance', [address, block]) for address in addresses]
+    return [
+        (int(result, 16) if error is None else None, error)
+        for result, error in batch_call(rpc_url, calls, batch_size=batch_size, session=session)
+    ]
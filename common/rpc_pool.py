@@ -0,0 +1,443 @@
+"""
+多节点 RPC 池
+
+功能：
+- 从配置读取多个 RPC 节点，按节点统计延迟（EWMA）和错误率
+- 读请求按健康度路由：随机取两个可用节点，选择得分更好的一个（power of two choices），
+  失败时自动切换到下一个节点
+- eth_sendRawTransaction 同时广播到多个节点，任意一个节点接受即返回
+- 连续失败的节点临时剔除，剔除时间按指数退避增长，恢复后重新参与路由
+- 错误率随时间衰减，偶尔失败的节点过一段时间会重新被选中
+- 提供同步（PooledHTTPProvider）和异步（AsyncPooledHTTPProvider）Web3 Provider，
+  rpc_batch / receipt_watcher 等批量工具也可以直接传入 RpcPool 代替 RPC 地址
+"""
+
+import json
+import time
+import logging
+import random
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BROADCAST = 2
+DEFAULT_MAX_ATTEMPTS = 3
+ERROR_HALF_LIFE = 30.0  # 没有新请求时错误率减半的时间（秒）
+BROADCAST_METHODS = ('eth_sendRawTransaction',)
+
+
+def parse_rpc_urls(value):
+    """解析逗号分隔（或换行分隔）的 RPC 地址列表，去掉空白和重复项"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.replace('\n', ',').split(',')
+    urls = []
+    for url in value:
+        url = str(url).strip()
+        if url and url not in urls:
+            urls.append(url)
+    return urls
+
+
+def is_rpc_success(raw):
+    """JSON-RPC 响应（bytes / str / dict / batch 列表）中没有 error 字段时返回 True"""
+    try:
+        data = json.loads(raw) if isinstance(raw, (bytes, bytearray, str)) else raw
+    except ValueError:
+        return False
+    if isinstance(data, list):
+        return bool(data) and all(isinstance(item, dict) and 'error' not in item for item in data)
+    return isinstance(data, dict) and 'error' not in data
+
+
+class Endpoint:
+    """单个 RPC 节点的健康状态"""
+
+    def __init__(self, url):
+        self.url = url
+        self.latency = None  # 成功请求耗时的 EWMA（秒）
+        self.error_rate = 0.0  # 失败率的 EWMA（按 ERROR_HALF_LIFE 随时间衰减）
+        self.updated_at = time.monotonic()
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0  # 连续剔除次数（决定退避时间），请求成功后清零
+        self.total_ejections = 0
+        self.ejected_until = 0.0
+        self.last_error = None
+
+    def current_error_rate(self, now):
+        return self.error_rate * 0.5 ** ((now - self.updated_at) / ERROR_HALF_LIFE)
+
+    def score(self, now):
+        """得分越低越好；没有延迟数据的节点得分为 0，优先探测"""
+        error_rate = self.current_error_rate(now)
+        return (self.latency or 0.0) * (1 + 10 * error_rate) + error_rate
+
+    def summary(self, now):
+        latency = f"{self.latency * 1000:.0f}ms" if self.latency is not None else '-'
+        state = f"剔除中（剩余 {self.ejected_until - now:.0f} 秒）" if self.ejected_until > now else "正常"
+        return (f"{self.url}: {state}，请求 {self.requests} 次，失败 {self.failures} 次，"
+                f"延迟 {latency}，错误率 {self.current_error_rate(now):.0%}，剔除 {self.total_ejections} 次")
+
+
+class RpcPool:
+    def __init__(self, urls, broadcast=DEFAULT_BROADCAST, max_attempts=DEFAULT_MAX_ATTEMPTS, max_failures=3,
+                 base_backoff=5.0, max_backoff=300.0, alpha=0.2, metrics=None):
+        """
+        urls: RPC 节点地址列表
+        broadcast: eth_sendRawTransaction 同时发送的节点数
+        max_attempts: 读请求最多尝试的节点数（失败时切换到下一个节点）
+        max_failures: 连续失败多少次后剔除节点
+        base_backoff / max_backoff: 剔除时间（秒），每次连续剔除翻倍，不超过 max_backoff
+        alpha: 延迟和错误率 EWMA 的平滑系数
+        metrics: 传入 Metrics 时记录切换节点和剔除节点的次数
+        """
+        urls = parse_rpc_urls(urls)
+        if not urls:
+            raise ValueError("RPC 节点列表为空")
+
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.broadcast_count = max(1, min(broadcast, len(self.endpoints)))
+        self.max_attempts = max(1, max_attempts)
+        self.max_failures = max(1, max_failures)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.alpha = alpha
+        self.metrics = metrics
+
+        self.failovers = 0
+        self._random = random.Random()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._background = set()
+
+    @property
+    def urls(self):
+        return [endpoint.url for endpoint in self.endpoints]
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def __str__(self):
+        return f"RpcPool({', '.join(self.urls)})"
+
+    # ---------- 健康状态 ----------
+
+    def candidates(self):
+        """
+        本次请求依次尝试的节点列表
+
+        第一个节点从两个随机可用节点中选择得分更好的一个，其余按得分排序；
+        所有节点都被剔除时，按恢复时间先后返回全部节点
+        """
+        now = time.monotonic()
+        with self._lock:
+            available = [endpoint for endpoint in self.endpoints if endpoint.ejected_until <= now]
+            if not available:
+                return sorted(self.endpoints, key=lambda endpoint: endpoint.ejected_until)
+
+            scores = {endpoint.url: endpoint.score(now) for endpoint in available}
+            ordered = sorted(available, key=lambda endpoint: scores[endpoint.url])
+            if len(available) > 2:
+                first, second = self._random.sample(available, 2)
+                primary = first if scores[first.url] <= scores[second.url] else second
+                ordered.remove(primary)
+                ordered.insert(0, primary)
+            return ordered
+
+    def record_success(self, endpoint, latency):
+        now = time.monotonic()
+        with self._lock:
+            endpoint.requests += 1
+            endpoint.consecutive_failures = 0
+            endpoint.ejections = 0
+            endpoint.latency = latency if endpoint.latency is None else \
+                endpoint.latency + self.alpha * (latency - endpoint.latency)
+            endpoint.error_rate = endpoint.current_error_rate(now) * (1 - self.alpha)
+            endpoint.updated_at = now
+
+    def record_failure(self, endpoint, error):
+        now = time.monotonic()
+        ejected = None
+        with self._lock:
+            endpoint.requests += 1
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            endpoint.last_error = str(error)
+            error_rate = endpoint.current_error_rate(now)
+            endpoint.error_rate = error_rate + self.alpha * (1 - error_rate)
+            endpoint.updated_at = now
+
+            if endpoint.consecutive_failures >= self.max_failures:
+                backoff = min(self.max_backoff, self.base_backoff * 2 ** endpoint.ejections)
+                endpoint.ejected_until = now + backoff
+                endpoint.ejections += 1
+                endpoint.total_ejections += 1
+                # 恢复后重新开始统计，连续失败才会再次剔除（退避时间翻倍）
+                endpoint.consecutive_failures = 0
+                endpoint.error_rate = 0.0
+                ejected = backoff
+
+        if ejected is not None:
+            log.warning(f"⚠️  RPC 节点连续失败，暂停使用 {ejected:.0f} 秒: {endpoint.url}（{str(error)[:100]}）")
+            if self.metrics is not None:
+                self.metrics.inc('rpc_endpoint_ejections_total', endpoint=endpoint.url)
+
+    def _record_failover(self):
+        with self._lock:
+            self.failovers += 1
+        if self.metrics is not None:
+            self.metrics.inc('rpc_failovers_total')
+
+    # ---------- 同步请求 ----------
+
+    def _attempt(self, send, endpoint):
+        """调用 send(url) 并记录节点健康状态，返回 (result, error)"""
+        start = time.perf_counter()
+        try:
+            result = send(endpoint.url)
+        except Exception as e:
+            self.record_failure(endpoint, e)
+            return None, e
+        self.record_success(endpoint, time.perf_counter() - start)
+        return result, None
+
+    def execute(self, send, endpoints=None):
+        """
+        按健康度选择节点执行 send(url)，失败时切换到下一个节点
+
+        Returns:
+            send 的返回值；所有节点都失败时抛出最后一个错误
+        """
+        endpoints = endpoints if endpoints is not None else self.candidates()[:self.max_attempts]
+        last_error = None
+        for i, endpoint in enumerate(endpoints):
+            if i > 0:
+                self._record_failover()
+            result, error = self._attempt(send, endpoint)
+            if error is None:
+                return result
+            last_error = error
+        raise last_error
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=max(4, self.broadcast_count * 16),
+                                                    thread_name_prefix='rpc-broadcast')
+            return self._executor
+
+    def broadcast(self, send, is_success=is_rpc_success):
+        """
+        同时在 broadcast_count 个节点上执行 send(url)
+
+        所有节点的请求同时在后台线程执行，返回最先收到的 is_success 结果（响应慢的主节点不会拖慢发送），
+        其余请求继续在后台完成；都不成功时按节点顺序返回第一个节点响应（例如 nonce too low），
+        全部请求失败时切换到其他节点重试
+        """
+        candidates = self.candidates()
+        targets = candidates[:self.broadcast_count]
+        if len(targets) <= 1:
+            return self.execute(send, candidates[:self.max_attempts])
+
+        executor = self._get_executor()
+        futures = {executor.submit(self._attempt, send, endpoint): i for i, endpoint in enumerate(targets)}
+        outcomes = [None] * len(targets)
+        for future in as_completed(futures):
+            result, error = future.result()
+            if error is None and is_success(result):
+                return result
+            outcomes[futures[future]] = (result, error)
+
+        for result, error in outcomes:
+            if error is None:
+                return result
+        remaining = candidates[len(targets):len(targets) + self.max_attempts]
+        if remaining:
+            self._record_failover()
+            return self.execute(send, remaining)
+        raise outcomes[0][1]
+
+    def post_json(self, payload, session=None, timeout=30, broadcast=False):
+        """
+        发送 JSON-RPC 请求（可以是 batch），返回解析后的 JSON，失败时切换节点
+
+        broadcast: 为 True 时同时发往 broadcast_count 个节点（例如批量发送交易），返回第一个全部成功的响应
+        """
+        poster = session
+        if poster is None:
+            import requests  # pyright: ignore[reportMissingModuleSource]
+            poster = requests
+
+        def send(url):
+            response = poster.post(url, json=payload, timeout=timeout)
+            response.raise_for_status()
+            return response.json()
+
+        if broadcast:
+            return self.broadcast(send)
+        return self.execute(send)
+
+    # ---------- 异步请求 ----------
+
+    async def _async_attempt(self, send, endpoint):
+        start = time.perf_counter()
+        try:
+            result = await send(endpoint.url)
+        except Exception as e:
+            self.record_failure(endpoint, e)
+            return None, e
+        self.record_success(endpoint, time.perf_counter() - start)
+        return result, None
+
+    async def async_execute(self, send, endpoints=None):
+        """execute 的异步版本，send(url) 为协程函数"""
+        endpoints = endpoints if endpoints is not None else self.candidates()[:self.max_attempts]
+        last_error = None
+        for i, endpoint in enumerate(endpoints):
+            if i > 0:
+                self._record_failover()
+            result, error = await self._async_attempt(send, endpoint)
+            if error is None:
+                return result
+            last_error = error
+        raise last_error
+
+    async def async_broadcast(self, send, is_success=is_rpc_success):
+        """broadcast 的异步版本，返回最先收到的成功结果后，其余请求继续在后台完成"""
+        candidates = self.candidates()
+        targets = candidates[:self.broadcast_count]
+        if len(targets) <= 1:
+            return await self.async_execute(send, candidates[:self.max_attempts])
+
+        tasks = {asyncio.ensure_future(self._async_attempt(send, endpoint)): i for i, endpoint in enumerate(targets)}
+        outcomes = [None] * len(targets)
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result, error = task.result()
+                if error is None and is_success(result):
+                    for other in pending:
+                        self._background.add(other)
+                        other.add_done_callback(self._background.discard)
+                    return result
+                outcomes[tasks[task]] = (result, error)
+
+        for result, error in outcomes:
+            if error is None:
+                return result
+        remaining = candidates[len(targets):len(targets) + self.max_attempts]
+        if remaining:
+            self._record_failover()
+            return await self.async_execute(send, remaining)
+        raise outcomes[0][1]
+
+    # ---------- 统计 ----------
+
+    def summary_lines(self):
+        now = time.monotonic()
+        with self._lock:
+            return [endpoint.summary(now) for endpoint in self.endpoints]
+
+    def close(self):
+        """关闭广播使用的线程池"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+def _build_provider_classes():
+    """创建 Web3 Provider 子类（web3 在第一次使用时才导入）"""
+    from web3 import HTTPProvider, AsyncHTTPProvider  # pyright: ignore[reportMissingImports]
+
+    class PooledHTTPProvider(HTTPProvider):
+        """
+        使用 RpcPool 的同步 Provider
+
+        读请求按健康度选择节点并自动切换，eth_sendRawTransaction 广播到多个节点
+        """
+
+        def __init__(self, pool, session=None, request_kwargs=None, **kwargs):
+            super().__init__(pool.urls[0], request_kwargs=request_kwargs, session=session, **kwargs)
+            self.pool = pool
+            self._session = session
+
+        def __str__(self):
+            return f"RPC pool {', '.join(self.pool.urls)}"
+
+        def _get_session(self):
+            if self._session is None:
+                import requests  # pyright: ignore[reportMissingModuleSource]
+                self._session = requests.Session()
+            return self._session
+
+        def _make_request(self, method, request_data):
+            session = self._get_session()
+            request_kwargs = self.get_request_kwargs()
+
+            def send(url):
+                response = session.post(url, data=request_data, **request_kwargs)
+                response.raise_for_status()
+                return response.content
+
+            if method in BROADCAST_METHODS:
+                return self.pool.broadcast(send)
+            return self.pool.execute(send)
+
+    class AsyncPooledHTTPProvider(AsyncHTTPProvider):
+        """使用 RpcPool 的异步 Provider（需要先调用 cache_async_session 传入 aiohttp session）"""
+
+        def __init__(self, pool, request_kwargs=None, **kwargs):
+            super().__init__(pool.urls[0], request_kwargs=request_kwargs, **kwargs)
+            self.pool = pool
+            self._session = None
+
+        def __str__(self):
+            return f"RPC pool {', '.join(self.pool.urls)}"
+
+        async def cache_async_session(self, session):
+            self._session = session
+            return session
+
+        async def _make_request(self, method, request_data):
+            if self._session is None:
+                import aiohttp  # pyright: ignore[reportMissingImports]
+                self._session = aiohttp.ClientSession()
+            session = self._session
+            request_kwargs = self.get_request_kwargs()
+
+            async def send(url):
+                async with session.post(url, data=request_data, **request_kwargs) as response:
+                    response.raise_for_status()
+                    return await response.read()
+
+            if method in BROADCAST_METHODS:
+                return await self.pool.async_broadcast(send)
+            return await self.pool.async_execute(send)
+
+    return PooledHTTPProvider, AsyncPooledHTTPProvider
+
+
+_provider_classes = None
+
+
+def get_provider_classes():
+    """(PooledHTTPProvider, AsyncPooledHTTPProvider)，第一次调用时创建，导入本模块时不加载 web3"""
+    global _provider_classes
+    if _provider_classes is None:
+        _provider_classes = _build_provider_classes()
+    return _provider_classes
+
+
+def __getattr__(name):
+    if name == 'PooledHTTPProvider':
+        return get_provider_classes()[0]
+    if name == 'AsyncPooledHTTPProvider':
+        return get_provider_classes()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,163 @@
+"""
+钱包分片
+
+功能：
+- 按地址哈希把钱包集合稳定地分成 N 片（sha256(地址) mod N），与钱包在文件中的顺序、进程和机器无关，
+  同一个钱包文件在每台机器上分出的结果相同
+- 每个地址只属于一个分片：各分片的进程各自管理 nonce，不会有两个进程为同一个地址分配 nonce
+- 分片的输出文件名带分片后缀（claim_results.json → claim_results.shard-1-of-4.json），多个分片可以共用一个目录
+- 本地协调：启动 N 个子进程分别执行一个分片（输出写入各自的日志文件），等待全部结束
+- 合并各分片的结果报告，并检查分片数是否一致、每个地址是否都由所属的分片处理
+"""
+
+import os
+import time
+import hashlib
+import subprocess
+
+
+def parse_shard(value):
+    """
+    解析分片参数
+
+    '2/4' → (2, 4)，分片编号从 1 开始
+    """
+    index, sep, count = str(value).strip().partition('/')
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError(f"分片格式应为 i/N（例如 1/4）: {value}")
+    if not sep or count < 1 or not 1 <= index <= count:
+        raise ValueError(f"分片编号需要在 1 到 N 之间: {value}")
+    return index, count
+
+
+def format_shard(shard):
+    return f"{shard[0]}/{shard[1]}"
+
+
+def _address_bytes(address):
+    if isinstance(address, str):
+        address = address[2:] if address.startswith(('0x', '0X')) else address
+        return bytes.fromhex(address)
+    return bytes(address)
+
+
+def shard_of(address, count):
+    """地址所属的分片编号（1 到 count）"""
+    digest = hashlib.sha256(_address_bytes(address)).digest()
+    return int.from_bytes(digest[:8], 'big') % count + 1
+
+
+def in_shard(address, shard):
+    """地址是否属于分片 shard=(i, N)；shard 为 None 时不分片"""
+    return shard is None or shard_of(address, shard[1]) == shard[0]
+
+
+def shard_path(path, shard):
+    """
+    分片的输出文件路径
+
+    claim_results.json → claim_results.shard-1-of-4.json；shard 为 None 时原样返回
+    """
+    if shard is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{shard[0]}-of-{shard[1]}{ext}"
+
+
+def run_shards(build_command, count, log_dir, name='shard', cwd=None):
+    """
+    在本机启动 count 个子进程，每个进程执行一个分片，等待全部结束
+
+    Args:
+        build_command: build_command((i, count)) 返回该分片的命令行参数列表
+        count: 分片数
+        log_dir: 各分片的输出写入 log_dir/{name}.shard-i-of-N.log
+        name: 日志文件名前缀
+
+    第一次 Ctrl+C 由各子进程自行处理（停止提交新任务，写出已完成的结果），这里继续等待；
+    再次按 Ctrl+C 时终止所有子进程并抛出 KeyboardInterrupt
+
+    Returns:
+        [(分片, 退出码, 日志文件)]，按分片编号排序
+    """
+    processes = []
+    for index in range(1, count + 1):
+        shard = (index, count)
+        log_file = shard_path(os.path.join(log_dir, f"{name}.log"), shard)
+        with open(log_file, 'w', encoding='utf-8') as output:
+            # 子进程与当前进程在同一个进程组中，终端的 Ctrl+C 会同时发给子进程
+            process = subprocess.Popen(build_command(shard), stdout=output, stderr=subprocess.STDOUT,
+                                       stdin=subprocess.DEVNULL, cwd=cwd)
+        processes.append((shard, process, log_file))
+        print(f"🧩 分片 {format_shard(shard)} 已启动（PID {process.pid}），输出: {log_file}")
+
+    interrupted = False
+    results = {}
+    started_at = time.time()
+    try:
+        while len(results) < len(processes):
+            try:
+                for shard, process, log_file in processes:
+                    if shard in results:
+                        continue
+                    code = process.poll()
+                    if code is not None:
+                        results[shard] = code
+                        status = "✅ 完成" if code == 0 else f"❌ 退出码 {code}"
+                        print(f"🧩 分片 {format_shard(shard)} {status}（{time.time() - started_at:.1f} 秒）")
+                time.sleep(0.2)
+            except KeyboardInterrupt:
+                if interrupted:
+                    raise
+                interrupted = True
+                print("\n⚠️  已中断：等待各分片完成进行中的任务（再按一次 Ctrl+C 立即终止）")
+    except KeyboardInterrupt:
+        for _, process, _ in processes:
+            if process.poll() is None:
+                process.terminate()
+        for _, process, _ in processes:
+            process.wait()
+        raise
+    return [(shard, results[shard], log_file) for shard, _, log_file in processes]
+
+
+def merge_reports(reports):
+    """
+    合并各分片的结果报告
+
+    Args:
+        reports: [(shard, report)]，report 为分片写出的结果字典（details 中每项包含 address、status）
+
+    Returns:
+        合并后的 {'details': [...], 'shards': [...]}，details 按分片编号排列
+
+    Raises:
+        ValueError: 分片数不一致，或结果中包含不属于该分片的地址（说明分片方式不一致，同一个地址可能被多个进程处理）
+    """
+    counts = {shard[1] for shard, _ in reports}
+    if len(counts) > 1:
+        raise ValueError(f"各分片的分片数不一致: {sorted(counts)}")
+
+    details = []
+    shards = []
+    for shard, report in sorted(reports, key=lambda item: item[0]):
+        recorded = report.get('shard')
+        if recorded and recorded != format_shard(shard):
+            raise ValueError(f"结果文件的分片为 {recorded}，与文件名中的 {format_shard(shard)} 不一致")
+        for entry in report.get('details', []):
+            # 每个地址只能由所属分片处理，否则同一个地址可能在多个进程中分配 nonce
+            owner = shard_of(entry['address'], shard[1])
+            if owner != shard[0]:
+                raise ValueError(f"分片 {format_shard(shard)} 的结果中包含属于分片 {owner}/{shard[1]} 的地址 "
+                                 f"{entry['address']}")
+            details.append(entry)
+        shards.append({
+            'shard': format_shard(shard),
+            'timestamp': report.get('timestamp'),
+            'total': report.get('total', len(report.get('details', []))),
+            'success': report.get('success', 0),
+            'failed': report.get('failed', 0),
+        })
+    return {'details': details, 'shards': shards}
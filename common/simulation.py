@@ -0,0 +1,123 @@
+"""
+交易预执行（eth_call 模拟）
+
+功能：
+- 发送真实交易之前，用 eth_call 以每个钱包地址为 from 模拟执行同一个合约调用（JSON-RPC batch，一次请求模拟数百个地址）
+- 会 revert 的地址（已领取、没有资格等）不再发送交易，避免浪费 gas、等待回执和重试
+- 解码 revert 原因：Error(string)、Panic(uint256)、自定义错误（只给出选择器）
+- 网络错误、限流等无法确定结果的情况不过滤，交给真实发送处理
+"""
+
+from common.rpc_batch import RpcError, batch_call, DEFAULT_BATCH_SIZE, DEFAULT_TIMEOUT
+
+ERROR_SELECTOR = bytes.fromhex('08c379a0')  # Error(string)
+PANIC_SELECTOR = bytes.fromhex('4e487b71')  # Panic(uint256)
+
+# Solidity Panic 错误码
+PANIC_CODES = {
+    0x00: '通用错误',
+    0x01: 'assert 失败',
+    0x11: '算术溢出',
+    0x12: '除以零',
+    0x21: '无效的枚举值',
+    0x22: '存储字节数组编码错误',
+    0x31: '空数组 pop',
+    0x32: '数组越界',
+    0x41: '内存分配过大',
+    0x51: '调用未初始化的函数',
+}
+
+# 节点返回的 revert 错误（geth 为 code 3，其他节点通常只在错误信息中说明）
+REVERT_ERROR_CODE = 3
+_REVERT_PATTERNS = ('execution reverted', 'revert', 'vm execution error', 'invalid opcode')
+
+
+def _to_bytes(data):
+    if data is None:
+        return b''
+    if isinstance(data, str):
+        data = data[2:] if data.startswith(('0x', '0X')) else data
+        try:
+            return bytes.fromhex(data)
+        except ValueError:
+            return b''
+    return bytes(data)
+
+
+def decode_revert_reason(data):
+    """
+    解码 revert 数据
+
+    Returns:
+        可读的 revert 原因
+    """
+    data = _to_bytes(data)
+    if not data:
+        return '无 revert 原因'
+
+    selector, payload = data[:4], data[4:]
+    if selector == ERROR_SELECTOR:
+        try:
+            from eth_abi import decode  # pyright: ignore[reportMissingImports]
+            return decode(['string'], payload)[0]
+        except Exception:
+            return f"无法解码的 Error(string): 0x{data.hex()}"
+    if selector == PANIC_SELECTOR and len(payload) >= 32:
+        code = int.from_bytes(payload[:32], 'big')
+        return f"Panic(0x{code:02x}): {PANIC_CODES.get(code, '未知错误码')}"
+    return f"自定义错误 0x{selector.hex()}" + (f"（参数 {len(payload)} 字节）" if payload else '')
+
+
+def is_revert_error(error):
+    """判断 eth_call 返回的错误是否为合约 revert（而不是网络、限流等错误）"""
+    if error is None:
+        return False
+    if getattr(error, 'code', None) == REVERT_ERROR_CODE:
+        return True
+    message = str(error).lower()
+    return any(pattern in message for pattern in _REVERT_PATTERNS)
+
+
+def revert_reason(error):
+    """
+    从 eth_call 错误中取出 revert 原因
+
+    优先解码错误中的 revert 数据，没有数据时使用节点给出的错误信息（例如 "execution reverted: already claimed"）
+    """
+    data = getattr(error, 'data', None)
+    if isinstance(data, dict):
+        data = data.get('data')
+    if isinstance(data, str) and data.startswith('0x') and len(data) > 2:
+        return decode_revert_reason(data)
+    message = str(error)
+    prefix = 'execution reverted: '
+    return message[len(prefix):] if message.lower().startswith(prefix) else message
+
+
+def simulate_calls(rpc_url, calls, batch_size=DEFAULT_BATCH_SIZE, session=None, timeout=DEFAULT_TIMEOUT,
+                   block='latest'):
+    """
+    批量模拟执行调用
+
+    Args:
+        rpc_url: RPC 地址或 RpcPool
+        calls: [{'from': ..., 'to': ..., 'data': ..., ...}]（eth_call 的交易参数）
+        batch_size: 每个 HTTP 请求包含的调用数
+        block: 模拟执行的区块
+
+    Returns:
+        与 calls 顺序一致的列表，每项为 (status, detail)：
+        - ('ok', 返回数据)
+        - ('reverted', revert 原因)
+        - ('unknown', 错误)：网络错误、限流等，无法判断是否会 revert
+    """
+    call_requests = [('eth_call', [call, block]) for call in calls]
+    outcomes = []
+    for result, error in batch_call(rpc_url, call_requests, batch_size=batch_size, session=session, timeout=timeout):
+        if error is None:
+            outcomes.append(('ok', result))
+        elif is_revert_error(error):
+            outcomes.append(('reverted', revert_reason(error)))
+        else:
+            outcomes.append(('unknown', error if isinstance(error, RpcError) else RpcError(str(error))))
+    return outcomes
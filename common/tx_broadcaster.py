@@ -0,0 +1,108 @@
+"""
+批量发送交易
+
+功能：
+- 大量已签名交易同时就绪时，每笔交易单独 POST 一次 eth_sendRawTransaction，HTTP 往返开销占大头
+- 收集短时间内（max_delay）到达的已签名交易，最多 batch_size 笔合并为一个 JSON-RPC batch 请求发送
+- 每笔交易的结果（交易哈希）或错误（例如 nonce too low）分别返回给提交它的调用方，
+  调用方按地址处理重试，与逐笔发送的语义相同
+- rpc_url 为 RpcPool 时整批广播到多个节点（见 RpcPool.broadcast）
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from common.micro_batch import MicroBatcher
+from common.rpc_batch import RpcError, post_batch, DEFAULT_TIMEOUT
+
+
+class TransactionBroadcaster:
+    """
+    批量交易发送器
+
+    用法：
+        broadcaster = TransactionBroadcaster(rpc_url, session=session)
+        tx_hash = broadcaster.send(signed.raw_transaction)          # 线程中
+        tx_hash = await broadcaster.async_send(signed.raw_transaction)  # asyncio 中
+        broadcaster.close()
+    """
+
+    def __init__(self, rpc_url, session=None, batch_size=100, max_delay=0.01, max_queue=1024, max_in_flight=4,
+                 timeout=DEFAULT_TIMEOUT):
+        """
+        rpc_url: RPC 地址或 RpcPool
+        session: 可复用的 requests.Session（保持连接）
+        batch_size: 每个 batch 请求最多包含的交易数
+        max_delay: 收到第一笔交易后最多等待多久凑批（秒）
+        max_queue: 排队等待发送的交易数上限，超过时提交方阻塞
+        max_in_flight: 同时进行的 batch 请求数
+        timeout: 单个 HTTP 请求超时时间（秒）
+        """
+        self.rpc_url = rpc_url
+        self.session = session
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='tx-broadcast')
+        self._batcher = MicroBatcher(lambda raws: self._executor.submit(self._send_batch, raws),
+                                     max_batch=batch_size, max_delay=max_delay, max_queue=max_queue,
+                                     max_in_flight=max_in_flight, name='tx-broadcaster')
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _send_batch(self, raws):
+        """发送一批交易，返回与 raws 等长的列表，元素为交易哈希（HexBytes）或 RpcError"""
+        from hexbytes import HexBytes  # pyright: ignore[reportMissingImports]
+
+        payload = [
+            {"jsonrpc": "2.0", "id": i, "method": "eth_sendRawTransaction", "params": ['0x' + bytes(raw).hex()]}
+            for i, raw in enumerate(raws)
+        ]
+        try:
+            responses = post_batch(self.rpc_url, payload, session=self.session, timeout=self.timeout,
+                                   broadcast=True)
+        except Exception as e:
+            # 整批失败（连接错误、HTTP 429 / 5xx、节点拒绝 batch）：每笔交易都记为同一个错误，由调用方重试
+            with self._lock:
+                self.errors += len(raws)
+            error = e if isinstance(e, RpcError) else RpcError(str(e))
+            return [error] * len(raws)
+
+        results = []
+        for i in range(len(raws)):
+            item = responses.get(i)
+            if item is None:
+                results.append(RpcError("响应中缺少该交易的结果"))
+            elif 'error' in item:
+                results.append(RpcError(item['error']))
+            else:
+                results.append(HexBytes(item.get('result')))
+        with self._lock:
+            self.errors += sum(1 for result in results if isinstance(result, RpcError))
+        return results
+
+    def send(self, raw_transaction):
+        """发送一笔已签名交易（阻塞直到所在批次返回），返回交易哈希，失败时抛出 RpcError"""
+        return self._batcher.submit(raw_transaction).result()
+
+    async def async_send(self, raw_transaction):
+        """发送一笔已签名交易（asyncio 版本）"""
+        return await self._batcher.async_submit(raw_transaction)
+
+    def summary(self):
+        batcher = self._batcher
+        if not batcher.batches:
+            return "批量发送交易: 未发送交易"
+        return (f"批量发送交易: {batcher.items} 笔 / {batcher.batches} 个请求，"
+                f"平均每批 {batcher.mean_batch_size:.1f} 笔（最多 {batcher.largest_batch} 笔），失败 {self.errors} 笔")
+
+    def close(self):
+        """发送完已提交的交易后关闭"""
+        self._batcher.close()
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
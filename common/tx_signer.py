@@ -0,0 +1,149 @@
+"""
+多进程交易签名
+
+功能：
+- ECDSA 签名和 RLP 编码是 CPU 密集型操作，在线程中执行时持有 GIL，高并发下成为瓶颈
+- 待签名交易经有界队列按批（SIGNER_BATCH_SIZE）交给进程池签名，签名吞吐随 CPU 核数增加，与网络并发数无关
+- 主进程只传递 32 字节私钥和交易字典，不需要为每个钱包计算公钥（账户对象在子进程中创建并缓存）
+- 返回原始交易字节和交易哈希，发送阶段直接使用
+"""
+
+import os
+import time
+import importlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from common.micro_batch import MicroBatcher
+
+# 签名结果（字段名与 eth_account 的 SignedTransaction 相同）
+SignedRaw = namedtuple('SignedRaw', ['raw_transaction', 'hash'])
+
+# 子进程中缓存的账户对象数量上限（重试时不再重新计算公钥）
+ACCOUNT_CACHE_SIZE = 4096
+
+_accounts = {}
+
+
+class SigningError(Exception):
+    """子进程中签名失败（只保留错误信息，保证可以跨进程传递）"""
+
+
+def _get_account(key):
+    account = _accounts.get(key)
+    if account is None:
+        from eth_account import Account  # pyright: ignore[reportMissingImports]
+        if len(_accounts) >= ACCOUNT_CACHE_SIZE:
+            _accounts.clear()
+        account = _accounts[key] = Account.from_key(key)
+    return account
+
+
+def sign_batch(items):
+    """
+    签名一批交易（在子进程中执行）
+
+    Args:
+        items: [(32 字节私钥, 交易字典)]
+
+    Returns:
+        与 items 等长的列表，元素为 SignedRaw 或 SigningError
+    """
+    results = []
+    for key, transaction in items:
+        try:
+            signed = _get_account(key).sign_transaction(transaction)
+            results.append(SignedRaw(bytes(signed.raw_transaction), bytes(signed.hash)))
+        except Exception as e:
+            results.append(SigningError(f"签名失败: {type(e).__name__}: {e}"))
+    return results
+
+
+def _warm_up():
+    """预先导入 eth_account，避免第一批签名等待导入"""
+    importlib.import_module('eth_account')
+    return os.getpid()
+
+
+class TransactionSigner:
+    """
+    进程池签名器
+
+    用法：
+        signer = TransactionSigner(workers=4).start()
+        signed = signer.sign(record.key, transaction)          # 线程中
+        signed = await signer.async_sign(record.key, transaction)  # asyncio 中
+        signer.close()
+    """
+
+    def __init__(self, workers=None, batch_size=32, max_delay=0.005, max_queue=1024, metrics=None):
+        """
+        workers: 签名进程数，默认 CPU 核数
+        batch_size: 每批最多签名的交易数
+        max_delay: 凑批最多等待时间（秒）
+        max_queue: 排队等待签名的交易数上限，超过时提交方阻塞
+        metrics: Metrics 实例（可选），记录每批签名耗时和交易数
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.metrics = metrics
+        self._executor = None
+        self._batcher = None
+
+    def start(self):
+        """启动签名进程（在启动其他后台线程之前调用，子进程从干净的状态 fork）"""
+        if self._executor is not None:
+            return self
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        for future in [self._executor.submit(_warm_up) for _ in range(self.workers)]:
+            future.result()
+        # 每个进程一批正在签名、一批排队，签名完成后立即有下一批可做
+        self._batcher = MicroBatcher(self._dispatch, max_batch=self.batch_size, max_delay=self.max_delay,
+                                     max_queue=self.max_queue, max_in_flight=self.workers * 2, name='tx-signer')
+        return self
+
+    def _dispatch(self, items):
+        future = self._executor.submit(sign_batch, items)
+        metrics = self.metrics
+        if metrics is not None:
+            start = time.perf_counter()
+            metrics.inc('signer_batches_total')
+            metrics.inc('signer_transactions_total', len(items))
+            future.add_done_callback(lambda _: metrics.observe('signer_batch_seconds', time.perf_counter() - start))
+        return future
+
+    def sign(self, key, transaction):
+        """签名一笔交易（阻塞直到签名完成），返回 SignedRaw，失败时抛出 SigningError"""
+        if self._batcher is None:
+            self.start()
+        return self._batcher.submit((bytes(key), transaction)).result()
+
+    async def async_sign(self, key, transaction):
+        """签名一笔交易（asyncio 版本）"""
+        if self._batcher is None:
+            self.start()
+        return await self._batcher.async_submit((bytes(key), transaction))
+
+    def summary(self):
+        batcher = self._batcher
+        if batcher is None or not batcher.batches:
+            return f"多进程签名: {self.workers} 个进程，未签名交易"
+        return (f"多进程签名: {self.workers} 个进程，{batcher.items} 笔交易 / {batcher.batches} 批，"
+                f"平均每批 {batcher.mean_batch_size:.1f} 笔（最多 {batcher.largest_batch} 笔）")
+
+    def close(self):
+        """签名完已提交的交易后关闭进程池"""
+        if self._batcher is not None:
+            self._batcher.close()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,454 @@
+"""
+流式钱包存储
+
+功能：
+- 增量解析 wallet.json 私钥数组（已安装 ijson 时使用 ijson），边读边产出，不需要先把整个文件读入内存
+- 支持 HD 钱包描述 {"mnemonic": "...", "path": "m/44'/60'/0'/0/0..99"}，按需派生私钥，数量较多时多进程并行派生
+- 可选的二进制定长格式 wallet.bin：每个钱包 32 字节私钥 + 20 字节地址，读取时不需要解析和计算地址
+- 紧凑的 WalletRecord（__slots__，私钥和地址以 bytes 保存），LocalAccount 在第一次签名时才创建并缓存
+- 地址索引缓存：私钥 → 地址的结果保存到 wallet.json 旁的二进制索引文件（按 wallet.json 的 sha256 校验），
+  之后的运行直接读取地址，完全跳过 secp256k1 公钥计算
+- 分块产出钱包，调用方可以在后面的钱包还在加载时就开始处理前面的钱包
+"""
+
+import os
+import json
+import struct
+import hashlib
+import logging
+from common.hd_wallet import iter_derived_chunks, parse_hd_spec
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+READ_BUFFER_SIZE = 1 << 20
+
+KEY_SIZE = 32
+ADDRESS_SIZE = 20
+INVALID_ADDRESS = b'\x00' * ADDRESS_SIZE
+
+# 二进制钱包文件：魔数(8) + 数量(8)，之后每个钱包 32 字节私钥 + 20 字节地址
+BINARY_MAGIC = b'W3TKWAL1'
+BINARY_HEADER = struct.Struct('<8sQ')
+BINARY_RECORD_SIZE = KEY_SIZE + ADDRESS_SIZE
+
+# 地址索引文件：魔数(8) + wallet.json 的 sha256(32) + 数量(8)，之后每个钱包 20 字节地址（全 0 表示私钥无效）
+INDEX_SUFFIX = '.addr'
+INDEX_MAGIC = b'W3TKADR1'
+INDEX_HEADER = struct.Struct('<8s32sQ')
+
+# HD 钱包数量超过该值时启用多进程派生
+PARALLEL_DERIVE_THRESHOLD = 2000
+
+
+class WalletRecord:
+    """
+    单个钱包（紧凑存储）
+
+    key 为 32 字节私钥，raw_address 为 20 字节地址（未计算时为 None），
+    balance 由调用方在查询余额后填写
+    """
+
+    __slots__ = ('index', 'key', 'raw_address', 'balance', '_account', '_address')
+
+    def __init__(self, index, key, raw_address=None, account=None):
+        self.index = index
+        self.key = key
+        self.raw_address = raw_address
+        self.balance = None
+        self._account = account
+        self._address = None
+
+    @property
+    def private_key(self):
+        return '0x' + self.key.hex()
+
+    @property
+    def account(self):
+        if self._account is None:
+            from eth_account import Account  # pyright: ignore[reportMissingImports]
+            self._account = Account.from_key(self.key)
+        return self._account
+
+    @property
+    def address(self):
+        """checksum 地址（第一次访问时按 raw_address 计算并缓存，之后分片、断点续跑、批量查询和写账本直接使用）"""
+        if self._address is None:
+            if self.raw_address is None:
+                self.raw_address = bytes.fromhex(self.account.address[2:])
+            from eth_utils import to_checksum_address  # pyright: ignore[reportMissingImports]
+            self._address = to_checksum_address(self.raw_address)
+        return self._address
+
+
+def default_derive_workers(count):
+    """HD 钱包按派生数量自动选择进程数"""
+    return (os.cpu_count() or 1) if count > PARALLEL_DERIVE_THRESHOLD else 1
+
+
+def parse_private_key(value):
+    """解析私钥字符串（支持带或不带 0x 前缀），返回 32 字节私钥"""
+    if not isinstance(value, str):
+        raise ValueError(f"私钥必须是字符串: {value!r}")
+    key = bytes.fromhex(value[2:] if value.startswith(('0x', '0X')) else value)
+    if len(key) != KEY_SIZE:
+        raise ValueError(f"私钥长度必须为 {KEY_SIZE} 字节，实际为 {len(key)} 字节")
+    return key
+
+
+def find_wallet_file(directory):
+    """优先使用目录中的二进制钱包文件 wallet.bin，不存在时使用 wallet.json"""
+    binary_file = os.path.join(directory, 'wallet.bin')
+    if os.path.exists(binary_file):
+        return binary_file
+    return os.path.join(directory, 'wallet.json')
+
+
+def detect_format(wallet_file):
+    """
+    判断钱包文件格式
+
+    Returns:
+        'binary'、'hd' 或 'json'
+    """
+    with open(wallet_file, 'rb') as f:
+        head = f.read(len(BINARY_MAGIC))
+        if head == BINARY_MAGIC:
+            return 'binary'
+        while head:
+            stripped = head.lstrip()
+            if stripped:
+                return 'hd' if stripped[:1] == b'{' else 'json'
+            head = f.read(READ_BUFFER_SIZE)
+    return 'json'
+
+
+def file_sha256(path):
+    """分块计算文件的 sha256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_BUFFER_SIZE), b''):
+            digest.update(block)
+    return digest.digest()
+
+
+def count_wallets(wallet_file):
+    """
+    统计钱包数量（不解析私钥、不计算地址）
+
+    私钥数组有匹配的地址索引时直接读取索引中的数量，否则按元素统计（与 iter_json_array 使用同一个解析器，
+    非字符串元素和含转义字符的字符串也按一个计）
+    """
+    wallet_format = detect_format(wallet_file)
+    if wallet_format == 'binary':
+        with open(wallet_file, 'rb') as f:
+            return BINARY_HEADER.unpack(f.read(BINARY_HEADER.size))[1]
+    if wallet_format == 'hd':
+        with open(wallet_file, 'r', encoding='utf-8') as f:
+            return parse_hd_spec(json.load(f))[4]
+
+    try:
+        with open(wallet_file + INDEX_SUFFIX, 'rb') as f:
+            header = f.read(INDEX_HEADER.size)
+        if len(header) == INDEX_HEADER.size:
+            magic, digest, count = INDEX_HEADER.unpack(header)
+            if magic == INDEX_MAGIC and digest == file_sha256(wallet_file):
+                return count
+    except OSError:
+        pass
+    return sum(1 for _ in iter_json_array(wallet_file))
+
+
+def _is_escaped(text, pos):
+    """text[pos] 前面是否有奇数个反斜杠"""
+    backslashes = 0
+    while pos - backslashes > 0 and text[pos - backslashes - 1] == '\\':
+        backslashes += 1
+    return backslashes % 2 == 1
+
+
+def iter_json_array(wallet_file):
+    """
+    增量解析 JSON 私钥数组，逐个产出元素
+
+    已安装 ijson 时使用 ijson；否则使用内置的扫描器（字符串元素按 JSON 规则解码转义字符，
+    其他元素原样以字符串产出，由调用方报告为无效私钥）
+    """
+    try:
+        import ijson  # pyright: ignore[reportMissingImports]
+    except ImportError:
+        ijson = None
+
+    if ijson is not None:
+        with open(wallet_file, 'rb') as f:
+            yield from ijson.items(f, 'item')
+        return
+
+    with open(wallet_file, 'r', encoding='utf-8') as f:
+        buffer = ''
+        pos = 0
+        started = False
+        while True:
+            block = f.read(READ_BUFFER_SIZE)
+            buffer = buffer[pos:] + block
+            pos = 0
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                    pos += 1
+                if pos >= len(buffer):
+                    break
+                char = buffer[pos]
+                if not started:
+                    if char != '[':
+                        raise ValueError("wallet.json 必须是私钥数组或 HD 钱包描述")
+                    started = True
+                    pos += 1
+                elif char == ']':
+                    return
+                elif char == '"':
+                    # 跳过转义的引号（前面有奇数个反斜杠）
+                    end = buffer.find('"', pos + 1)
+                    while end > 0 and _is_escaped(buffer, end):
+                        end = buffer.find('"', end + 1)
+                    if end < 0:
+                        break
+                    value = buffer[pos + 1:end]
+                    yield json.loads(buffer[pos:end + 1]) if '\\' in value else value
+                    pos = end + 1
+                else:
+                    end = pos
+                    while end < len(buffer) and buffer[end] not in ',]':
+                        end += 1
+                    if end >= len(buffer):
+                        break
+                    yield buffer[pos:end].strip()
+                    pos = end
+            if not block:
+                if started and buffer[pos:].strip():
+                    raise ValueError("wallet.json 格式不完整")
+                return
+
+
+def read_address_index(wallet_file, digest):
+    """
+    读取地址索引
+
+    Args:
+        wallet_file: wallet.json 路径
+        digest: wallet.json 当前内容的 sha256
+
+    Returns:
+        所有地址拼接成的 bytes（每个 20 字节）；索引不存在、已损坏或与 wallet.json 不匹配时返回 None
+    """
+    try:
+        with open(wallet_file + INDEX_SUFFIX, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    if len(data) < INDEX_HEADER.size:
+        return None
+    magic, index_digest, count = INDEX_HEADER.unpack_from(data)
+    if magic != INDEX_MAGIC or index_digest != digest or len(data) != INDEX_HEADER.size + count * ADDRESS_SIZE:
+        return None
+    return data[INDEX_HEADER.size:]
+
+
+class AddressIndexWriter:
+    """边派生边写地址索引（写临时文件，全部写完后才替换，中途中断不会留下不完整的索引）"""
+
+    def __init__(self, wallet_file, digest):
+        self.path = wallet_file + INDEX_SUFFIX
+        self.digest = digest
+        self.count = 0
+        # 临时文件名带进程号：多个进程（例如分片执行）同时建立索引时不会写同一个文件
+        self._tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        self._file = open(self._tmp_path, 'wb')
+        self._file.write(INDEX_HEADER.pack(INDEX_MAGIC, digest, 0))
+
+    def write(self, raw_address):
+        self._file.write(raw_address or INVALID_ADDRESS)
+        self.count += 1
+
+    def commit(self):
+        self._file.seek(0)
+        self._file.write(INDEX_HEADER.pack(INDEX_MAGIC, self.digest, self.count))
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+
+def _iter_binary_records(wallet_file):
+    with open(wallet_file, 'rb') as f:
+        _, count = BINARY_HEADER.unpack(f.read(BINARY_HEADER.size))
+        index = 0
+        while index < count:
+            data = f.read(min(DEFAULT_CHUNK_SIZE, count - index) * BINARY_RECORD_SIZE)
+            if not data:
+                raise ValueError(f"二进制钱包文件不完整: {wallet_file}")
+            for offset in range(0, len(data) - BINARY_RECORD_SIZE + 1, BINARY_RECORD_SIZE):
+                index += 1
+                yield WalletRecord(index, data[offset:offset + KEY_SIZE],
+                                   data[offset + KEY_SIZE:offset + BINARY_RECORD_SIZE])
+
+
+def _iter_entries(wallet_file, wallet_format, with_address, workers):
+    """按顺序产出 (raw_address 或 None, 私钥原始值)"""
+    if wallet_format == 'hd':
+        with open(wallet_file, 'r', encoding='utf-8') as f:
+            mnemonic, passphrase, base_path, start, count = parse_hd_spec(json.load(f))
+        if workers is None:
+            workers = default_derive_workers(count)
+
+        log.info(f"🌱 从助记词派生 {count} 个钱包（{base_path}/{start}..{start + count - 1}）...")
+        # 不需要地址时只派生私钥（每个只需一次 HMAC），不计算公钥
+        for chunk in iter_derived_chunks(mnemonic, base_path, start, count, passphrase=passphrase,
+                                         workers=workers, with_address=with_address):
+            for address, private_key in chunk:
+                yield (bytes.fromhex(address[2:]) if address else None), private_key
+    else:
+        for private_key in iter_json_array(wallet_file):
+            yield None, private_key
+
+
+def iter_wallet_records(wallet_file, use_index=True, workers=None, on_error=None):
+    """
+    流式读取钱包文件，逐个产出 WalletRecord（编号从 1 开始）
+
+    - 二进制格式直接读取私钥和地址
+    - JSON 格式（私钥数组 / HD 钱包描述）有匹配的地址索引时直接使用索引中的地址，
+      否则边读边计算地址并在读完后写入索引
+
+    Args:
+        wallet_file: 钱包文件路径
+        use_index: 是否读取 / 写入地址索引
+        workers: HD 钱包派生使用的进程数，默认按数量自动选择
+        on_error: 无效私钥回调 on_error(编号, 错误信息)，默认打印
+    """
+    if on_error is None:
+        def on_error(idx, error):
+            log.warning(f"  [{idx}] ❌ 加载失败: {error}")
+
+    wallet_format = detect_format(wallet_file)
+    if wallet_format == 'binary':
+        yield from _iter_binary_records(wallet_file)
+        return
+
+    digest = file_sha256(wallet_file)
+    addresses = read_address_index(wallet_file, digest) if use_index else None
+    if addresses is not None:
+        log.info(f"⚡ 使用地址索引: {wallet_file}{INDEX_SUFFIX}")
+    writer = AddressIndexWriter(wallet_file, digest) if use_index and addresses is None else None
+
+    completed = False
+    try:
+        entries = _iter_entries(wallet_file, wallet_format, addresses is None, workers)
+        for idx, (raw_address, value) in enumerate(entries, 1):
+            try:
+                key = parse_private_key(value)
+                if addresses is not None:
+                    raw_address = addresses[(idx - 1) * ADDRESS_SIZE:idx * ADDRESS_SIZE]
+                    if len(raw_address) != ADDRESS_SIZE:
+                        raise ValueError("地址索引与钱包文件不一致，请删除索引文件后重试")
+                    if raw_address == INVALID_ADDRESS:
+                        raise ValueError("私钥无效（地址索引中已标记）")
+                record = WalletRecord(idx, key, raw_address)
+                if raw_address is None:
+                    record.address  # 计算地址（同时校验私钥并缓存 LocalAccount）
+            except Exception as e:
+                if writer is not None:
+                    writer.write(None)
+                on_error(idx, str(e))
+                continue
+
+            if writer is not None:
+                writer.write(record.raw_address)
+            yield record
+        completed = True
+    finally:
+        if writer is not None:
+            try:
+                if completed:
+                    writer.commit()
+                else:
+                    writer.abort()
+            except OSError as e:
+                log.warning(f"⚠️  地址索引写入失败: {e}")
+
+
+def ensure_address_index(wallet_file, workers=None, on_error=None):
+    """
+    确保 JSON 钱包文件有匹配的地址索引（没有时完整读取一遍并写入索引，二进制格式不需要索引）
+
+    多个进程读取同一个钱包文件之前调用一次（例如分片执行），之后各进程直接读取索引，不再各自计算全部地址
+
+    Returns:
+        是否新建了索引
+    """
+    if detect_format(wallet_file) == 'binary':
+        return False
+    if read_address_index(wallet_file, file_sha256(wallet_file)) is not None:
+        return False
+    print(f"🔎 建立地址索引: {wallet_file}{INDEX_SUFFIX}")
+    for _ in iter_wallet_records(wallet_file, workers=workers, on_error=on_error):
+        pass
+    return True
+
+
+def iter_wallet_chunks(wallet_file, chunk_size=DEFAULT_CHUNK_SIZE, **kwargs):
+    """按 chunk_size 分块产出 WalletRecord 列表，参数同 iter_wallet_records"""
+    chunk = []
+    for record in iter_wallet_records(wallet_file, **kwargs):
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class BinaryWalletWriter:
+    """写出二进制钱包文件（流式写入，完成时回填数量）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = open(path, 'wb')
+        self._file.write(BINARY_HEADER.pack(BINARY_MAGIC, 0))
+
+    def write(self, key, raw_address):
+        if len(key) != KEY_SIZE or len(raw_address) != ADDRESS_SIZE:
+            raise ValueError("私钥必须为 32 字节，地址必须为 20 字节")
+        self._file.write(key)
+        self._file.write(raw_address)
+        self.count += 1
+
+    def close(self):
+        self._file.seek(0)
+        self._file.write(BINARY_HEADER.pack(BINARY_MAGIC, self.count))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def convert_to_binary(wallet_file, output_file, workers=None):
+    """
+    将 wallet.json（私钥数组或 HD 钱包描述）转换为二进制钱包文件
+
+    Returns:
+        写出的钱包数量（无效私钥会被跳过）
+    """
+    with BinaryWalletWriter(output_file) as writer:
+        for record in iter_wallet_records(wallet_file, workers=workers):
+            writer.write(record.key, record.raw_address)
+    return writer.count
@@ -0,0 +1,255 @@
+"""
+Web3 Provider 工厂
+
+功能：
+- 统一创建带连接池的 HTTP session，连接池大小按并发数配置，复用长连接（keep-alive）
+- 可配置超时和 keep-alive，可选 HTTP/2（需要安装 httpx[http2]，用于 batch 请求客户端）
+- 同时支持同步 Web3 和 asyncio（aiohttp）两种模式
+- rpc_url 可以是 RPC 地址，也可以是多节点 RpcPool（按健康度路由、自动切换、广播交易）
+- 统计连接池占用情况，报告连接池饱和（请求需要排队等待空闲连接）
+- 传入 Metrics 时按 JSON-RPC 方法统计调用次数、请求耗时和传输层错误（异常、HTTP 429 / 5xx）
+"""
+
+import time
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 30
+
+
+def http_status_error(status):
+    """HTTP 状态码表示过载或服务端错误（429 / 5xx）时返回错误描述，否则返回 None"""
+    if status == 429:
+        return "HTTP 429 Too Many Requests"
+    if status >= 500:
+        return f"HTTP {status} server error"
+    return None
+
+
+class PoolStats:
+    """连接池占用统计"""
+
+    def __init__(self, pool_size):
+        self.pool_size = pool_size
+        self.requests = 0
+        self.in_flight = 0
+        self.peak = 0
+        self.saturated = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, queued=None):
+        """
+        请求开始
+
+        queued: 是否需要排队等待连接；为 None 时按占用数推断
+        """
+        with self._lock:
+            if queued is None:
+                queued = self.in_flight >= self.pool_size
+            if queued:
+                self.saturated += 1
+            self.requests += 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+
+    def release(self):
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def mark_saturated(self):
+        with self._lock:
+            self.saturated += 1
+
+    def summary(self):
+        return (f"连接池 {self.pool_size}: 请求 {self.requests} 次，"
+                f"峰值占用 {self.peak}，饱和等待 {self.saturated} 次")
+
+
+def _build_adapter_class():
+    """创建 PoolStatsAdapter 类（requests 在第一次使用时才导入）"""
+    from requests.adapters import HTTPAdapter  # pyright: ignore[reportMissingModuleSource]
+
+    class PoolStatsAdapter(HTTPAdapter):
+        """记录连接池占用情况的 HTTPAdapter"""
+
+        def __init__(self, pool_size=DEFAULT_POOL_SIZE, metrics=None, **kwargs):
+            self.stats = PoolStats(pool_size)
+            self.metrics = metrics
+            # pool_block=True：连接用完时排队等待，而不是临时新建连接（避免反复 TLS 握手）
+            super().__init__(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True, **kwargs)
+
+        def send(self, request, **kwargs):
+            self.stats.acquire()
+            start = time.perf_counter()
+            error = None
+            try:
+                response = super().send(request, **kwargs)
+                error = http_status_error(response.status_code)
+                return response
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                self.stats.release()
+                if self.metrics is not None:
+                    self.metrics.record_rpc(request.body, time.perf_counter() - start, error=error)
+
+    return PoolStatsAdapter
+
+
+_adapter_class = None
+
+
+def get_adapter_class():
+    """PoolStatsAdapter 类（依赖 requests，第一次调用时创建，导入本模块时不加载 requests）"""
+    global _adapter_class
+    if _adapter_class is None:
+        _adapter_class = _build_adapter_class()
+    return _adapter_class
+
+
+def __getattr__(name):
+    if name == 'PoolStatsAdapter':
+        return get_adapter_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def create_session(pool_size=DEFAULT_POOL_SIZE, keepalive=True, metrics=None):
+    """
+    创建带连接池统计的 requests.Session
+
+    session.pool_stats 为该 session 的 PoolStats
+    metrics: 传入 Metrics 时按 JSON-RPC 方法统计调用次数和请求耗时
+    """
+    import requests  # pyright: ignore[reportMissingModuleSource]
+
+    session = requests.Session()
+    adapter = get_adapter_class()(pool_size=pool_size, metrics=metrics)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if not keepalive:
+        session.headers['Connection'] = 'close'
+    session.pool_stats = adapter.stats
+    return session
+
+
+def create_rpc_client(pool_size=DEFAULT_POOL_SIZE, keepalive=True, timeout=DEFAULT_TIMEOUT, http2=False,
+                      metrics=None):
+    """
+    创建用于 JSON-RPC batch 请求的 HTTP 客户端
+
+    http2=True 且已安装 httpx[http2] 时返回 HTTP/2 的 httpx.Client（单连接多路复用），
+    否则返回 create_session 创建的 requests.Session。两者都支持 post(url, json=..., timeout=...)。
+    metrics: 传入 Metrics 时统计 RPC 调用（httpx.Client 通过 event hook 统计调用次数）
+    """
+    if http2:
+        try:
+            import httpx  # pyright: ignore[reportMissingImports]
+            import h2  # noqa: F401  # pyright: ignore[reportMissingImports]
+        except ImportError:
+            log.warning("⚠️  未安装 httpx[http2]，RPC 请求继续使用 HTTP/1.1")
+        else:
+            limits = httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size if keepalive else 0
+            )
+            event_hooks = {}
+            if metrics is not None:
+                event_hooks['request'] = [lambda request: metrics.record_rpc(request.content)]
+            return httpx.Client(http2=True, limits=limits, timeout=timeout, event_hooks=event_hooks)
+    return create_session(pool_size=pool_size, keepalive=keepalive, metrics=metrics)
+
+
+def create_web3(rpc_url, session=None, pool_size=DEFAULT_POOL_SIZE, keepalive=True, timeout=DEFAULT_TIMEOUT):
+    """
+    创建使用共享连接池的 Web3 实例
+
+    rpc_url: RPC 地址或 RpcPool
+    session: 复用已有的 requests.Session；为 None 时按 pool_size / keepalive 新建
+    """
+    from web3 import Web3  # pyright: ignore[reportMissingImports]
+    from common.rpc_pool import RpcPool, get_provider_classes
+
+    session = session or create_session(pool_size=pool_size, keepalive=keepalive)
+    if isinstance(rpc_url, RpcPool):
+        provider = get_provider_classes()[0](rpc_url, session=session, request_kwargs={'timeout': timeout})
+    else:
+        provider = Web3.HTTPProvider(rpc_url, request_kwargs={'timeout': timeout}, session=session)
+    return Web3(provider)
+
+
+async def create_async_web3(rpc_url, session):
+    """
+    创建使用指定 aiohttp session 的 AsyncWeb3 实例
+
+    rpc_url: RPC 地址或 RpcPool
+    session: create_aiohttp_session() 创建的 aiohttp.ClientSession
+    """
+    from web3 import AsyncWeb3  # pyright: ignore[reportMissingImports]
+    from common.rpc_pool import RpcPool, get_provider_classes
+
+    if isinstance(rpc_url, RpcPool):
+        provider = get_provider_classes()[1](rpc_url)
+    else:
+        provider = AsyncWeb3.AsyncHTTPProvider(rpc_url)
+    await provider.cache_async_session(session)
+    return AsyncWeb3(provider)
+
+
+def create_aiohttp_session(pool_size=DEFAULT_POOL_SIZE, keepalive=True, timeout=DEFAULT_TIMEOUT, stats=None,
+                           metrics=None):
+    """
+    创建 asyncio 模式使用的 aiohttp.ClientSession
+
+    stats: 传入 PoolStats 时记录连接池占用和排队次数
+    metrics: 传入 Metrics 时按 JSON-RPC 方法统计调用次数和请求耗时
+    """
+    import aiohttp  # pyright: ignore[reportMissingImports]
+
+    trace_configs = []
+    if stats is not None or metrics is not None:
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            context.start = time.perf_counter()
+            context.body = b''
+            if stats is not None:
+                stats.acquire(queued=False)
+
+        async def on_request_chunk_sent(session, context, params):
+            context.body += params.chunk
+
+        async def on_request_end(session, context, params):
+            if stats is not None:
+                stats.release()
+            if metrics is not None:
+                metrics.record_rpc(context.body, time.perf_counter() - context.start,
+                                   error=http_status_error(params.response.status))
+
+        async def on_request_exception(session, context, params):
+            if stats is not None:
+                stats.release()
+            if metrics is not None:
+                metrics.record_rpc(context.body, time.perf_counter() - context.start, error=params.exception)
+
+        async def on_connection_queued_start(session, context, params):
+            if stats is not None:
+                stats.mark_saturated()
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_end)
+        trace.on_request_exception.append(on_request_exception)
+        trace.on_connection_queued_start.append(on_connection_queued_start)
+        if metrics is not None:
+            trace.on_request_chunk_sent.append(on_request_chunk_sent)
+        trace_configs.append(trace)
+
+    connector = aiohttp.TCPConnector(limit=pool_size, force_close=not keepalive)
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=timeout),
+        trace_configs=trace_configs
+    )
@@ -3,21 +3,57 @@ OPN 测试网 Claim 操作脚本
 
 功能：
 - 批量读取私钥
-- 连接 OPN 测试网
+- 连接 OPN 测试网（RPC_URLS 配置多个节点时按健康度路由、自动切换，交易广播到多个节点）
 - 调用合约执行 claim 操作
-- 多线程并发处理
+- 本地 nonce 管理（启动时批量同步，出错时才重新同步）
+- 共享 gas 费用预言机（legacy / EIP-1559，带 TTL 缓存）
+- 相同合约调用复用 gas 估算结果
+- 区块驱动的回执监听（所有待确认交易共用一个轮询）
+- 多线程并发处理，或基于 asyncio 的异步模式（CLAIM_MODE=async）
+- 可选自适应并发（ADAPTIVE_CONCURRENCY=true）：按 RPC 延迟和错误率自动增减同时进行的 claim 数
+- 发送前批量 eth_call 预执行 claim，会 revert 的地址（已领取、没有资格等）直接记录 revert 原因，不发送交易
+- 余额通过 Multicall3 批量读取（数千个地址只需几个 eth_call），链上没有 Multicall3 时使用 JSON-RPC batch
+- 可选多进程签名（SIGNER_WORKERS>0）：交易按批在进程池中签名，签名不再占用 worker 线程的 GIL
+- 可选批量发送交易（SEND_BATCH_SIZE>0）：短时间内就绪的交易合并为一个 batch 请求发送，结果按地址分别处理
+- 流式加载钱包（支持二进制 wallet.bin），边加载边处理
 - 自动重试机制（最多3次）
+- 每个结果实时写入 SQLite 账本，支持 --resume 断点续跑
+- 分片执行（--shard i/N）：按地址哈希把钱包分成 N 片，每片在单独的进程或机器上运行（每个地址只由一个进程管理 nonce），
+  --shards N 在本机启动 N 个进程并合并结果，--merge N 合并从多台机器收集的分片结果
+- 分阶段耗时统计（nonce / gas 费用 / 估算 / 签名 / 发送 / 等待回执）、按方法统计 RPC 调用、按错误类型统计重试，
+  可导出为 Prometheus textfile 或 JSON，可选实时统计行
 - 保存执行结果
+
+导入本模块没有副作用（不连接网络、不读取钱包），由 main() 或 ClaimRunner.run() 开始执行
 """
 
 import os
+import sys
 import json
+import argparse
 import time
-import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import logging
 from common.config_loader import ConfigLoader
-from web3 import Web3  # pyright: ignore[reportMissingImports]
-from eth_account import Account  # pyright: ignore[reportMissingImports]
+from common.wallet_store import find_wallet_file, count_wallets, iter_wallet_chunks, ensure_address_index
+from common.web3_provider import (create_session, create_rpc_client, create_web3, create_async_web3,
+                                  create_aiohttp_session, PoolStats)
+from common.rpc_pool import RpcPool, parse_rpc_urls, DEFAULT_BROADCAST
+from common.multicall import MulticallReader, MULTICALL3_ADDRESS
+from common.simulation import simulate_calls
+from common.nonce_manager import NonceManager, fetch_pending_nonces, is_nonce_error
+from common.fee_oracle import FeeOracle
+from common.gas_cache import GasEstimateCache, is_out_of_gas_error
+from common.receipt_watcher import ReceiptWatcher, normalize_tx_hash
+from common.retry import RetryPolicy, REPLACE, FATAL
+from common.ledger import RunLedger
+from common.metrics import Metrics, LiveStats
+from common.log_pipeline import LogPipeline
+from common.concurrency import AdaptiveConcurrency
+from common.batch_executor import BatchExecutor
+from common.sharding import parse_shard, format_shard, in_shard, shard_path, run_shards, merge_reports
+from common.tx_signer import TransactionSigner
+from common.tx_broadcaster import TransactionBroadcaster
 
 # OPN 测试网配置
 RPC_URL = "https://testnet-rpc.iopn.tech"
@@ -26,268 +62,1221 @@ EXPLORER_URL = "https://testnet.iopn.tech"
 CONTRACT_ADDRESS = "0xbc5c49abc5282994bd2c641438391d5e2e730c25"
 CLAIM_DATA = "0x4e71d92d"
 
+DEFAULT_GAS_LIMIT = 200000  # gas 估算失败时使用的默认值
+RECEIPT_TIMEOUT = 120  # 等待交易确认的超时时间（秒）
+MAX_RETRIES = 3  # 每个地址最多尝试次数
+RETRY_DELAY = 1  # 第一次重试前等待时间（秒），之后按指数退避
+MIN_BALANCE = 0.0001  # 余额低于该值时跳过
+
 # 指定当前项目目录
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
-# 加载配置
-config = ConfigLoader(current_dir)\
-            .load_env(keys=['MAX_WORKERS'])
+CONFIG_KEYS = ['MAX_WORKERS', 'RPC_BATCH_SIZE', 'CLAIM_MODE', 'ASYNC_CONCURRENCY',
+               'FEE_MODE', 'FEE_TTL', 'FEE_PERCENTILE', 'FEE_MULTIPLIER',
+               'RECEIPT_POLL_INTERVAL', 'RPC_POOL_SIZE', 'RPC_TIMEOUT', 'RPC_KEEPALIVE',
+               'RPC_HTTP2', 'METRICS_FILE', 'METRICS_JSON', 'STATS_INTERVAL',
+               'ADAPTIVE_CONCURRENCY', 'MIN_CONCURRENCY', 'MAX_CONCURRENCY', 'RPC_URLS', 'RPC_BROADCAST',
+               'SIGNER_WORKERS', 'SIGNER_BATCH_SIZE', 'SEND_BATCH_SIZE', 'SEND_BATCH_DELAY',
+               'MULTICALL', 'MULTICALL_ADDRESS', 'SIMULATE', 'MAX_ATTEMPTS', 'RETRY_DELAY', 'RETRY_MAX_DELAY',
+               'FEE_BUMP', 'RECEIPT_TIMEOUT', 'LOG_LEVEL', 'LOG_JSONL', 'PROGRESS']
 
-MAX_WORKERS = int(config.get('MAX_WORKERS', 3))  # 默认3个线程（claim比较慢）
+# 线程模式自适应并发的默认上限
+DEFAULT_MAX_CONCURRENCY = 64
+# claim 重试原因属于这些类型时，同样视为 RPC 过载（节点在 200 响应中返回限流错误）
+OVERLOAD_ERRORS = ('rate_limited',)
 
-# 连接到 OPN 测试网
-print("🔗 连接到 OPN 测试网...")
-w3 = Web3(Web3.HTTPProvider(RPC_URL))
+# execute_claim 的各个阶段（claim_phase_seconds 的 phase 标签）
+CLAIM_PHASES = ('nonce', 'gas_price', 'estimate', 'sign', 'send', 'receipt')
 
-if w3.is_connected():
-    print(f"✅ 已连接到 OPN 测试网")
-    print(f"📊 当前区块高度: {w3.eth.block_number}")
-else:
-    print("❌ 无法连接到 OPN 测试网")
-    exit(1)
+# 结果文件名（分片执行时各分片写入带分片后缀的文件，合并后写入此文件）
+RESULT_FILE = 'claim_results.json'
 
-# 读取私钥列表
-wallet_file = os.path.join(current_dir, 'wallet.json')
-with open(wallet_file, 'r', encoding='utf-8') as f:
-    private_keys = json.load(f)
+# 实时进度行的刷新间隔（秒）
+PROGRESS_INTERVAL = 0.25
 
-# 将私钥转换为账户
-accounts = []
-print("\n🔐 开始加载钱包...")
-for idx, private_key in enumerate(private_keys, 1):
-    try:
-        # 确保私钥格式正确
-        if not private_key.startswith('0x'):
-            private_key = '0x' + private_key
-        
-        account = Account.from_key(private_key)
-        
-        # 查询余额
-        balance = w3.eth.get_balance(account.address)
-        balance_eth = w3.from_wei(balance, 'ether')
-        
-        accounts.append({
-            'private_key': private_key,
-            'address': account.address,
-            'balance': balance_eth
-        })
-        print(f"  [{idx}] {account.address} (余额: {balance_eth:.6f} OPN)")
-    except Exception as e:
-        print(f"  [{idx}] ❌ 加载失败: {str(e)}")
-        continue
+# 处理过程中的日志（run() 期间经队列由单独的线程输出，见 common.log_pipeline）
+log = logging.getLogger('opn_claim')
+
+
+def load_settings(config_dir=current_dir, config=None):
+    """
+    读取运行配置
 
-print(f"\n📋 成功加载 {len(accounts)} 个钱包")
-print(f"🧵 线程数: {MAX_WORKERS}")
-print("=" * 70)
+    Args:
+        config_dir: .env 所在目录
+        config: 已有的 ConfigLoader（为 None 时从 config_dir 读取）
 
-# 统计信息
-success_count = 0
-failed_count = 0
-results = []
+    Returns:
+        配置字典（键名与 .env 相同）
+    """
+    if config is None:
+        config = ConfigLoader(config_dir).load_env(keys=CONFIG_KEYS)
 
-# 线程锁，用于保护共享变量
-stats_lock = threading.Lock()
-results_lock = threading.Lock()
-print_lock = threading.Lock()
+    settings = {
+        'MAX_WORKERS': config.get_int('MAX_WORKERS', 3),  # 默认3个线程（claim比较慢）
+        'RPC_BATCH_SIZE': config.get_int('RPC_BATCH_SIZE', 200),  # 每个 batch 请求包含的 RPC 调用数
+        'CLAIM_MODE': config.get_str('CLAIM_MODE', 'thread', lower=True),  # thread: 线程池; async: asyncio
+        'ASYNC_CONCURRENCY': config.get_int('ASYNC_CONCURRENCY', 500),  # 异步模式下同时处理的 claim 数量
+        'FEE_MODE': config.get_str('FEE_MODE', 'legacy', lower=True),  # legacy: gasPrice; eip1559: maxFeePerGas
+        'FEE_TTL': config.get_float('FEE_TTL', 3.0),  # gas 费用缓存时间（秒）
+        'FEE_PERCENTILE': config.get_int('FEE_PERCENTILE', 50),  # EIP-1559 小费百分位
+        'FEE_MULTIPLIER': config.get_float('FEE_MULTIPLIER', 1.0),  # gas 费用倍数
+        'RECEIPT_POLL_INTERVAL': config.get_float('RECEIPT_POLL_INTERVAL', 1.0),  # 查询新区块的间隔（秒）
+        'RPC_POOL_SIZE': config.get_int('RPC_POOL_SIZE'),  # HTTP 连接池大小，None 时按并发数计算
+        'RPC_TIMEOUT': config.get_float('RPC_TIMEOUT', 30.0),  # 单个 RPC 请求超时时间（秒）
+        'RPC_KEEPALIVE': config.get_bool('RPC_KEEPALIVE', True),  # 是否复用长连接
+        'RPC_HTTP2': config.get_bool('RPC_HTTP2', False),  # batch 请求是否使用 HTTP/2
+        'METRICS_FILE': config.get_str('METRICS_FILE'),  # Prometheus textfile 导出路径
+        'METRICS_JSON': config.get_str('METRICS_JSON'),  # JSON 指标摘要导出路径
+        'STATS_INTERVAL': config.get_float('STATS_INTERVAL', 0.0),  # 输出不是终端时统计行的打印间隔（秒），0 为关闭
+        'ADAPTIVE_CONCURRENCY': config.get_bool('ADAPTIVE_CONCURRENCY', False),  # 按 RPC 延迟和错误率自动调整并发数
+        'MIN_CONCURRENCY': config.get_int('MIN_CONCURRENCY', 1),  # 自适应并发下限
+        'MAX_CONCURRENCY': config.get_int('MAX_CONCURRENCY'),  # 自适应并发上限，默认线程模式 64，异步模式 ASYNC_CONCURRENCY
+        'RPC_URLS': parse_rpc_urls(config.get_str('RPC_URLS')),  # 多个 RPC 节点（逗号分隔），为空时使用 RPC_URL
+        'RPC_BROADCAST': config.get_int('RPC_BROADCAST', DEFAULT_BROADCAST),  # 交易同时广播到的节点数
+        'SIGNER_WORKERS': config.get_int('SIGNER_WORKERS', 0),  # 签名进程数，0 为在 worker 中直接签名
+        'SIGNER_BATCH_SIZE': config.get_int('SIGNER_BATCH_SIZE', 32),  # 每批交给签名进程的交易数
+        'SEND_BATCH_SIZE': config.get_int('SEND_BATCH_SIZE', 0),  # 每个 batch 请求最多发送的交易数，0 为逐笔发送
+        'SEND_BATCH_DELAY': config.get_float('SEND_BATCH_DELAY', 0.01),  # 凑批最多等待时间（秒）
+        'MULTICALL': config.get_bool('MULTICALL', True),  # 是否通过 Multicall3 批量读取余额
+        'MULTICALL_ADDRESS': config.get_str('MULTICALL_ADDRESS', MULTICALL3_ADDRESS),  # Multicall3 合约地址
+        'SIMULATE': config.get_bool('SIMULATE', True),  # 发送前用 eth_call 预执行，跳过会 revert 的地址
+        'MAX_ATTEMPTS': config.get_int('MAX_ATTEMPTS', MAX_RETRIES),  # 每个地址最多尝试次数（包括替换交易）
+        'RETRY_DELAY': config.get_float('RETRY_DELAY', RETRY_DELAY),  # 第一次重试前等待时间（秒），之后按指数退避并加随机抖动
+        'RETRY_MAX_DELAY': config.get_float('RETRY_MAX_DELAY', 30.0),  # 重试等待时间上限（秒）
+        'FEE_BUMP': config.get_float('FEE_BUMP', 1.125),  # 替换卡住或费用过低的交易时的费用倍数（至少 1.1）
+        'LOG_LEVEL': config.get_str('LOG_LEVEL', 'info', lower=True),  # 日志级别: debug / info / warning / error
+        'LOG_JSONL': config.get_str('LOG_JSONL'),  # JSONL 结构化日志路径（可选）
+        'PROGRESS': config.get_bool('PROGRESS', True),  # 终端中显示实时进度行
+        'RECEIPT_TIMEOUT': config.get_float('RECEIPT_TIMEOUT', RECEIPT_TIMEOUT),  # 等待交易确认的超时时间（秒），超时后替换交易
+    }
 
-def thread_print(msg):
-    """线程安全的打印函数"""
-    with print_lock:
-        print(msg)
+    if settings['CLAIM_MODE'] not in ('thread', 'async'):
+        raise ValueError(f"不支持的 CLAIM_MODE: {settings['CLAIM_MODE']}（可选 thread / async）")
+    return settings
 
 
-def execute_claim(account_info, idx, total, attempt=1):
+class ClaimRunner:
     """
-    执行 claim 操作
-    
-    Args:
-        account_info: 账户信息
-        idx: 钱包编号
-        total: 总钱包数
-        attempt: 当前尝试次数
-    
-    Returns:
-        (success, tx_hash, error_msg)
+    批量 claim 执行器
+
+    创建时只保存配置，connect() 时才建立 RPC 连接，run() 执行全部钱包
     """
-    try:
-        private_key = account_info['private_key']
-        address = account_info['address']
-        
-        # 创建账户对象
-        account = Account.from_key(private_key)
-        
-        # 获取 nonce
-        nonce = w3.eth.get_transaction_count(address)
-        
-        # 获取 gas price
-        gas_price = w3.eth.gas_price
-        
-        # 构建交易
-        transaction = {
+
+    def __init__(self, settings, rpc_url=RPC_URL, data_dir=current_dir, wallet_file=None, resume=False, shard=None):
+        """
+        settings: load_settings() 返回的配置
+        rpc_url: RPC 节点地址、地址列表或 RpcPool（settings 中配置了 RPC_URLS 时使用 RPC_URLS）
+        data_dir: 钱包、账本和结果文件所在目录
+        wallet_file: 钱包文件，默认按 data_dir 自动查找 wallet.bin / wallet.json
+        resume: 是否跳过账本中已成功的地址
+        shard: 分片 (i, N)，只处理按地址哈希属于第 i 片的钱包，账本、结果和指标文件名带分片后缀；None 为处理全部钱包
+        """
+        self.settings = settings
+        self.data_dir = data_dir
+        self.wallet_file = wallet_file
+        self.resume = resume
+        self.shard = shard
+
+        self.claim_mode = settings['CLAIM_MODE']
+        self.max_workers = settings['MAX_WORKERS']
+        self.async_concurrency = settings['ASYNC_CONCURRENCY']
+        self.batch_size = settings['RPC_BATCH_SIZE']
+
+        # 分阶段耗时、RPC 调用和错误统计
+        self.metrics = Metrics(prefix='opn_claim')
+
+        # 配置了多个节点时使用 RpcPool，所有 RPC 请求（包括 batch 和回执查询）都经过节点池
+        urls = settings.get('RPC_URLS') or rpc_url
+        if isinstance(urls, (list, tuple)):
+            urls = parse_rpc_urls(urls)
+            urls = RpcPool(urls, broadcast=settings.get('RPC_BROADCAST', DEFAULT_BROADCAST),
+                           metrics=self.metrics) if len(urls) > 1 else urls[0]
+        self.rpc_url = urls
+        self.rpc_pool = urls if isinstance(urls, RpcPool) else None
+
+        # 自适应并发：从 MAX_WORKERS 开始，按 RPC 延迟和错误率在 [MIN_CONCURRENCY, MAX_CONCURRENCY] 内调整
+        self.limiter = None
+        if settings['ADAPTIVE_CONCURRENCY']:
+            default_max = self.async_concurrency if self.claim_mode == 'async' else DEFAULT_MAX_CONCURRENCY
+            self.limiter = AdaptiveConcurrency(
+                initial=self.max_workers,
+                min_limit=settings['MIN_CONCURRENCY'],
+                max_limit=settings['MAX_CONCURRENCY'] or default_max,
+                on_change=self.on_concurrency_change
+            )
+            self.metrics.add_rpc_listener(self.limiter.on_rpc)
+            self.metrics.set_gauge('concurrency_limit', self.limiter.limit)
+
+        # 连接池默认按并发数配置（线程模式额外预留回执监听器和费用查询的连接）
+        if self.claim_mode == 'async':
+            default_pool_size = min(self.async_concurrency, 100)
+        else:
+            default_pool_size = self.thread_count + 4
+        self.pool_size = settings['RPC_POOL_SIZE'] or default_pool_size
+
+        # 重试策略：按错误类型重试（指数退避加随机抖动）、替换交易（同一个 nonce 提高费用）或放弃
+        self.retry_policy = RetryPolicy(
+            max_attempts=settings['MAX_ATTEMPTS'],
+            base_delay=settings['RETRY_DELAY'],
+            max_delay=settings['RETRY_MAX_DELAY'],
+            fee_bump=settings['FEE_BUMP'],
+            metrics=self.metrics
+        )
+        self.receipt_timeout = settings['RECEIPT_TIMEOUT']
+
+        # 所有 worker 共享的 gas 费用预言机
+        self.fee_oracle = FeeOracle(
+            mode=settings['FEE_MODE'],
+            ttl=settings['FEE_TTL'],
+            percentile=settings['FEE_PERCENTILE'],
+            multiplier=settings['FEE_MULTIPLIER']
+        )
+        # 所有钱包发送相同的 claim 调用，gas 估算结果采样后共享
+        self.gas_cache = GasEstimateCache(samples=3, buffer=1.2, fallback=DEFAULT_GAS_LIMIT)
+
+        # 网络相关对象在 connect() 中创建
+        self.rpc_session = None
+        self.rpc_client = None
+        self.reader = None
+        self.w3 = None
+        self.contract_address = None
+        self.nonce_manager = None
+        self.receipt_watcher = None
+        self.signer = None
+        self.broadcaster = None
+        self.ledger = None
+        self.async_pool_stats = PoolStats(self.pool_size)
+
+        self.wallet_total = 0
+        self.completed_addresses = set()
+
+        # 批量任务执行器：边加载边提交任务，统计按线程计数（结果明细写入账本）
+        self.executor = BatchExecutor(
+            workers=self.async_limit if self.claim_mode == 'async' else self.thread_count,
+            max_pending=lambda: self.max_in_flight,
+            on_done=self.report_progress,
+            name='claim'
+        )
+        self.elapsed_time = 0
+        self.started_at = 0.0
+
+    @property
+    def success_count(self):
+        return self.executor.total('success')
+
+    @property
+    def failed_count(self):
+        return self.executor.total('failed')
+
+    @property
+    def processed_count(self):
+        return self.executor.total('processed')
+
+    @property
+    def skipped_count(self):
+        return self.executor.total('skipped')
+
+    @property
+    def other_shard_count(self):
+        return self.executor.total('other_shard')
+
+    @property
+    def simulated_reverts(self):
+        return self.executor.total('simulated_reverts')
+
+    @property
+    def thread_count(self):
+        """线程池大小（自适应并发时为并发上限，实际同时进行的任务数由 limiter 控制）"""
+        return self.limiter.max_limit if self.limiter is not None else self.max_workers
+
+    @property
+    def async_limit(self):
+        """异步模式下同时进行的任务数上限"""
+        return self.limiter.max_limit if self.limiter is not None else self.async_concurrency
+
+    @property
+    def max_in_flight(self):
+        """当前允许同时提交的任务数"""
+        if self.limiter is not None:
+            return self.limiter.limit
+        return self.async_concurrency * 2 if self.claim_mode == 'async' else self.max_workers * 4
+
+    def on_concurrency_change(self, old, new, reason):
+        """自适应并发数变化时记录指标并打印"""
+        self.metrics.set_gauge('concurrency_limit', new)
+        self.metrics.inc('concurrency_changes_total', direction='up' if new > old else 'down')
+        log.info(f"{'📈' if new > old else '📉'} 并发数 {old} → {new}（{reason}）")
+
+    def connect(self):
+        """
+        建立 RPC 连接并准备钱包、账本、nonce 管理器和回执监听器
+
+        Returns:
+            是否连接成功
+        """
+        from web3 import Web3  # pyright: ignore[reportMissingImports]
+
+        print("🔗 连接到 OPN 测试网...")
+        if self.rpc_pool is not None:
+            print(f"🌐 RPC 节点池: {len(self.rpc_pool)} 个节点，交易广播到 {self.rpc_pool.broadcast_count} 个节点")
+        self.rpc_session = create_session(pool_size=self.pool_size, keepalive=self.settings['RPC_KEEPALIVE'],
+                                          metrics=self.metrics)
+        self.w3 = create_web3(self.rpc_url, session=self.rpc_session, timeout=self.settings['RPC_TIMEOUT'])
+
+        # batch 请求（余额、nonce、回执）使用的客户端，开启 HTTP/2 时单独创建
+        self.rpc_client = create_rpc_client(
+            pool_size=self.pool_size,
+            keepalive=self.settings['RPC_KEEPALIVE'],
+            timeout=self.settings['RPC_TIMEOUT'],
+            http2=True,
+            metrics=self.metrics
+        ) if self.settings['RPC_HTTP2'] else self.rpc_session
+
+        # 批量链上读取（余额等），没有部署 Multicall3 时自动使用 JSON-RPC batch
+        self.reader = MulticallReader(
+            self.rpc_url,
+            session=self.rpc_client,
+            address=self.settings['MULTICALL_ADDRESS'] if self.settings.get('MULTICALL', True) else None,
+            batch_size=self.batch_size,
+            timeout=self.settings['RPC_TIMEOUT']
+        )
+
+        if not self.w3.is_connected():
+            print("❌ 无法连接到 OPN 测试网")
+            return False
+        print("✅ 已连接到 OPN 测试网")
+        print(f"📊 当前区块高度: {self.w3.eth.block_number}")
+        self.contract_address = Web3.to_checksum_address(CONTRACT_ADDRESS)
+
+        # 钱包文件（支持私钥数组、HD 钱包描述和二进制 wallet.bin），流式加载，地址优先从索引缓存读取
+        self.wallet_file = self.wallet_file or find_wallet_file(self.data_dir)
+        self.wallet_total = count_wallets(self.wallet_file)
+        print(f"\n🔐 钱包文件: {os.path.basename(self.wallet_file)}（共 {self.wallet_total} 个，边加载边处理）")
+        if self.shard is not None:
+            print(f"🧩 分片 {format_shard(self.shard)}：只处理按地址哈希属于本分片的钱包"
+                  f"（约 {self.wallet_total // self.shard[1]} 个）")
+
+        # 执行记录账本：每个结果实时写入，断点续跑时跳过已成功的地址（每个分片单独一个账本）
+        self.ledger = RunLedger(self.output_path('claim_ledger.db'), resume=self.resume)
+        self.completed_addresses = self.ledger.completed_addresses() if self.resume else set()
+
+        # nonce 按块批量同步（pending 状态），之后在本地分配
+        w3 = self.w3
+        self.nonce_manager = NonceManager(
+            fetch_nonce=lambda address: w3.eth.get_transaction_count(address, 'pending')
+        )
+
+        # 回执监听器：每个新区块统一查询一次所有待确认交易，并通知费用预言机
+        self.receipt_watcher = ReceiptWatcher(
+            self.rpc_url,
+            session=self.rpc_client,
+            poll_interval=self.settings['RECEIPT_POLL_INTERVAL'],
+            batch_size=self.batch_size
+        )
+        self.receipt_watcher.add_block_listener(self.fee_oracle.notify_block)
+        return True
+
+    def output_path(self, path):
+        """输出文件路径：相对路径相对于 data_dir，分片执行时加上分片后缀"""
+        return shard_path(os.path.join(self.data_dir, path), self.shard)
+
+    def record_result(self, entry):
+        """记录单个账户的处理结果并更新统计（结果立即写入账本）"""
+        self.executor.stats.inc('success' if entry['status'] == 'success' else 'failed')
+        self.metrics.inc('claims_total', status=entry['status'])
+        if entry['status'] != 'success':
+            self.metrics.record_error('failures_total', entry.get('error'))
+        self.ledger.record(entry)
+
+    def settle_nonce(self, address, nonce, sent, error):
+        """
+        交易失败后修正本地 nonce
+
+        - nonce 相关错误：按链上 pending 状态重新同步
+        - 交易未发出：归还本次分配的 nonce
+        """
+        if nonce is None:
+            return
+        if is_nonce_error(error):
+            try:
+                self.nonce_manager.resync(address)
+            except Exception:
+                pass
+        elif not sent:
+            self.nonce_manager.release(address, nonce)
+
+    def build_claim_transaction(self, address, nonce, fees):
+        """
+        构建 claim 交易
+
+        fees: FeeOracle 返回的费用字段（gasPrice 或 EIP-1559 字段）
+        """
+        return {
             'from': address,
-            'to': Web3.to_checksum_address(CONTRACT_ADDRESS),
+            'to': self.contract_address,
             'value': 0,
-            'gas': 200000,  # 预估 gas limit
-            'gasPrice': gas_price,
+            'gas': DEFAULT_GAS_LIMIT,  # 预估 gas limit
             'nonce': nonce,
             'chainId': CHAIN_ID,
-            'data': CLAIM_DATA
+            'data': CLAIM_DATA,
+            **fees
         }
-        
-        # 估算实际需要的 gas
+
+    def sign_claim(self, account_info, transaction):
+        """签名交易：配置了签名进程时交给进程池，否则使用钱包的账户对象直接签名"""
+        if self.signer is not None:
+            return self.signer.sign(account_info.key, transaction)
+        return account_info.account.sign_transaction(transaction)
+
+    async def async_sign_claim(self, account_info, transaction):
+        """签名交易（异步版本）：没有签名进程时直接签名，与原来的行为相同"""
+        if self.signer is not None:
+            return await self.signer.async_sign(account_info.key, transaction)
+        return account_info.account.sign_transaction(transaction)
+
+    def send_claim(self, w3, signed_txn):
+        """发送已签名交易：开启批量发送时与其他交易合并为一个 batch 请求，返回交易哈希"""
+        if self.broadcaster is not None:
+            return self.broadcaster.send(signed_txn.raw_transaction)
+        return w3.eth.send_raw_transaction(signed_txn.raw_transaction)
+
+    async def async_send_claim(self, aw3, signed_txn):
+        """发送已签名交易（异步版本）"""
+        if self.broadcaster is not None:
+            return await self.broadcaster.async_send(signed_txn.raw_transaction)
+        return await aw3.eth.send_raw_transaction(signed_txn.raw_transaction)
+
+    def claim_fees(self, fees, state, replace):
+        """本次交易使用的费用：替换交易或费用过低重发时，在上一笔交易费用的基础上按 FEE_BUMP 提高"""
+        if replace and state.get('fees'):
+            return self.retry_policy.bump_fees(fees, state['fees'])
+        return fees
+
+    def execute_claim(self, account_info, idx, total, attempt=1, state=None, replace=False):
+        """
+        执行 claim 操作
+
+        Args:
+            account_info: 账户信息（WalletRecord，balance 为查询到的余额）
+            idx: 钱包编号
+            total: 总钱包数
+            attempt: 当前尝试次数
+            state: 同一地址各次尝试共享的状态：fees 为上一笔交易的费用，
+                   pending 为可能仍在交易池中的交易 {'nonce', 'tx_hashes'}
+            replace: 是否替换上一笔交易（同一个 nonce、提高费用重新发送）
+
+        Returns:
+            (success, tx_hash, error_msg)
+        """
+        w3 = self.w3
+        gas_cache = self.gas_cache
+        timer = self.metrics.timer
+        state = {} if state is None else state
+        # 上一笔交易可能仍在交易池中时必须沿用它的 nonce（否则新交易排在它后面），并提高费用替换
+        pending = state.get('pending')
+        replace = replace or pending is not None
+        nonce = None
+        sent = False
+        gas_key = None
+        tx_hash_hex = None
         try:
-            estimated_gas = w3.eth.estimate_gas(transaction)
-            transaction['gas'] = int(estimated_gas * 1.2)  # 增加 20% 作为缓冲
+            address = account_info.address
+
+            # 本地分配 nonce；替换交易时沿用被替换交易的 nonce
+            with timer('claim_phase_seconds', phase='nonce'):
+                nonce = pending['nonce'] if pending else self.nonce_manager.allocate(address)
+            state.pop('pending', None)
+
+            # 获取 gas 费用（共享缓存，TTL 内不重复查询），替换交易时提高费用
+            with timer('claim_phase_seconds', phase='gas_price'):
+                fees = self.claim_fees(self.fee_oracle.get_fees(w3), state, replace)
+            state['fees'] = fees
+
+            # 构建交易
+            transaction = self.build_claim_transaction(address, nonce, fees)
+
+            # 估算实际需要的 gas（相同调用复用采样结果）
+            gas_key = gas_cache.key_for(transaction)
+            cached_gas = gas_cache.lookup(gas_key)
+            if cached_gas is not None:
+                transaction['gas'] = cached_gas
+            else:
+                try:
+                    with timer('claim_phase_seconds', phase='estimate'):
+                        estimated_gas = w3.eth.estimate_gas(transaction)
+                    transaction['gas'] = gas_cache.add_sample(gas_key, estimated_gas)  # 增加 20% 作为缓冲
+                except Exception as e:
+                    gas_cache.discard(gas_key)
+                    log.warning(f"[{idx}/{total}] ⚠️  Gas 估算失败，使用默认值: {str(e)}")
+
+            # 签名交易（多进程签名时包括排队等待的时间）
+            with timer('claim_phase_seconds', phase='sign'):
+                signed_txn = self.sign_claim(account_info, transaction)
+
+            # 发送交易；替换交易因 nonce 已被使用而被拒绝时，说明原交易已被打包或仍在交易池中，继续等待原交易
+            tx_hashes = list(pending['tx_hashes']) if pending else []
+            try:
+                with timer('claim_phase_seconds', phase='send'):
+                    tx_hash = self.send_claim(w3, signed_txn)
+            except Exception as e:
+                if not pending or not is_nonce_error(e):
+                    raise
+                log.warning(f"[{idx}/{total}] ⚠️  替换交易被拒绝（{e}），继续等待原交易")
+            else:
+                sent = True
+                tx_hashes.append(tx_hash)
+                tx_hash_hex = tx_hash.hex()
+                log.debug("[%s/%s] 📤 交易已发送: %s/tx/%s", idx, total, EXPLORER_URL, tx_hash_hex,
+                          extra={'event': 'tx_sent', 'address': address, 'nonce': nonce, 'tx_hash': tx_hash_hex})
+            state['pending'] = {'nonce': nonce, 'tx_hashes': tx_hashes}
+
+            # 等待交易确认（由回执监听器统一查询，等待期间不产生 RPC 请求；替换交易时任意一笔被打包即可）
+            log.debug("[%s/%s] ⏳ 等待交易确认...", idx, total)
+            with timer('claim_phase_seconds', phase='receipt'):
+                receipt = self.receipt_watcher.wait_any(tx_hashes, timeout=self.receipt_timeout)
+            state.pop('pending', None)
+            return self.check_receipt(receipt, transaction, gas_key)
+
         except Exception as e:
-            thread_print(f"[{idx}/{total}] ⚠️  Gas 估算失败，使用默认值: {str(e)}")
-        
-        # 签名交易
-        signed_txn = account.sign_transaction(transaction)
-        
-        # 发送交易
-        tx_hash = w3.eth.send_raw_transaction(signed_txn.raw_transaction)
-        tx_hash_hex = tx_hash.hex()
-        
-        thread_print(f"[{idx}/{total}] 📤 交易已发送: {tx_hash_hex}")
-        thread_print(f"[{idx}/{total}] 🔍 查看交易: {EXPLORER_URL}/tx/{tx_hash_hex}")
-        
-        # 等待交易确认
-        thread_print(f"[{idx}/{total}] ⏳ 等待交易确认...")
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
-        
+            if gas_key is not None and is_out_of_gas_error(e):
+                gas_cache.invalidate(gas_key)
+            # 沿用的 nonce 属于仍在交易池中的交易，不能归还，下一次尝试继续替换
+            if pending is not None:
+                state.setdefault('pending', pending)
+            else:
+                self.settle_nonce(account_info.address, nonce, sent, e)
+            return False, tx_hash_hex, str(e)
+
+    def check_receipt(self, receipt, transaction, gas_key):
+        """
+        根据回执判断 claim 结果
+
+        Returns:
+            (success, tx_hash, error_msg)
+        """
+        tx_hash_hex = normalize_tx_hash(receipt['transactionHash'])
         if receipt['status'] == 1:
             return True, tx_hash_hex, None
-        else:
-            return False, tx_hash_hex, "交易执行失败"
-            
-    except Exception as e:
-        return False, None, str(e)
-
-
-def process_account(idx, account_info, total):
-    """处理单个账户的claim任务"""
-    global success_count, failed_count
-    
-    address = account_info['address']
-    balance = account_info['balance']
-    
-    thread_print(f"\n[{idx}/{total}] 🚀 开始处理: {address}")
-    thread_print(f"[{idx}/{total}] 💰 余额: {balance:.6f} OPN")
-    
-    # 检查余额是否足够
-    if balance < 0.0001:
-        thread_print(f"[{idx}/{total}] ❌ 余额不足，跳过")
-        with stats_lock:
-            failed_count += 1
-        with results_lock:
-            results.append({
+        # gas 全部用完说明缓存的 gas limit 不够，重新采样后可以重试；其他情况为合约 revert，重试不会成功
+        if receipt.get('gasUsed', 0) >= transaction['gas']:
+            self.gas_cache.invalidate(gas_key)
+            return False, tx_hash_hex, "交易执行失败: out of gas（gas 用尽）"
+        return False, tx_hash_hex, "交易执行失败"
+
+    def check_balance(self, idx, account_info, total):
+        """打印账户信息并检查余额，余额不足时直接记录失败"""
+        address = account_info.address
+        balance = self.w3.from_wei(account_info.balance, 'ether')
+
+        log.debug("[%s/%s] 🚀 开始处理: %s，余额 %.6f OPN", idx, total, address, balance)
+
+        # 检查余额是否足够
+        if balance < MIN_BALANCE:
+            log.warning(f"[{idx}/{total}] ❌ 余额不足，跳过: {address}（{balance:.6f} OPN）",
+                        extra={'event': 'insufficient_balance', 'address': address, 'balance': float(balance)})
+            self.record_result({
                 "address": address,
-                "private_key": account_info['private_key'],
+                "private_key": account_info.private_key,
                 "status": "failed",
                 "error": "余额不足"
             })
-        return address
-    
-    max_retries = 3
-    claim_success = False
-    
-    for attempt in range(1, max_retries + 1):
-        if attempt > 1:
-            thread_print(f"[{idx}/{total}] 🔄 第 {attempt} 次重试...")
-            time.sleep(3)  # 重试前等待3秒
-        
-        thread_print(f"[{idx}/{total}] 🔄 执行 claim 操作...")
-        success, tx_hash, error_msg = execute_claim(account_info, idx, total, attempt)
-        
+            return False
+        return True
+
+    def handle_attempt(self, idx, account_info, total, attempt, success, tx_hash, error_msg):
+        """
+        处理一次 claim 尝试的结果
+
+        Returns:
+            None 表示该地址已处理完毕（成功或放弃），否则为下一次尝试的处理方式（retry / replace）
+        """
+        address = account_info.address
+
         if success:
-            thread_print(f"[{idx}/{total}] ✅ Claim 成功! {address}")
-            thread_print(f"[{idx}/{total}] 📝 交易哈希: {tx_hash}")
-            
-            with stats_lock:
-                success_count += 1
-            with results_lock:
-                results.append({
-                    "address": address,
-                    "private_key": account_info['private_key'],
-                    "status": "success",
-                    "attempts": attempt,
-                    "tx_hash": tx_hash,
-                    "explorer_url": f"{EXPLORER_URL}/tx/{tx_hash}"
-                })
-            claim_success = True
-            break
-        else:
-            thread_print(f"[{idx}/{total}] ❌ Claim 失败: {error_msg}")
-            
-            if attempt < max_retries:
-                thread_print(f"[{idx}/{total}] ⏳ 将重试...")
-            else:
-                thread_print(f"[{idx}/{total}] ❌ 已达到最大重试次数，放弃该地址")
-                
-                with stats_lock:
-                    failed_count += 1
-                with results_lock:
-                    results.append({
-                        "address": address,
-                        "private_key": account_info['private_key'],
-                        "status": "failed",
-                        "attempts": attempt,
-                        "error": error_msg,
-                        "tx_hash": tx_hash if tx_hash else None
-                    })
-    
-    return address
-
-# 使用线程池处理所有账户
-print("\n🚀 开始批量处理账户...")
-start_time = time.time()
-
-with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-    # 提交所有任务
-    futures = {
-        executor.submit(process_account, idx, account_info, len(accounts)): (idx, account_info) 
-        for idx, account_info in enumerate(accounts, 1)
-    }
-    
-    # 等待所有任务完成
-    completed = 0
-    for future in as_completed(futures):
-        completed += 1
+            log.info(f"[{idx}/{total}] ✅ Claim 成功! {address} 交易哈希: {tx_hash}",
+                     extra={'event': 'claim_success', 'address': address, 'tx_hash': tx_hash, 'attempts': attempt})
+
+            self.record_result({
+                "address": address,
+                "private_key": account_info.private_key,
+                "status": "success",
+                "attempts": attempt,
+                "tx_hash": tx_hash,
+                "explorer_url": f"{EXPLORER_URL}/tx/{tx_hash}"
+            })
+            return None
+
+        decision, error_class = self.retry_policy.classify(error_msg)
+        if self.retry_policy.should_retry(attempt, decision):
+            action = "将使用同一个 nonce 提高费用替换交易" if decision == REPLACE else "将重试"
+            log.warning(f"[{idx}/{total}] ❌ Claim 失败: {error_msg}，{action}",
+                        extra={'event': 'claim_retry', 'address': address, 'attempts': attempt, 'decision': decision,
+                               'error_class': error_class, 'tx_hash': tx_hash})
+            self.metrics.record_error('retries_total', error_msg)
+            if self.limiter is not None and error_class in OVERLOAD_ERRORS:
+                self.limiter.record(error=True)
+            return decision
+
+        reason = f"错误无法通过重试解决（{error_class}）" if decision == FATAL else "已达到最大重试次数"
+        log.error(f"[{idx}/{total}] ❌ Claim 失败: {error_msg}，{reason}，放弃该地址: {address}",
+                  extra={'event': 'claim_failed', 'address': address, 'attempts': attempt, 'error': error_msg,
+                         'error_class': error_class, 'tx_hash': tx_hash})
+        self.record_result({
+            "address": address,
+            "private_key": account_info.private_key,
+            "status": "failed",
+            "attempts": attempt,
+            "error": error_msg,
+            "tx_hash": tx_hash if tx_hash else None
+        })
+        return None
+
+    def process_account(self, idx, account_info, total):
+        """处理单个账户的claim任务"""
+        if not self.check_balance(idx, account_info, total):
+            return account_info.address
+
+        # 同一地址各次尝试共享的状态（上一笔交易的费用和仍在交易池中的交易）
+        state = {}
+        decision = None
+        for attempt in range(1, self.retry_policy.max_attempts + 1):
+            if attempt > 1:
+                log.debug("[%s/%s] 🔄 第 %s 次重试...", idx, total, attempt)
+                time.sleep(self.retry_policy.backoff(attempt - 1, decision))
+
+            log.debug("[%s/%s] 🔄 执行 claim 操作...", idx, total)
+            success, tx_hash, error_msg = self.execute_claim(account_info, idx, total, attempt, state,
+                                                             replace=decision == REPLACE)
+
+            decision = self.handle_attempt(idx, account_info, total, attempt, success, tx_hash, error_msg)
+            if decision is None:
+                break
+
+        return account_info.address
+
+    async def async_execute_claim(self, aw3, account_info, idx, total, attempt=1, state=None, replace=False):
+        """
+        执行 claim 操作（异步版本，语义与 execute_claim 相同）
+
+        Returns:
+            (success, tx_hash, error_msg)
+        """
+        gas_cache = self.gas_cache
+        nonce_manager = self.nonce_manager
+        timer = self.metrics.timer
+        state = {} if state is None else state
+        # 上一笔交易可能仍在交易池中时必须沿用它的 nonce（否则新交易排在它后面），并提高费用替换
+        pending = state.get('pending')
+        replace = replace or pending is not None
+        nonce = None
+        sent = False
+        gas_key = None
+        tx_hash_hex = None
         try:
-            address = future.result()
-            thread_print(f"\n✅ 进度: {completed}/{len(accounts)} 已完成")
+            address = account_info.address
+
+            # 本地分配 nonce（启动时未同步成功的地址先查询一次）；替换交易时沿用被替换交易的 nonce
+            with timer('claim_phase_seconds', phase='nonce'):
+                if pending:
+                    nonce = pending['nonce']
+                else:
+                    if not nonce_manager.is_seeded(address):
+                        nonce_manager.seed(address, await aw3.eth.get_transaction_count(address, 'pending'))
+                    nonce = nonce_manager.allocate(address)
+            state.pop('pending', None)
+
+            # 获取 gas 费用（共享缓存，TTL 内不重复查询），替换交易时提高费用
+            with timer('claim_phase_seconds', phase='gas_price'):
+                fees = self.claim_fees(await self.fee_oracle.aget_fees(aw3), state, replace)
+            state['fees'] = fees
+
+            # 构建交易
+            transaction = self.build_claim_transaction(address, nonce, fees)
+
+            # 估算实际需要的 gas（相同调用复用采样结果）
+            gas_key = gas_cache.key_for(transaction)
+            cached_gas = gas_cache.lookup(gas_key)
+            if cached_gas is not None:
+                transaction['gas'] = cached_gas
+            else:
+                try:
+                    with timer('claim_phase_seconds', phase='estimate'):
+                        estimated_gas = await aw3.eth.estimate_gas(transaction)
+                    transaction['gas'] = gas_cache.add_sample(gas_key, estimated_gas)  # 增加 20% 作为缓冲
+                except Exception as e:
+                    gas_cache.discard(gas_key)
+                    log.warning(f"[{idx}/{total}] ⚠️  Gas 估算失败，使用默认值: {str(e)}")
+
+            # 签名并发送交易
+            with timer('claim_phase_seconds', phase='sign'):
+                signed_txn = await self.async_sign_claim(account_info, transaction)
+            tx_hashes = list(pending['tx_hashes']) if pending else []
+            try:
+                with timer('claim_phase_seconds', phase='send'):
+                    tx_hash = await self.async_send_claim(aw3, signed_txn)
+            except Exception as e:
+                if not pending or not is_nonce_error(e):
+                    raise
+                log.warning(f"[{idx}/{total}] ⚠️  替换交易被拒绝（{e}），继续等待原交易")
+            else:
+                sent = True
+                tx_hashes.append(tx_hash)
+                tx_hash_hex = tx_hash.hex()
+                log.debug("[%s/%s] 📤 交易已发送: %s/tx/%s", idx, total, EXPLORER_URL, tx_hash_hex,
+                          extra={'event': 'tx_sent', 'address': address, 'nonce': nonce, 'tx_hash': tx_hash_hex})
+            state['pending'] = {'nonce': nonce, 'tx_hashes': tx_hashes}
+
+            # 等待交易确认（由回执监听器统一查询，等待期间不占用事件循环；替换交易时任意一笔被打包即可）
+            log.debug("[%s/%s] ⏳ 等待交易确认...", idx, total)
+            with timer('claim_phase_seconds', phase='receipt'):
+                receipt = await self.receipt_watcher.async_wait_any(tx_hashes, timeout=self.receipt_timeout)
+            state.pop('pending', None)
+            return self.check_receipt(receipt, transaction, gas_key)
+
         except Exception as e:
-            thread_print(f"\n❌ 任务执行异常: {str(e)}")
-
-end_time = time.time()
-elapsed_time = end_time - start_time
-
-# 输出统计信息
-print("\n" + "=" * 70)
-print("📊 执行完成！统计信息：")
-print("=" * 70)
-print(f"✅ 成功: {success_count} 个")
-print(f"❌ 失败: {failed_count} 个")
-print(f"📝 总计: {len(accounts)} 个")
-print(f"⏱️  总耗时: {elapsed_time:.2f} 秒")
-print(f"🧵 使用线程数: {MAX_WORKERS}")
-if len(accounts) > 0:
-    print(f"⚡ 平均速度: {elapsed_time/len(accounts):.2f} 秒/个")
-
-# 保存结果到文件
-result_file = os.path.join(current_dir, 'claim_results.json')
-with open(result_file, 'w', encoding='utf-8') as f:
-    json.dump({
-        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-        "network": "OPN Testnet",
-        "chain_id": CHAIN_ID,
-        "contract": CONTRACT_ADDRESS,
-        "total": len(accounts),
-        "success": success_count,
-        "failed": failed_count,
-        "details": results
-    }, f, indent=2, ensure_ascii=False)
-
-print(f"\n💾 详细结果已保存到: {result_file}")
-print(f"🔍 区块浏览器: {EXPLORER_URL}")
+            if gas_key is not None and is_out_of_gas_error(e):
+                gas_cache.invalidate(gas_key)
+            if pending is not None:
+                # 沿用的 nonce 属于仍在交易池中的交易，不能归还，下一次尝试继续替换
+                state.setdefault('pending', pending)
+            elif nonce is not None and is_nonce_error(e):
+                # 异步模式下重新同步也走异步查询，避免阻塞事件循环
+                try:
+                    address = account_info.address
+                    nonce_manager.resync(address, await aw3.eth.get_transaction_count(address, 'pending'))
+                except Exception:
+                    pass
+            else:
+                self.settle_nonce(account_info.address, nonce, sent, e)
+            return False, tx_hash_hex, str(e)
+
+    async def async_process_account(self, aw3, idx, account_info, total):
+        """处理单个账户的claim任务（异步版本，重试和结果语义与 process_account 相同）"""
+        if not self.check_balance(idx, account_info, total):
+            return account_info.address
+
+        state = {}
+        decision = None
+        for attempt in range(1, self.retry_policy.max_attempts + 1):
+            if attempt > 1:
+                log.debug("[%s/%s] 🔄 第 %s 次重试...", idx, total, attempt)
+                await asyncio.sleep(self.retry_policy.backoff(attempt - 1, decision))
+
+            log.debug("[%s/%s] 🔄 执行 claim 操作...", idx, total)
+            success, tx_hash, error_msg = await self.async_execute_claim(aw3, account_info, idx, total, attempt,
+                                                                         state, replace=decision == REPLACE)
+
+            decision = self.handle_attempt(idx, account_info, total, attempt, success, tx_hash, error_msg)
+            if decision is None:
+                break
+
+        return account_info.address
+
+    def prepare_accounts(self, records):
+        """
+        准备一块钱包：跳过不属于本分片的地址、断点续跑时跳过已成功的地址，批量查询余额并同步 nonce
+
+        Returns:
+            可以开始处理的 WalletRecord 列表（balance 已填写）
+        """
+        if self.shard is not None:
+            before = len(records)
+            records = [record for record in records if in_shard(record.address, self.shard)]
+            self.executor.stats.inc('other_shard', before - len(records))
+        if self.completed_addresses:
+            before = len(records)
+            records = [record for record in records if record.address.lower() not in self.completed_addresses]
+            self.executor.stats.inc('skipped', before - len(records))
+        if not records:
+            return []
+
+        # 批量查询余额（Multicall3 getEthBalance，或每个 HTTP 请求包含 RPC_BATCH_SIZE 个 eth_getBalance 调用），
+        # 重试后仍然失败的地址记录为失败，不会从结果中消失
+        errors = self.load_balances(records)
+        ready = []
+        for record in records:
+            error = errors.get(record.index)
+            if error is None:
+                ready.append(record)
+                continue
+            log.warning(f"  [{record.index}] ❌ 余额查询失败: {str(error)}",
+                        extra={'event': 'load_failed', 'address': record.address})
+            self.record_result({
+                "address": record.address,
+                "private_key": record.private_key,
+                "status": "failed",
+                "attempts": 0,
+                "error": f"余额查询失败: {str(error)}"
+            })
+        self.executor.stats.inc('processed', len(errors))
+
+        if self.settings.get('SIMULATE', True):
+            ready = self.simulate_claims(ready)
+
+        self.nonce_manager.seed_many(fetch_pending_nonces(
+            self.rpc_url,
+            [record.address for record in ready],
+            batch_size=self.batch_size,
+            session=self.rpc_client
+        ))
+        return ready
+
+    def load_balances(self, records):
+        """
+        批量查询余额并填写 record.balance，查询失败的地址按重试策略退避后重新查询（整批失败时整批重试）
+
+        Returns:
+            {钱包编号: 最后一次查询的错误}，只包含重试后仍然失败的地址
+        """
+        errors = {}
+        pending = records
+        for attempt in range(1, self.retry_policy.max_attempts + 1):
+            if attempt > 1:
+                if self.executor.cancelled:
+                    break
+                delay = self.retry_policy.backoff(attempt - 1)
+                log.debug("🔄 %s 个地址余额查询失败，%.1f 秒后第 %s 次查询", len(pending), delay, attempt)
+                time.sleep(delay)
+
+            balances = self.reader.get_balances([record.address for record in pending])
+            failed = []
+            for record, (balance, error) in zip(pending, balances):
+                if error is None:
+                    record.balance = balance
+                    errors.pop(record.index, None)
+                else:
+                    errors[record.index] = error
+                    failed.append(record)
+            pending = failed
+            if not pending:
+                break
+        return errors
+
+    def simulate_claims(self, records):
+        """
+        批量预执行 claim（eth_call，from 为各钱包地址）
+
+        会 revert 的地址直接记录为失败（附带 revert 原因），不再发送交易；余额不足的地址留给 check_balance 处理，
+        无法判断结果（网络错误等）的地址照常发送
+
+        Returns:
+            需要发送交易的 WalletRecord 列表
+        """
+        min_balance = self.w3.to_wei(MIN_BALANCE, 'ether')
+        candidates = [record for record in records if record.balance >= min_balance]
+        if not candidates:
+            return records
+
+        outcomes = simulate_calls(
+            self.rpc_url,
+            [{'from': record.address, 'to': self.contract_address, 'data': CLAIM_DATA} for record in candidates],
+            batch_size=self.batch_size,
+            session=self.rpc_client,
+            timeout=self.settings['RPC_TIMEOUT']
+        )
+        reverted = {}
+        for record, (status, detail) in zip(candidates, outcomes):
+            self.metrics.inc('simulations_total', result=status)
+            if status == 'reverted':
+                reverted[record.index] = detail
+        if not reverted:
+            return records
+
+        for record in records:
+            reason = reverted.get(record.index)
+            if reason is None:
+                continue
+            log.info(f"  [{record.index}] ⏭️  预执行会 revert，不发送交易: {record.address}（{reason}）",
+                     extra={'event': 'simulated_revert', 'address': record.address, 'revert_reason': reason})
+            self.record_result({
+                "address": record.address,
+                "private_key": record.private_key,
+                "status": "failed",
+                "attempts": 0,
+                "error": f"模拟执行失败: {reason}",
+                "revert_reason": reason
+            })
+        stats = self.executor.stats
+        stats.inc('processed', len(reverted))
+        stats.inc('simulated_reverts', len(reverted))
+        return [record for record in records if record.index not in reverted]
+
+    def iter_ready_accounts(self):
+        """流式加载钱包，每 RPC_BATCH_SIZE 个为一块产出可以开始处理的账户"""
+        for records in iter_wallet_chunks(self.wallet_file, chunk_size=self.batch_size):
+            yield self.prepare_accounts(records)
+
+    def report_progress(self, account_info, result, error):
+        """统计已完成的任务（由 BatchExecutor 在提交任务的线程中调用，进度由实时进度行显示）"""
+        self.executor.stats.inc('processed')
+        if error is not None:
+            log.error(f"❌ 任务执行异常: {str(error)}", exc_info=error)
+
+    def run_thread_claims(self):
+        """使用线程池处理所有账户（边加载边提交，排队中的任务数有上限，自适应并发时上限随时调整）"""
+        self.executor.run(
+            lambda account_info: self.process_account(account_info.index, account_info, self.wallet_total),
+            self.iter_ready_accounts()
+        )
+
+    async def run_async_claims(self):
+        """使用 asyncio + AsyncWeb3 处理所有账户，单线程内保持大量 claim 同时进行"""
+        # 连接数单独限制，等待回执的 claim 不占用连接
+        session = create_aiohttp_session(
+            pool_size=self.pool_size,
+            keepalive=self.settings['RPC_KEEPALIVE'],
+            timeout=self.settings['RPC_TIMEOUT'],
+            stats=self.async_pool_stats,
+            metrics=self.metrics
+        )
+        async with session:
+            aw3 = await create_async_web3(self.rpc_url, session)
+
+            # 自适应并发时由 max_in_flight 控制同时进行的任务数，执行器的 workers 只作为上限；
+            # 钱包加载和余额查询是阻塞操作，由执行器放到线程中执行，边加载边创建任务
+            await self.executor.async_run(
+                lambda account_info: self.async_process_account(aw3, account_info.index, account_info,
+                                                                self.wallet_total),
+                self.iter_ready_accounts()
+            )
+
+    def run(self):
+        """
+        处理所有账户（尚未连接时先调用 connect()）
+
+        Returns:
+            是否执行完成（连接失败时返回 False）
+        """
+        if self.w3 is None and not self.connect():
+            return False
+
+        if self.limiter is not None:
+            print(f"🎚️  自适应并发: 初始 {self.limiter.limit}，范围 {self.limiter.min_limit}-{self.limiter.max_limit}")
+        elif self.claim_mode == 'async':
+            print(f"⚡ 异步模式，最大并发: {self.async_concurrency}")
+        else:
+            print(f"🧵 线程数: {self.max_workers}")
+        print("=" * 70)
+
+        # 签名进程在其他后台线程之前启动
+        if self.settings.get('SIGNER_WORKERS'):
+            self.signer = TransactionSigner(workers=self.settings['SIGNER_WORKERS'],
+                                            batch_size=self.settings['SIGNER_BATCH_SIZE'],
+                                            metrics=self.metrics).start()
+            print(f"✍️  签名进程: {self.signer.workers} 个，每批最多 {self.signer.batch_size} 笔")
+
+        # 批量发送交易（使用 batch 请求的连接，RPC 节点池时整批广播到多个节点）
+        if self.settings.get('SEND_BATCH_SIZE', 0) > 1:
+            self.broadcaster = TransactionBroadcaster(
+                self.rpc_url,
+                session=self.rpc_client,
+                batch_size=self.settings['SEND_BATCH_SIZE'],
+                max_delay=self.settings['SEND_BATCH_DELAY'],
+                timeout=self.settings['RPC_TIMEOUT']
+            )
+            print(f"📦 批量发送交易: 每批最多 {self.broadcaster.batch_size} 笔，"
+                  f"最多等待 {self.settings['SEND_BATCH_DELAY']} 秒")
+
+        print("\n🚀 开始批量处理账户...")
+        # 处理过程中的日志经队列输出，worker 不等待终端；进度行每秒刷新 4 次
+        log_pipeline = self.start_logging()
+        self.receipt_watcher.start()
+        show_progress = self.settings.get('PROGRESS', True) and (
+            log_pipeline.console.interactive or self.settings.get('STATS_INTERVAL', 0.0) > 0)
+        live_stats = LiveStats(self.format_stats_line, interval=PROGRESS_INTERVAL if show_progress else 0,
+                               printer=log_pipeline.progress).start()
+        start_time = self.started_at = time.time()
+        try:
+            # Ctrl+C：停止提交新任务，等待进行中的 claim 完成后照常输出统计和结果文件
+            with self.executor.handle_interrupt():
+                if self.claim_mode == 'async':
+                    asyncio.run(self.run_async_claims())
+                else:
+                    self.run_thread_claims()
+        finally:
+            self.elapsed_time = time.time() - start_time
+            live_stats.stop()
+            self.receipt_watcher.stop()
+            if self.signer is not None:
+                self.signer.close()
+            if self.broadcaster is not None:
+                self.broadcaster.close()
+            if self.rpc_pool is not None:
+                self.rpc_pool.close()
+            # 输出队列中剩余的日志和最终进度，之后的统计信息直接打印
+            if live_stats.interval > 0:
+                log_pipeline.progress(self.format_stats_line())
+            log_pipeline.stop()
+        if self.executor.cancelled:
+            print("\n⚠️  已中断：未开始的地址没有处理，可以使用 --resume 继续")
+        return True
+
+    def start_logging(self):
+        """启动队列日志（LOG_LEVEL、LOG_JSONL 的相对路径相对于 data_dir，分片执行时加上分片后缀）"""
+        jsonl_file = self.settings.get('LOG_JSONL')
+        return LogPipeline(
+            'opn_claim',
+            level=self.settings.get('LOG_LEVEL', 'info'),
+            jsonl_file=self.output_path(jsonl_file) if jsonl_file else None,
+            plain_interval=self.settings.get('STATS_INTERVAL', 0.0)
+        ).start()
+
+    def phase_summary(self):
+        """
+        各阶段耗时摘要
+
+        Returns:
+            [(阶段, Histogram)]，按 CLAIM_PHASES 顺序，跳过没有数据的阶段
+        """
+        phases = []
+        for phase in CLAIM_PHASES:
+            histogram = self.metrics.histogram('claim_phase_seconds', phase=phase)
+            if histogram is not None and histogram.count:
+                phases.append((phase, histogram))
+        return phases
+
+    def format_stats_line(self):
+        """实时统计行：进度、速度、RPC 调用数和各阶段 p50 耗时"""
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        done = self.success_count + self.failed_count
+        phases = ' '.join(f"{phase} {histogram.quantile(0.5):.3f}s" for phase, histogram in self.phase_summary())
+        # 分片执行时本分片的钱包数只能估算（按地址哈希平均分配）
+        total = self.wallet_total if self.shard is None else f"~{self.wallet_total // self.shard[1]}"
+        return (f"📈 {done}/{total} | ✅ {self.success_count} ❌ {self.failed_count} | "
+                f"{done / elapsed:.1f} 个/秒 | RPC {self.metrics.counter_total('rpc_calls_total')} 次 | "
+                f"{f'并发 {self.limiter.limit} | ' if self.limiter is not None else ''}p50 {phases or '-'}")
+
+    @property
+    def pool_stats(self):
+        return self.async_pool_stats if self.claim_mode == 'async' else self.rpc_session.pool_stats
+
+    def print_summary(self):
+        """输出统计信息"""
+        elapsed_time = self.elapsed_time
+        print("\n" + "=" * 70)
+        print("📊 执行完成！统计信息：")
+        print("=" * 70)
+        print(f"✅ 成功: {self.success_count} 个")
+        print(f"❌ 失败: {self.failed_count} 个")
+        print(f"📝 总计: {self.processed_count} 个")
+        if self.executor.cancelled:
+            print(f"⚠️  已中断: {self.executor.summary()}")
+        if self.shard is not None:
+            print(f"🧩 分片 {format_shard(self.shard)}：跳过属于其他分片的 {self.other_shard_count} 个地址")
+        if self.skipped_count > 0:
+            print(f"⏭️  断点续跑：跳过 {self.skipped_count} 个已成功的地址")
+        if self.simulated_reverts > 0:
+            print(f"🧪 预执行会 revert，未发送交易: {self.simulated_reverts} 个（原因见结果文件）")
+        print(f"⏱️  总耗时: {elapsed_time:.2f} 秒")
+        if self.limiter is not None:
+            print(f"🎚️  {self.limiter.summary()}")
+        elif self.claim_mode == 'async':
+            print(f"⚡ 异步模式最大并发: {self.async_concurrency}")
+        else:
+            print(f"🧵 使用线程数: {self.max_workers}")
+        if self.signer is not None:
+            print(f"✍️  {self.signer.summary()}")
+        if self.broadcaster is not None:
+            print(f"📦 {self.broadcaster.summary()}")
+        if self.reader is not None:
+            print(f"🧮 {self.reader.summary()}")
+        print(f"⛽ Gas 费用查询次数: {self.fee_oracle.refresh_count}")
+        print(f"⛽ Gas 估算: 缓存命中 {self.gas_cache.hits} 次，实际估算 {self.gas_cache.misses} 次")
+        print(f"🧾 回执查询: 区块轮询 {self.receipt_watcher.head_polls} 次，"
+              f"回执调用 {self.receipt_watcher.receipt_calls} 次")
+        pool_stats = self.pool_stats
+        print(f"🔌 {pool_stats.summary()}")
+        if pool_stats.saturated > 0:
+            print("⚠️  连接池出现饱和，可适当调大 RPC_POOL_SIZE")
+        if self.rpc_pool is not None:
+            print(f"🌐 RPC 节点池（切换节点 {self.rpc_pool.failovers} 次）：")
+            for line in self.rpc_pool.summary_lines():
+                print(f"   {line}")
+        if self.processed_count > 0:
+            print(f"⚡ 平均速度: {elapsed_time/self.processed_count:.2f} 秒/个")
+
+        phases = self.phase_summary()
+        if phases:
+            print("\n⏱️  各阶段耗时（秒）：")
+            print(f"   {'phase':<12}{'count':>8}{'mean':>10}{'p50':>10}{'p90':>10}{'p99':>10}{'total':>12}")
+            for phase, histogram in phases:
+                print(f"   {phase:<12}{histogram.count:>8}{histogram.mean:>10.3f}{histogram.quantile(0.5):>10.3f}"
+                      f"{histogram.quantile(0.9):>10.3f}{histogram.quantile(0.99):>10.3f}{histogram.sum:>12.2f}")
+
+        rpc_calls = self.metrics.by_label('rpc_calls_total', 'method')
+        if rpc_calls:
+            print(f"\n📡 RPC 调用 {sum(rpc_calls.values())} 次：")
+            rpc_latency = self.metrics.by_label('rpc_request_seconds', 'method')
+            for method, count in sorted(rpc_calls.items(), key=lambda item: -item[1]):
+                latency = rpc_latency.get(method)
+                latency_text = f"，p50 {latency.quantile(0.5):.3f}s，p99 {latency.quantile(0.99):.3f}s" if latency else ''
+                print(f"   {method}: {count} 次{latency_text}")
+            batch_latency = rpc_latency.get('batch')
+            if batch_latency:
+                print(f"   （batch 请求 {batch_latency.count} 次，p50 {batch_latency.quantile(0.5):.3f}s，"
+                      f"p99 {batch_latency.quantile(0.99):.3f}s）")
+
+        retries = self.metrics.by_label('retries_total', 'error')
+        if retries:
+            print("🔄 重试原因: " + "，".join(f"{error} {count} 次" for error, count in sorted(retries.items())))
+        failures = self.metrics.by_label('failures_total', 'error')
+        if failures:
+            print("❌ 失败原因: " + "，".join(f"{error} {count} 次" for error, count in sorted(failures.items())))
+
+    def export_metrics(self):
+        """按 METRICS_FILE / METRICS_JSON 配置导出指标（路径为相对路径时相对于 data_dir，分片执行时加上分片后缀）"""
+        exported = []
+        for key, writer in (('METRICS_FILE', self.metrics.write_prometheus), ('METRICS_JSON', self.metrics.write_json)):
+            path = self.settings.get(key)
+            if not path:
+                continue
+            path = writer(self.output_path(path))
+            print(f"📈 指标已导出到: {path}")
+            exported.append(path)
+        return exported
+
+    def write_report(self, result_file=None):
+        """从账本生成结果文件（断点续跑时包含之前运行的结果），并关闭账本"""
+        details = self.ledger.report_entries()
+        self.ledger.close()
+
+        result_file = result_file or self.output_path(RESULT_FILE)
+        extra = {"shard": format_shard(self.shard)} if self.shard is not None else {}
+        write_results(result_file, details, **extra)
+
+        print(f"\n💾 详细结果已保存到: {result_file}")
+        print(f"🗃️  执行记录账本: {self.ledger.db_path}（运行 ID: {self.ledger.run_id}）")
+        return result_file
+
+
+def write_results(result_file, details, **extra):
+    """写出结果文件（extra 为附加字段，例如分片信息）"""
+    report_success = sum(1 for entry in details if entry['status'] == 'success')
+    with open(result_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "network": "OPN Testnet",
+            "chain_id": CHAIN_ID,
+            "contract": CONTRACT_ADDRESS,
+            **extra,
+            "total": len(details),
+            "success": report_success,
+            "failed": len(details) - report_success,
+            "details": details
+        }, f, indent=2, ensure_ascii=False)
+    return result_file
+
+
+def merge_shard_results(count, data_dir=current_dir, result_file=None):
+    """
+    合并 count 个分片的结果文件（claim_results.shard-i-of-N.json）为一个结果文件
+
+    多台机器分片执行时，把各机器上的分片结果文件复制到 data_dir 后调用
+
+    Returns:
+        合并后的结果文件路径
+
+    Raises:
+        FileNotFoundError: 缺少分片结果文件
+        ValueError: 分片结果不一致（见 merge_reports）
+    """
+    result_file = result_file or os.path.join(data_dir, RESULT_FILE)
+    paths = [(shard, shard_path(result_file, shard)) for shard in ((i, count) for i in range(1, count + 1))]
+    missing = [path for _, path in paths if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError("缺少分片结果文件: " + ", ".join(os.path.basename(path) for path in missing))
+
+    reports = []
+    for shard, path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            reports.append((shard, json.load(f)))
+    merged = merge_reports(reports)
+    write_results(result_file, merged['details'], shards=merged['shards'])
+
+    print(f"\n🧩 已合并 {count} 个分片的结果：")
+    for shard in merged['shards']:
+        print(f"   分片 {shard['shard']}: ✅ {shard['success']} ❌ {shard['failed']}（{shard['timestamp']}）")
+    success = sum(shard['success'] for shard in merged['shards'])
+    print(f"📝 总计: {len(merged['details'])} 个，成功 {success} 个，失败 {len(merged['details']) - success} 个")
+    print(f"💾 合并结果已保存到: {result_file}")
+    return result_file
+
+
+def run_sharded(count, resume=False, data_dir=current_dir):
+    """
+    在本机启动 count 个进程分片执行（每个进程执行 opn-claim.py --shard i/N），全部结束后合并结果
+
+    Returns:
+        退出码
+    """
+    if count < 1:
+        print(f"❌ 分片数至少为 1: {count}")
+        return 1
+    # 先建立地址索引，各分片进程直接读取地址，不再各自计算全部钱包的地址
+    ensure_address_index(find_wallet_file(data_dir))
+
+    print(f"\n🧩 分片执行: {count} 个进程，按地址哈希分配钱包")
+    script = os.path.abspath(__file__)
+    results = run_shards(
+        lambda shard: [sys.executable, script, '--shard', format_shard(shard)] + (['--resume'] if resume else []),
+        count,
+        log_dir=data_dir,
+        name='claim'
+    )
+    failed = [(shard, log_file) for shard, code, log_file in results if code != 0]
+    if failed:
+        for shard, log_file in failed:
+            print(f"❌ 分片 {format_shard(shard)} 执行失败，详见: {log_file}")
+        print("⚠️  修复后可以对失败的分片单独执行 --shard i/N --resume，再执行 --merge N 合并结果")
+        return 1
+
+    try:
+        merge_shard_results(count, data_dir)
+    except (OSError, ValueError) as e:
+        print(f"❌ 合并结果失败: {str(e)}")
+        return 1
+    print(f"🔍 区块浏览器: {EXPLORER_URL}")
+    return 0
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description="OPN 测试网 Claim 操作脚本")
+    parser.add_argument('--resume', action='store_true', help='跳过账本中已成功的地址，继续上次未完成的任务')
+    sharding = parser.add_mutually_exclusive_group()
+    sharding.add_argument('--shard', metavar='i/N',
+                          help='只处理按地址哈希属于第 i 片（共 N 片）的钱包，结果写入 claim_results.shard-i-of-N.json')
+    sharding.add_argument('--shards', type=int, metavar='N', help='在本机启动 N 个进程分片执行，完成后合并结果')
+    sharding.add_argument('--merge', type=int, metavar='N',
+                          help='只合并 N 个分片的结果文件到 claim_results.json（多台机器分片执行后使用）')
+    args = parser.parse_args(argv)
+
+    if args.shards is not None:
+        return run_sharded(args.shards, resume=args.resume)
+    if args.merge is not None:
+        try:
+            merge_shard_results(args.merge)
+        except (OSError, ValueError) as e:
+            print(f"❌ 合并结果失败: {str(e)}")
+            return 1
+        return 0
+
+    try:
+        shard = parse_shard(args.shard) if args.shard else None
+        runner = ClaimRunner(load_settings(current_dir), resume=args.resume, shard=shard)
+    except ValueError as e:
+        print(f"❌ {str(e)}")
+        return 1
+
+    if not runner.run():
+        return 1
+
+    runner.print_summary()
+    runner.export_metrics()
+    runner.write_report()
+    print(f"🔍 区块浏览器: {EXPLORER_URL}")
+    return 0
+
 
+if __name__ == "__main__":
+    raise SystemExit(main())
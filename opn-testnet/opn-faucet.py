@@ -1,73 +1,96 @@
+"""
+OPN 测试网水龙头领取脚本
+
+导入本模块没有副作用（不读取配置和钱包），由 main() 开始执行
+"""
+
 from common.config_loader import ConfigLoader
+from common.wallet_store import find_wallet_file, count_wallets, iter_wallet_chunks
+from common.ledger import RunLedger
+from common.retry import RetryPolicy, RETRY, FATAL
+from common.batch_executor import BatchExecutor
+from common.log_pipeline import LogPipeline
+from common.metrics import LiveStats, classify_error
 import os
+import argparse
 import requests  # pyright: ignore[reportMissingModuleSource]
 import json
 import time
-import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from pynocaptcha import ReCaptchaUniversalCracker, ReCaptchaEnterpriseCracker, ReCaptchaSteamCracker  # pyright: ignore[reportMissingImports]
-from eth_account import Account  # pyright: ignore[reportMissingImports]
+import logging
 
 # 指定当前项目目录
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
-config = ConfigLoader(current_dir)\
-            .load_env(keys=['USER_TOKEN', 'PROXY_API', 'MAX_WORKERS'])
+# 配置（由 main() 从 .env 读取）
+USER_TOKEN = None
+PROXY_API = None
+MAX_WORKERS = 5  # 默认5个线程
 
-USER_TOKEN = config.get('USER_TOKEN')
-PROXY_API = config.get('PROXY_API')
-MAX_WORKERS = int(config.get('MAX_WORKERS', 5))  # 默认5个线程
 
-# 读取私钥列表
-wallet_file = os.path.join(current_dir, 'wallet.json')
-with open(wallet_file, 'r', encoding='utf-8') as f:
-    private_keys = json.load(f)
+class FaucetError(Exception):
+    """水龙头接口返回非 200 响应"""
+
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code}: {response.text}")
+        self.status_code = response.status_code
+        self.text = response.text
 
-# 将私钥转换为钱包地址
-wallet_addresses = []
-print("🔐 开始转换私钥为地址...")
-for idx, private_key in enumerate(private_keys, 1):
-    try:
-        # 确保私钥格式正确（添加 0x 前缀如果没有的话）
-        if not private_key.startswith('0x'):
-            private_key = '0x' + private_key
-        
-        # 从私钥生成账户
-        account = Account.from_key(private_key)
-        wallet_addresses.append({
-            'private_key': private_key,
-            'address': account.address
-        })
-        print(f"  [{idx}] {account.address}")
-    except Exception as e:
-        print(f"  [{idx}] ❌ 私钥转换失败: {str(e)}")
-        continue
 
-print(f"\n📋 成功转换 {len(wallet_addresses)} 个钱包地址")
-print(f"🧵 线程数: {MAX_WORKERS}")
-print("=" * 60)
+def classify_faucet_error(error):
+    """
+    水龙头错误分类：接口响应按状态码和内容分类，其他异常（网络错误、超时等）按 metrics.classify_error 分类
 
-# 统计信息
-success_count = 0
-failed_count = 0
-already_claimed_count = 0
-results = []
+    - already_claimed：该地址最近已经领取过
+    - bad_request：请求格式错误（400 / 422），重试也不会成功
+    - captcha：验证码无效（每次重试会重新获取验证码）
+    - rate_limited：限流（429）
+    - client_error：其他 4xx（例如代理 IP 被拒绝的 403，每次重试会更换代理）
+    - server_error：服务端错误（5xx）
+    """
+    if isinstance(error, FaucetError):
+        text = error.text.lower()
+        if 'already claimed' in text:
+            return 'already_claimed'
+        # 验证码无效的响应也可能是 400，先按内容判断
+        if 'captcha' in text:
+            return 'captcha'
+        if error.status_code in (400, 422):
+            return 'bad_request'
+        if error.status_code == 429:
+            return 'rate_limited'
+        if 400 <= error.status_code < 500 and error.status_code != 408:
+            return 'client_error'
+        return 'server_error'
+    return classify_error(error)
 
-# 线程锁，用于保护共享变量
-stats_lock = threading.Lock()
-results_lock = threading.Lock()
-print_lock = threading.Lock()
 
-def thread_print(msg):
-    """线程安全的打印函数"""
-    with print_lock:
-        print(msg)
+# 重试策略：最多 3 次，重试前按指数退避加随机抖动等待（2 秒起），避免所有线程同时重试；
+# 每次重试会重新获取验证码和代理，验证码无效、403 等也可以重试；只有已领取过和请求格式错误（400 / 422）不重试
+retry_policy = RetryPolicy(
+    max_attempts=3,
+    base_delay=2.0,
+    max_delay=30.0,
+    classifier=classify_faucet_error,
+    decisions={'already_claimed': FATAL, 'bad_request': FATAL, 'captcha': RETRY, 'client_error': RETRY,
+               'server_error': RETRY}
+)
+
+# 执行记录账本和批量任务执行器（由 main() 创建）
+ledger = None
+executor = None
+wallet_total = 0
+
+# 处理过程中的日志（经队列由单独的线程输出，worker 不等待终端）
+log = logging.getLogger('opn_faucet')
+
+# 实时进度行的刷新间隔（秒）
+PROGRESS_INTERVAL = 0.25
 
 def get_proxy_ip(silent=False):
     """从API获取代理IP"""
     if not PROXY_API:
         if not silent:
-            thread_print("⚠️ 未配置 PROXY_API，将不使用代理")
+            log.warning("⚠️ 未配置 PROXY_API，将不使用代理")
         return None
     
     try:
@@ -75,7 +98,7 @@ def get_proxy_ip(silent=False):
         if response.status_code == 200:
             proxy_str = response.text.strip()
             if not silent:
-                thread_print(f"🌐 获取到代理IP: {proxy_str}")
+                log.info(f"🌐 获取到代理IP: {proxy_str}")
             # 返回格式: 38.55.17.118:54055
             return {
                 'http': f'http://{proxy_str}',
@@ -83,15 +106,17 @@ def get_proxy_ip(silent=False):
             }
         else:
             if not silent:
-                thread_print(f"⚠️ 获取代理IP失败，状态码: {response.status_code}")
+                log.warning(f"⚠️ 获取代理IP失败，状态码: {response.status_code}")
             return None
     except Exception as e:
         if not silent:
-            thread_print(f"⚠️ 获取代理IP异常: {str(e)}")
+            log.warning(f"⚠️ 获取代理IP异常: {str(e)}")
         return None
 
 def get_captcha_token():
     """获取验证码token"""
+    from pynocaptcha import ReCaptchaUniversalCracker  # pyright: ignore[reportMissingImports]
+    
     cracker = ReCaptchaUniversalCracker(
         user_token=USER_TOKEN,
         sitekey="6Ld1uvorAAAAAKwGWoEHDYIq_yo3dSvshmNQ9ykF",
@@ -131,162 +156,237 @@ def claim_faucet(wallet_address, captcha_token, proxies=None):
     return response
 
 def process_wallet(idx, wallet_info, total):
-    """处理单个钱包的领取任务"""
-    global success_count, failed_count, already_claimed_count
-    
-    wallet_address = wallet_info['address']
-    thread_print(f"\n[{idx}/{total}] 🚀 开始处理: {wallet_address}")
+    """处理单个钱包的领取任务（统计计入当前线程的计数器，不需要加锁）"""
+    stats = executor.stats
     
-    max_retries = 3
-    claim_success = False
+    wallet_address = wallet_info.address
+    log.debug("[%s/%s] 🚀 开始处理: %s", idx, total, wallet_address)
     
-    for attempt in range(1, max_retries + 1):
+    decision = None
+    for attempt in range(1, retry_policy.max_attempts + 1):
+        if attempt > 1:
+            log.debug("[%s/%s] 🔄 第 %s 次重试...", idx, total, attempt)
+            time.sleep(retry_policy.backoff(attempt - 1, decision))  # 重试前按指数退避等待
+
         try:
-            if attempt > 1:
-                thread_print(f"[{idx}/{total}] 🔄 第 {attempt} 次重试...")
-                time.sleep(2)  # 重试前等待2秒
-            
             # 获取代理IP
-            thread_print(f"[{idx}/{total}] 🔄 获取代理IP...")
+            log.debug("[%s/%s] 🔄 获取代理IP...", idx, total)
             proxies = get_proxy_ip(silent=True)
             if proxies:
-                thread_print(f"[{idx}/{total}] ✅ 代理IP设置成功")
+                log.debug("[%s/%s] ✅ 代理IP设置成功", idx, total)
             else:
-                thread_print(f"[{idx}/{total}] ⚠️  将直接连接")
+                log.debug("[%s/%s] ⚠️  将直接连接", idx, total)
             
             # 获取验证码
-            thread_print(f"[{idx}/{total}] 🔄 获取验证码...")
+            log.debug("[%s/%s] 🔄 获取验证码...", idx, total)
             captcha_token = get_captcha_token()
-            thread_print(f"[{idx}/{total}] ✅ 验证码获取成功")
+            log.debug("[%s/%s] ✅ 验证码获取成功", idx, total)
             
             # 领取水龙头
-            thread_print(f"[{idx}/{total}] 🔄 发送领取请求...")
+            log.debug("[%s/%s] 🔄 发送领取请求...", idx, total)
             response = claim_faucet(wallet_address, captcha_token, proxies)
             
-            thread_print(f"[{idx}/{total}] 📊 响应状态码: {response.status_code}")
+            log.debug("[%s/%s] 📊 响应状态码: %s", idx, total, response.status_code)
             
             if response.status_code == 200:
                 result = response.json()
-                thread_print(f"[{idx}/{total}] ✅ 领取成功! {wallet_address}")
+                log.info(f"[{idx}/{total}] ✅ 领取成功! {wallet_address}",
+                         extra={'event': 'faucet_success', 'address': wallet_address, 'attempts': attempt})
                 
-                with stats_lock:
-                    success_count += 1
-                with results_lock:
-                    results.append({
-                        "address": wallet_address,
-                        "private_key": wallet_info['private_key'],
-                        "status": "success",
-                        "attempts": attempt,
-                        "response": result
-                    })
-                claim_success = True
+                stats.inc('success')
+                ledger.record({
+                    "address": wallet_address,
+                    "private_key": wallet_info.private_key,
+                    "status": "success",
+                    "attempts": attempt,
+                    "response": result
+                })
                 break  # 成功后跳出重试循环
-            else:
-                thread_print(f"[{idx}/{total}] ❌ 领取失败! 状态码: {response.status_code}")
-                thread_print(f"[{idx}/{total}] 📝 响应内容: {response.text}")
-                
-                # 检查是否是已经领取过的错误
-                if "This address has already claimed recently" in response.text:
-                    thread_print(f"[{idx}/{total}] ⏭️  该地址最近已经领取过，跳过重试")
-                    
-                    with stats_lock:
-                        already_claimed_count += 1
-                    with results_lock:
-                        results.append({
-                            "address": wallet_address,
-                            "private_key": wallet_info['private_key'],
-                            "status": "already_claimed",
-                            "attempts": attempt,
-                            "response": response.text
-                        })
-                    claim_success = True  # 标记为已处理，跳出重试循环
-                    break
-                
-                # 如果还有重试机会，不记录失败
-                if attempt < max_retries:
-                    thread_print(f"[{idx}/{total}] ⏳ 将重试...")
-                else:
-                    thread_print(f"[{idx}/{total}] ❌ 已达到最大重试次数，放弃该地址")
-                    
-                    with stats_lock:
-                        failed_count += 1
-                    with results_lock:
-                        results.append({
-                            "address": wallet_address,
-                            "private_key": wallet_info['private_key'],
-                            "status": "failed",
-                            "attempts": attempt,
-                            "response": response.text
-                        })
-                
+
+            log.warning(f"[{idx}/{total}] ❌ 领取失败! 状态码: {response.status_code}")
+            log.warning(f"[{idx}/{total}] 📝 响应内容: {response.text}")
+            error = FaucetError(response)
         except Exception as e:
-            thread_print(f"[{idx}/{total}] ❌ 请求异常: {str(e)}")
+            log.warning(f"[{idx}/{total}] ❌ 请求异常: {str(e)}")
+            error = e
+
+        # 按错误类型决定是否重试（已领取过、验证码无效、4xx 不重试）
+        decision, error_class = retry_policy.classify(error)
+        if error_class == 'already_claimed':
+            log.info(f"[{idx}/{total}] ⏭️  该地址最近已经领取过，跳过重试: {wallet_address}",
+                     extra={'event': 'faucet_already_claimed', 'address': wallet_address})
             
-            # 如果还有重试机会，不记录失败
-            if attempt < max_retries:
-                thread_print(f"[{idx}/{total}] ⏳ 将重试...")
-            else:
-                thread_print(f"[{idx}/{total}] ❌ 已达到最大重试次数，放弃该地址")
-                
-                with stats_lock:
-                    failed_count += 1
-                with results_lock:
-                    results.append({
-                        "address": wallet_address,
-                        "private_key": wallet_info['private_key'],
-                        "status": "error",
-                        "attempts": attempt,
-                        "error": str(e)
-                    })
+            stats.inc('already_claimed')
+            ledger.record({
+                "address": wallet_address,
+                "private_key": wallet_info.private_key,
+                "status": "already_claimed",
+                "attempts": attempt,
+                "response": error.text
+            })
+            break
+
+        # 如果还有重试机会，不记录失败
+        if retry_policy.should_retry(attempt, decision):
+            log.debug("[%s/%s] ⏳ 将重试（%s）...", idx, total, error_class)
+            continue
+
+        reason = "错误无法通过重试解决" if decision == FATAL else "已达到最大重试次数"
+        log.error(f"[{idx}/{total}] ❌ {reason}，放弃该地址: {wallet_address}（{error_class}）",
+                  extra={'event': 'faucet_failed', 'address': wallet_address, 'attempts': attempt,
+                         'error_class': error_class, 'error': str(error)})
+        
+        stats.inc('failed')
+        if isinstance(error, FaucetError):
+            ledger.record({
+                "address": wallet_address,
+                "private_key": wallet_info.private_key,
+                "status": "failed",
+                "attempts": attempt,
+                "response": error.text
+            })
+        else:
+            ledger.record({
+                "address": wallet_address,
+                "private_key": wallet_info.private_key,
+                "status": "error",
+                "attempts": attempt,
+                "error": str(error)
+            })
+        break
     
     return wallet_address
 
-# 使用线程池处理所有钱包
-print("\n🚀 开始批量处理钱包...")
-start_time = time.time()
+def report_progress(wallet_info, result, error):
+    """统计已完成的任务（由 BatchExecutor 在主线程中调用，进度由实时进度行显示）"""
+    executor.stats.inc('processed')
+    if error is not None:
+        log.error(f"❌ 任务执行异常: {str(error)}", exc_info=error)
 
-with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-    # 提交所有任务
-    futures = {
-        executor.submit(process_wallet, idx, wallet_info, len(wallet_addresses)): (idx, wallet_info) 
-        for idx, wallet_info in enumerate(wallet_addresses, 1)
-    }
+
+def format_progress_line(started_at):
+    """实时进度行：进度、各状态数量和速度"""
+    totals = executor.totals()
+    done = totals['processed']
+    elapsed = max(time.time() - started_at, 1e-9)
+    return (f"📈 {done}/{wallet_total} | ✅ {totals['success']} ⏭️  {totals['already_claimed']} "
+            f"❌ {totals['failed']} | {done / elapsed:.2f} 个/秒")
+
+
+def iter_pending_wallets(wallet_file, completed_addresses):
+    """按块加载钱包，断点续跑时跳过已完成的地址"""
+    for records in iter_wallet_chunks(wallet_file):
+        pending = [record for record in records if record.address.lower() not in completed_addresses]
+        if len(pending) < len(records):
+            executor.stats.inc('skipped', len(records) - len(pending))
+        yield pending
+
+
+def main(argv=None):
+    """主函数"""
+    global USER_TOKEN, PROXY_API, MAX_WORKERS, ledger, executor, wallet_total
     
-    # 等待所有任务完成
-    completed = 0
-    for future in as_completed(futures):
-        completed += 1
-        try:
-            wallet_address = future.result()
-            thread_print(f"\n✅ 进度: {completed}/{len(wallet_addresses)} 已完成")
-        except Exception as e:
-            thread_print(f"\n❌ 任务执行异常: {str(e)}")
-
-end_time = time.time()
-elapsed_time = end_time - start_time
-
-# 输出统计信息
-print("\n" + "=" * 60)
-print("📊 执行完成！统计信息：")
-print("=" * 60)
-print(f"✅ 成功: {success_count} 个")
-print(f"⏭️  已领取过: {already_claimed_count} 个")
-print(f"❌ 失败: {failed_count} 个")
-print(f"📝 总计: {len(wallet_addresses)} 个")
-print(f"⏱️  总耗时: {elapsed_time:.2f} 秒")
-print(f"🧵 使用线程数: {MAX_WORKERS}")
-print(f"⚡ 平均速度: {elapsed_time/len(wallet_addresses):.2f} 秒/个")
-
-# 保存结果到文件
-result_file = os.path.join(current_dir, 'claim_results.json')
-with open(result_file, 'w', encoding='utf-8') as f:
-    json.dump({
-        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-        "total": len(wallet_addresses),
-        "success": success_count,
-        "already_claimed": already_claimed_count,
-        "failed": failed_count,
-        "details": results
-    }, f, indent=2, ensure_ascii=False)
-
-print(f"\n💾 详细结果已保存到: {result_file}")
+    # 命令行参数
+    parser = argparse.ArgumentParser(description="OPN 测试网水龙头领取脚本")
+    parser.add_argument('--resume', action='store_true', help='跳过账本中已领取成功的地址，继续上次未完成的任务')
+    args = parser.parse_args(argv)
+    
+    config = ConfigLoader(current_dir)\
+                .load_env(keys=['USER_TOKEN', 'PROXY_API', 'MAX_WORKERS', 'LOG_LEVEL', 'LOG_JSONL', 'PROGRESS',
+                                'STATS_INTERVAL'])
+    
+    USER_TOKEN = config.get('USER_TOKEN')
+    PROXY_API = config.get('PROXY_API')
+    MAX_WORKERS = config.get_int('MAX_WORKERS', 5)  # 默认5个线程
+    
+    # 钱包文件（支持私钥数组、HD 钱包描述和二进制 wallet.bin），流式加载，地址优先从索引缓存读取
+    wallet_file = find_wallet_file(current_dir)
+    wallet_total = count_wallets(wallet_file)
+    print(f"🔐 钱包文件: {os.path.basename(wallet_file)}（共 {wallet_total} 个，边加载边处理）")
+    
+    # 执行记录账本：每个结果实时写入，断点续跑时跳过已成功或已领取过的地址
+    ledger = RunLedger(os.path.join(current_dir, 'faucet_ledger.db'), resume=args.resume)
+    completed_addresses = ledger.completed_addresses(statuses=('success', 'already_claimed')) if args.resume else set()
+    print(f"🧵 线程数: {MAX_WORKERS}")
+    print("=" * 60)
+    
+    # 使用线程池处理所有钱包
+    print("\n🚀 开始批量处理钱包...")
+    start_time = time.time()
+    
+    # 处理过程中的日志经队列输出（LOG_LEVEL: debug / info / warning / error，LOG_JSONL: 结构化日志路径）
+    jsonl_file = config.get_str('LOG_JSONL')
+    log_pipeline = LogPipeline(
+        'opn_faucet',
+        level=config.get_str('LOG_LEVEL', 'info', lower=True),
+        jsonl_file=os.path.join(current_dir, jsonl_file) if jsonl_file else None,
+        plain_interval=config.get_float('STATS_INTERVAL', 0.0)
+    ).start()
+    show_progress = config.get_bool('PROGRESS', True) and (
+        log_pipeline.console.interactive or log_pipeline.plain_interval > 0)
+    live_stats = LiveStats(lambda: format_progress_line(start_time), interval=PROGRESS_INTERVAL if show_progress else 0,
+                           printer=log_pipeline.progress)
+
+    # 边加载边提交任务，排队中的任务数有上限；Ctrl+C 时停止提交新任务，等待进行中的任务完成后照常输出结果
+    executor = BatchExecutor(workers=MAX_WORKERS, max_pending=MAX_WORKERS * 4, on_done=report_progress,
+                             name='faucet')
+    live_stats.start()
+    try:
+        with executor.handle_interrupt():
+            totals = executor.run(
+                lambda wallet_info: process_wallet(wallet_info.index, wallet_info, wallet_total),
+                iter_pending_wallets(wallet_file, completed_addresses)
+            )
+    finally:
+        live_stats.stop()
+        if show_progress:
+            log_pipeline.progress(format_progress_line(start_time))
+        log_pipeline.stop()
+    if executor.cancelled:
+        print("\n⚠️  已中断：未开始的地址没有处理，可以使用 --resume 继续")
+
+    end_time = time.time()
+    elapsed_time = end_time - start_time
+    processed_count = totals['processed']
+    skipped_count = totals['skipped']
+
+    # 输出统计信息
+    print("\n" + "=" * 60)
+    print("📊 执行完成！统计信息：")
+    print("=" * 60)
+    print(f"✅ 成功: {totals['success']} 个")
+    print(f"⏭️  已领取过: {totals['already_claimed']} 个")
+    print(f"❌ 失败: {totals['failed']} 个")
+    print(f"📝 总计: {processed_count} 个")
+    if executor.cancelled:
+        print(f"⚠️  已中断: {executor.summary()}")
+    if skipped_count > 0:
+        print(f"⏭️  断点续跑：跳过 {skipped_count} 个已完成的地址")
+    print(f"⏱️  总耗时: {elapsed_time:.2f} 秒")
+    print(f"🧵 使用线程数: {MAX_WORKERS}")
+    if processed_count > 0:
+        print(f"⚡ 平均速度: {elapsed_time/processed_count:.2f} 秒/个")
+
+    # 从账本生成结果文件（断点续跑时包含之前运行的结果）
+    details = ledger.report_entries()
+    ledger.close()
+    report_success = sum(1 for entry in details if entry['status'] == 'success')
+    report_already_claimed = sum(1 for entry in details if entry['status'] == 'already_claimed')
+
+    result_file = os.path.join(current_dir, 'claim_results.json')
+    with open(result_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "total": len(details),
+            "success": report_success,
+            "already_claimed": report_already_claimed,
+            "failed": len(details) - report_success - report_already_claimed,
+            "details": details
+        }, f, indent=2, ensure_ascii=False)
+
+    print(f"\n💾 详细结果已保存到: {result_file}")
+    print(f"🗃️  执行记录账本: {ledger.db_path}（运行 ID: {ledger.run_id}）")
+
+
+if __name__ == "__main__":
+    main()
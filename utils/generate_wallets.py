@@ -5,104 +5,329 @@
 - 批量生成指定数量的 EVM 钱包
 - 保存私钥到 JSON 文件（wallet.json 格式）
 - 显示对应的地址信息
+- 命令行模式：多进程并行生成，分块流式写入文件，显示进度和生成速度
+- HD 钱包模式：只保存助记词 + 派生路径范围，地址按需派生
+- 二进制模式：每个钱包保存为 32 字节私钥 + 20 字节地址（wallet.bin），加载时无需解析和计算地址
 """
 
+import sys
 import json
 import os
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from eth_account import Account  # pyright: ignore[reportMissingImports]
 
-def generate_wallets(count=10, output_file="wallet.json"):
+# --hd / --binary / --convert 使用仓库根目录下的 common 模块（按 README 在 utils 目录中运行时也能导入）
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class JsonArrayWriter:
+    """流式写出 JSON 数组（每个元素一行），不需要在内存中保留全部元素"""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = open(path, 'w', encoding='utf-8')
+        self._file.write('[')
+
+    def write(self, item):
+        self._file.write(',\n  ' if self.count else '\n  ')
+        self._file.write(json.dumps(item, ensure_ascii=False))
+        self.count += 1
+
+    def close(self):
+        self._file.write('\n]\n' if self.count else ']\n')
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _generate_chunk(count):
+    """生成一批钱包（在子进程中执行），返回 [(address, private_key), ...]"""
+    chunk = []
+    for _ in range(count):
+        account = Account.create()
+        chunk.append((account.address, account.key.hex()))
+    return chunk
+
+
+def iter_wallet_chunks(count, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    按顺序逐块产出生成的钱包
+
+    workers > 1 时使用进程池并行生成，同时最多有 workers * 2 个分块在进行中
+    """
+    sizes = [chunk_size] * (count // chunk_size)
+    if count % chunk_size:
+        sizes.append(count % chunk_size)
+
+    if workers <= 1:
+        for size in sizes:
+            yield _generate_chunk(size)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for size in sizes:
+            pending.append(executor.submit(_generate_chunk, size))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def detail_path(output_file):
+    """
+    详细信息文件路径
+
+    wallet.json → wallet_detail.json；其他扩展名保留完整文件名（wallet.bin → wallet.bin_detail.json），
+    避免覆盖同目录下 wallet.json 的详细信息文件
+    """
+    root, ext = os.path.splitext(output_file)
+    if ext.lower() == '.json':
+        return root + '_detail.json'
+    return output_file + '_detail.json'
+
+
+def generate_wallets(count=10, output_file="wallet.json", workers=1, chunk_size=DEFAULT_CHUNK_SIZE, verbose=True,
+                     mnemonic=None, base_path=None, start=0, passphrase="", binary=False):
     """
     生成指定数量的 EVM 钱包
-    
+
     Args:
         count: 要生成的钱包数量
         output_file: 输出文件路径
+        workers: 并行生成的进程数
+        chunk_size: 每个分块的钱包数量（分块生成、分块写入）
+        verbose: 是否逐个打印生成的地址和私钥；为 False 时只显示进度
+        mnemonic: HD 钱包助记词；指定后 output_file 只保存助记词和派生路径范围
+        base_path: HD 钱包父路径，默认 m/44'/60'/0'/0
+        start: HD 钱包起始索引
+        passphrase: BIP-39 密码（可选）
+        binary: 以二进制格式保存（32 字节私钥 + 20 字节地址），不支持 HD 钱包模式
+
+    Returns:
+        统计信息 {'count', 'output_file', 'detail_file', 'elapsed', 'keys_per_second'}
     """
     print(f"🔐 开始生成 {count} 个 EVM 钱包...")
+    if workers > 1:
+        print(f"🧵 进程数: {workers}，每块 {chunk_size} 个")
     print("=" * 70)
-    
-    wallets = []
-    private_keys = []
-    
-    # 批量生成钱包
-    for i in range(count):
-        # 生成新账户
-        account = Account.create()
-        
-        wallets.append({
-            'index': i + 1,
-            'address': account.address,
-            'private_key': account.key.hex()
-        })
-        
-        # 只保存私钥到 JSON 文件
-        private_keys.append(account.key.hex())
-        
-        # 显示生成的地址信息
-        print(f"[{i+1:3d}] 地址: {account.address}")
-        print(f"      私钥: {account.key.hex()}")
-        print("-" * 70)
-    
-    # 保存私钥到 JSON 文件
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(private_keys, f, indent=2, ensure_ascii=False)
-    
+
+    detail_file = detail_path(output_file)
+    start_time = time.time()
+    generated = 0
+
+    if mnemonic:
+        from common.hd_wallet import DEFAULT_BASE_PATH, iter_derived_chunks
+
+        base_path = base_path or DEFAULT_BASE_PATH
+        chunks = iter_derived_chunks(mnemonic, base_path, start, count, passphrase=passphrase,
+                                     workers=workers, chunk_size=chunk_size)
+
+        # wallet.json 只保存助记词和派生路径范围，私钥由加载方按需派生
+        spec = {'mnemonic': mnemonic, 'path': f"{base_path}/{start}..{start + count - 1}"}
+        if passphrase:
+            spec['passphrase'] = passphrase
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(spec, f, indent=2, ensure_ascii=False)
+        key_writer = None
+    elif binary:
+        from common.wallet_store import BinaryWalletWriter, parse_private_key
+
+        chunks = iter_wallet_chunks(count, workers=workers, chunk_size=chunk_size)
+        key_writer = BinaryWalletWriter(output_file)
+    else:
+        chunks = iter_wallet_chunks(count, workers=workers, chunk_size=chunk_size)
+        key_writer = JsonArrayWriter(output_file)
+
+    # 私钥文件和详细信息文件同时流式写入
+    with JsonArrayWriter(detail_file) as detail_writer:
+        for chunk in chunks:
+            for address, private_key in chunk:
+                generated += 1
+                detail = {
+                    'index': generated,
+                    'address': address,
+                    'private_key': private_key
+                }
+
+                if binary:
+                    key_writer.write(parse_private_key(private_key), bytes.fromhex(address[2:]))
+                elif key_writer is not None:
+                    # 只保存私钥到 JSON 文件
+                    key_writer.write(private_key)
+                else:
+                    detail['path'] = f"{base_path}/{start + generated - 1}"
+                detail_writer.write(detail)
+
+                # 显示生成的地址信息
+                if verbose:
+                    print(f"[{generated:3d}] 地址: {address}")
+                    print(f"      私钥: {private_key}")
+                    print("-" * 70)
+
+            if not verbose:
+                elapsed = time.time() - start_time
+                rate = generated / elapsed if elapsed > 0 else 0
+                print(f"\r⏳ 进度: {generated}/{count} ({rate:.0f} 个/秒)", end='', flush=True)
+
+    if key_writer is not None:
+        key_writer.close()
+
+    elapsed = time.time() - start_time
+    keys_per_second = generated / elapsed if elapsed > 0 else 0
+    if not verbose:
+        print()
+
     print("\n" + "=" * 70)
-    print(f"✅ 成功生成 {count} 个钱包！")
-    print(f"💾 私钥已保存到: {output_file}")
+    print(f"✅ 成功生成 {generated} 个钱包！")
+    print(f"⏱️  耗时: {elapsed:.2f} 秒（{keys_per_second:.0f} 个/秒）")
+    if mnemonic:
+        print(f"🌱 助记词和派生路径已保存到: {output_file}")
+    elif binary:
+        print(f"💾 私钥和地址已保存到二进制文件: {output_file}")
+    else:
+        print(f"💾 私钥已保存到: {output_file}")
     print("\n⚠️  重要提醒：")
     print("   - 请妥善保管私钥文件，不要泄露！")
     print("   - 这些是真实的钱包私钥，可以用于任何 EVM 链")
     print("   - 建议备份到安全的地方")
-    
-    # 额外保存一份详细信息（包含地址和私钥对应关系）
-    detail_file = output_file.replace('.json', '_detail.json')
-    with open(detail_file, 'w', encoding='utf-8') as f:
-        json.dump(wallets, f, indent=2, ensure_ascii=False)
-    
+
+    # 详细信息（包含地址和私钥对应关系）与私钥文件同时写入
     print(f"📋 详细信息（地址+私钥）已保存到: {detail_file}")
-    
-    return wallets
+
+    return {
+        'count': generated,
+        'output_file': output_file,
+        'detail_file': detail_file,
+        'elapsed': elapsed,
+        'keys_per_second': keys_per_second
+    }
+
+
+def run_cli(argv):
+    """命令行模式（非交互）"""
+    parser = argparse.ArgumentParser(description="EVM 钱包批量生成工具")
+    parser.add_argument('-n', '--count', type=int, help='要生成的钱包数量')
+    parser.add_argument('-o', '--output', default='wallet.json', help='输出文件名（默认 wallet.json，二进制格式默认 wallet.bin）')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='并行生成的进程数（默认 CPU 核心数）')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f'每个分块的钱包数量（默认 {DEFAULT_CHUNK_SIZE}）')
+    parser.add_argument('-f', '--force', action='store_true', help='输出文件已存在时直接覆盖')
+    parser.add_argument('--hd', action='store_true', help='HD 钱包模式：生成新助记词，只保存助记词和派生路径范围')
+    parser.add_argument('--mnemonic', help='HD 钱包模式：使用已有助记词')
+    parser.add_argument('--path', help="HD 钱包父路径（默认 m/44'/60'/0'/0）")
+    parser.add_argument('--start', type=int, default=0, help='HD 钱包起始索引（默认 0）')
+    parser.add_argument('--words', type=int, default=12, choices=(12, 15, 18, 21, 24), help='新助记词的单词数（默认 12）')
+    parser.add_argument('--binary', action='store_true', help='以二进制格式保存（每个钱包 32 字节私钥 + 20 字节地址）')
+    parser.add_argument('--convert', metavar='WALLET_JSON', help='将已有的 wallet.json 转换为二进制格式（输出到 -o 指定的文件）')
+    args = parser.parse_args(argv)
+
+    if args.convert:
+        output_file = args.output if args.output != 'wallet.json' else 'wallet.bin'
+        if os.path.exists(output_file) and not args.force:
+            print(f"❌ 文件 {output_file} 已存在，使用 --force 覆盖")
+            return
+        from common.wallet_store import convert_to_binary
+
+        converted = convert_to_binary(args.convert, output_file)
+        print(f"✅ 已转换 {converted} 个钱包到: {output_file}")
+        return
+
+    if args.count is None or args.count <= 0:
+        print("❌ 数量必须大于 0")
+        return
+
+    if args.binary and (args.hd or args.mnemonic):
+        print("❌ 二进制格式不支持 HD 钱包模式")
+        return
+
+    output_file = args.output
+    if args.binary and output_file == 'wallet.json':
+        output_file = 'wallet.bin'
+
+    for path in (output_file, detail_path(output_file)):
+        if os.path.exists(path) and not args.force:
+            print(f"❌ 文件 {path} 已存在，使用 --force 覆盖")
+            return
+
+    mnemonic = args.mnemonic
+    if args.hd and not mnemonic:
+        from common.hd_wallet import generate_mnemonic
+
+        mnemonic = generate_mnemonic(args.words)
+        print(f"🌱 已生成新助记词（已保存到 {args.output}，请妥善备份）")
+
+    generate_wallets(
+        args.count,
+        output_file,
+        workers=max(1, args.workers),
+        chunk_size=max(1, args.chunk_size),
+        verbose=False,
+        mnemonic=mnemonic,
+        base_path=args.path,
+        start=args.start,
+        binary=args.binary
+    )
 
 
 def main():
     """主函数"""
+    # 带参数运行时使用命令行模式
+    if len(sys.argv) > 1:
+        run_cli(sys.argv[1:])
+        return
+
     print("=" * 70)
     print("  🌟 EVM 钱包批量生成工具 🌟")
     print("=" * 70)
     print()
-    
+
     # 获取用户输入
     try:
         count_input = input("请输入要生成的钱包数量 (默认 10): ").strip()
         count = int(count_input) if count_input else 10
-        
+
         if count <= 0:
             print("❌ 数量必须大于 0")
             return
-        
+
         if count > 1000:
             confirm = input(f"⚠️  您要生成 {count} 个钱包，确认吗？(y/n): ").strip().lower()
             if confirm != 'y':
                 print("❌ 已取消")
                 return
-        
+
         output_input = input("请输入输出文件名 (默认 wallet.json): ").strip()
         output_file = output_input if output_input else "wallet.json"
-        
+
         # 检查文件是否存在
         if os.path.exists(output_file):
             overwrite = input(f"⚠️  文件 {output_file} 已存在，是否覆盖？(y/n): ").strip().lower()
             if overwrite != 'y':
                 print("❌ 已取消")
                 return
-        
+
         print()
-        
-        # 生成钱包
-        generate_wallets(count, output_file)
-        
+
+        # 生成钱包（数量较多时改为并行生成并只显示进度）
+        if count > 1000:
+            generate_wallets(count, output_file, workers=os.cpu_count() or 1, verbose=False)
+        else:
+            generate_wallets(count, output_file)
+
     except KeyboardInterrupt:
         print("\n\n❌ 用户取消操作")
     except ValueError:
@@ -113,4 +338,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-